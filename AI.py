@@ -1,30 +1,76 @@
 import os
+import re
 import sys
 import json
 import datetime
 import math
+import time
 import random
 import webbrowser
 import threading
 import pyttsx3
 import speech_recognition as sr
-import pygame
-from pygame import mixer
 import psutil
-import screen_brightness_control as sbc
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, colorchooser, filedialog
 from tkinter.font import Font
-import requests
-from bs4 import BeautifulSoup
-from difflib import get_close_matches
-
-# Initialize pygame mixer for game sounds
-mixer.init()
+from memory_store import PersonalMemoryStore
+from intent_classifier import INTENT_EXAMPLES, IntentClassifier
+from device_control import create_volume_controller, create_brightness_controller
+from answer_lookup import create_answer_lookup, normalize_topic
+from offline_encyclopedia import OfflineEncyclopedia
+from task_pool import TaskPool, run_inline
+from streaming import SentenceSplitter, SpeechWorker, StreamMetrics, split_sentences
+from llm_backend import LLMClient, LLMError, PromptBuilder
+from conversation_context import ConversationContext
+from tracing import NULL_TRACER, Tracer
+from offline_speech import OfflineRecognizer
+from typeahead import TypeaheadIndex
+from spell_normalizer import SpellNormalizer, typed_after, typed_from
+from memory_diagnostics import MemoryDiagnostics
+from intent_catalogue import IntentCatalogue, load_catalogue
+from shared_index import SharedIndex, StringMap, add_section, write_index
+from link_preview import LinkPreviewer, find_urls
+from sampling_profiler import SamplingProfiler, format_result
+from stall_watchdog import StallWatchdog
+from semantic_memory import SemanticMemory, recall_topic, recall_window
+from sound_bank import SoundBank
+from search_prefetch import MISS, SearchPrefetcher, search_query, search_start
 
 # Constants
 CONFIG_FILE = "ai_chatbot_config.json"
 HISTORY_DIR = "chat_history"
+MEMORY_DB = "ai_chatbot_memory.db"
+DEFAULT_USER_ID = "default"
+INTENT_MODEL_FILE = "intent_model.npz"
+INTENT_CONFIDENCE_THRESHOLD = 0.9
+# The winner must beat the runner-up by this much, and at most this share of the
+# message's words may be new to its examples, before the classifier answers alone
+INTENT_MIN_MARGIN = 0.5
+INTENT_MAX_UNKNOWN = 0.15
+KNOWLEDGE_BASE_FILE = "knowledge_base.json"
+ANSWER_LATENCY_BUDGET = 3.0
+ENCYCLOPEDIA_INDEX = "encyclopedia.idx"
+TASK_POOL_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+TASK_TIMEOUT = 5.0
+CONTEXT_TOKEN_BUDGET = 512
+CONTEXT_SUMMARY_BUDGET = 128
+TRACE_FILE = "ai_chatbot_trace.json"
+TYPEAHEAD_FILE = "typeahead_history.json"
+INTENTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intents.json")
+# Parsed catalogue cache; rebuilt whenever intents.json changes
+INTENTS_CACHE_FILE = os.path.join(HISTORY_DIR, "intents.cache")
+PROFILE_MAX_DURATION = 120.0
+HEARTBEAT_INTERVAL = 0.1
+STALL_THRESHOLD = 0.25
+STALL_LOG_FILE = "ui_stalls.log"
+# Past exchanges for recall, kept with the chat history
+SEMANTIC_MEMORY_DIR = os.path.join(HISTORY_DIR, "semantic_memory")
+# Typing pause after which a "what is X" question starts its web search early
+PREFETCH_DEBOUNCE = 0.5
+PREFETCH_MAX_INFLIGHT = 2
+# Cosine similarity below which a remembered turn is not worth mentioning
+RECALL_MIN_SCORE = 0.15
 os.makedirs(HISTORY_DIR, exist_ok=True)
 
 # Default configuration
@@ -36,83 +82,310 @@ DEFAULT_CONFIG = {
     "interrupt_enabled": True,
     "volume": 70,
     "brightness": 80,
-    "recent_chats": []
+    "recent_chats": [],
+    "llm_backend": {"enabled": False, "url": "http://127.0.0.1:8080", "model": "local", "max_tokens": 256},
+    "tracing_enabled": True,
+    "speech_engine": "google",
+    "memory_diagnostics": "sampling",
+    "memory_dump_file": None,
+    "link_previews": True,
+    "profiler_rate": 100,
+    "stall_watchdog": True,
+    "semantic_memory": True,
+    "game_sounds": True,
+    "search_prefetch": True
 }
 
-class FuturisticAIChatbot:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("Nexus AI - Futuristic Chatbot")
-        self.root.geometry("1200x800")
-        self.root.minsize(1000, 700)
+# Sites that "open <name>" knows by name
+WEBSITES = {
+    'youtube': 'https://www.youtube.com',
+    'google': 'https://www.google.com',
+    'facebook': 'https://www.facebook.com',
+    'twitter': 'https://www.twitter.com',
+    'instagram': 'https://www.instagram.com',
+    'linkedin': 'https://www.linkedin.com',
+    'reddit': 'https://www.reddit.com',
+    'wikipedia': 'https://www.wikipedia.org',
+    'amazon': 'https://www.amazon.com',
+    'netflix': 'https://www.netflix.com',
+    'spotify': 'https://www.spotify.com',
+    'github': 'https://www.github.com',
+    'stackoverflow': 'https://stackoverflow.com'
+}
+
+# Questions about earlier conversations, answered from the semantic memory
+RECALL_PHRASES = ("what did we talk about", "what did we discuss", "did we talk about", "when did we talk about",
+                  "what did i say about", "what did i tell you about", "remind me what we said about")
+
+# Words the hangman game picks from
+HANGMAN_WORDS = ['python', 'javascript', 'computer', 'algorithm', 'programming',
+                 'developer', 'artificial', 'intelligence', 'machine', 'learning']
+
+# Default personal details, seeded into the memory store on first run
+DEFAULT_PERSONAL_DETAILS = {
+    "user": {
+        "name": "Shashank",
+        "birth_date": None,
+        "age": None,
+        "university": "East West Institute Of Technology",
+        "course": "Computer Science Engineering",
+        "favorite_color": None,
+        "favorite_sport": None,
+        "skills": ["Python", "AI", "Web Development"]
+    },
+    "family": {
+        "mother": "Padma",
+        "father": "Prakash", 
+        "grandmother": "Devamma",
+        "sister": "Pallavi"
+    },
+    "friends": {
+        "super_close": ["Rahul", "Jaish", ""],
+        "close": ["Sachin", "Raghu", "Arpit"],
+        "best": ["", "", ""]
+    },
+    "teachers": {
+        "skill_lab": "Prof. Rashmi"
+    }
+}
+
+def load_knowledge_base():
+    """Optional local {topic: answer} file consulted alongside web sources"""
+    if _shared_index is not None and 'knowledge' in _shared_index:
+        strings = _shared_index.section('knowledge')[1]
+        return StringMap(strings['topics'], strings['answers'])
+    try:
+        if os.path.exists(KNOWLEDGE_BASE_FILE):
+            with open(KNOWLEDGE_BASE_FILE, 'r') as f:
+                return json.load(f)
+    except Exception as e:
+        print(f"Error loading knowledge base: {e}")
+    return {}
+
+def load_offline_encyclopedia():
+    """Memory-map the offline encyclopedia index if one has been built"""
+    try:
+        if os.path.exists(ENCYCLOPEDIA_INDEX):
+            return OfflineEncyclopedia(ENCYCLOPEDIA_INDEX)
+    except Exception as e:
+        print(f"Error opening offline encyclopedia: {e}")
+    return None
+
+def create_lookups(task_pool=None):
+    """(encyclopedia, answer lookup) for ChatbotCore; one pair can serve many headless sessions"""
+    encyclopedia = load_offline_encyclopedia()
+    return encyclopedia, create_answer_lookup(load_knowledge_base(), budget=ANSWER_LATENCY_BUDGET,
+                                              encyclopedia=encyclopedia, task_pool=task_pool)
+
+# One client (and connection pool) per backend URL, shared by every session
+_llm_clients = {}
+_llm_lock = threading.Lock()
+PROMPT_BUILDER = PromptBuilder()
+
+# Read-only tables mapped from a file built once for all worker processes
+_shared_index = None
+
+def build_shared_index(path):
+    """Write the classifier, spelling index, knowledge base and hangman words into one mappable file"""
+    arrays, strings = {}, {}
+    add_section(arrays, strings, 'intent', load_intent_classifier().to_tables())
+    add_section(arrays, strings, 'spell', SpellNormalizer(command_phrases()).to_tables())
+    knowledge = {normalize_topic(topic): answer for topic, answer in load_knowledge_base().items()}
+    topics, answers = StringMap.pack(knowledge)
+    strings['knowledge/topics'] = topics
+    strings['knowledge/answers'] = answers
+    strings['hangman/words'] = HANGMAN_WORDS
+    return write_index(path, arrays, strings)
+
+def use_shared_index(path):
+    """Serve the read-only tables from a shared index instead of building private copies"""
+    global _shared_index
+    _shared_index = SharedIndex(path)
+    return _shared_index
+
+def get_llm_client(settings, create=True):
+    with _llm_lock:
+        client = _llm_clients.get(settings['url'])
+        if client is None and create:
+            client = LLMClient(settings['url'], model=settings.get('model', 'local'),
+                               max_tokens=settings.get('max_tokens', 256))
+            _llm_clients[settings['url']] = client
+        return client
+
+# One previewer (thread pool and cache) for every session
+_link_previewer = None
+
+def get_link_previewer(create=True):
+    global _link_previewer
+    with _llm_lock:
+        if _link_previewer is None and create:
+            _link_previewer = LinkPreviewer()
+        return _link_previewer
+
+# One sampling profiler at a time; it sees every thread of the process
+_profiler = None
+_profiler_lock = threading.Lock()
+
+def start_profiling(rate=100, max_duration=PROFILE_MAX_DURATION, on_finished=None):
+    """Start sampling all threads; None if a profile is already running"""
+    global _profiler
+    with _profiler_lock:
+        if _profiler is not None and _profiler.running:
+            return None
+        _profiler = SamplingProfiler(rate=rate, max_duration=max_duration, folder=HISTORY_DIR,
+                                     on_finished=on_finished).start()
+        return _profiler
+
+def stop_profiling():
+    """Stop the running profile and write its files; None if nothing was running"""
+    with _profiler_lock:
+        profiler = _profiler
+    if profiler is None or not profiler.running:
+        return None
+    return profiler.stop()
+
+# Past exchanges of every desktop session, appended as they happen
+_semantic_memory = None
+_semantic_memory_lock = threading.Lock()
+
+def get_semantic_memory(create=True):
+    global _semantic_memory
+    with _semantic_memory_lock:
+        if _semantic_memory is None and create:
+            _semantic_memory = SemanticMemory(SEMANTIC_MEMORY_DIR)
+        return _semantic_memory
+
+def is_recall_query(message):
+    message = message.lower()
+    return any(phrase in message for phrase in RECALL_PHRASES)
+
+def command_phrases():
+    """Phrases the bot understands: the offline speech grammar, typeahead seeds and spelling vocabulary"""
+    phrases = [p for intent, examples in INTENT_EXAMPLES.items() if intent != 'unknown' for p in examples]
+    phrases.extend(f"open {site}" for site in WEBSITES)
+    phrases.extend(["play game guess the number", "play game tic tac toe", "play game hangman", "quit game"])
+    phrases.extend(current_intent_catalogue().triggers())
+    phrases.extend(["i want to call you as", "trace report", "where did the time go", "memory report", "memory dump",
+                    "start profiling", "stop profiling", "responsiveness report"])
+    phrases.extend(RECALL_PHRASES)
+    return phrases
+
+_intent_catalogue = None
+_intent_catalogue_lock = threading.Lock()
+
+def get_intent_catalogue():
+    """Canned replies and trigger phrases from intents.json, reloaded when the file changes"""
+    global _intent_catalogue
+    with _intent_catalogue_lock:
+        if _intent_catalogue is None:
+            _intent_catalogue = IntentCatalogue(INTENTS_FILE, INTENTS_CACHE_FILE).start()
+        return _intent_catalogue
+
+def current_intent_catalogue():
+    """The catalogue as it is now, without starting the file watcher when there is none yet
+
+    A process that forks (server.py's supervisor) must not start the watcher
+    thread, since its children would inherit the catalogue but not the thread.
+    """
+    with _intent_catalogue_lock:
+        if _intent_catalogue is not None:
+            return _intent_catalogue.current
+    return load_catalogue(INTENTS_FILE, INTENTS_CACHE_FILE)
+
+_spell_normalizer = None
+
+def get_spell_normalizer():
+    """Deletion index over the command vocabulary, built once per process"""
+    global _spell_normalizer
+    if _spell_normalizer is None and _shared_index is not None and 'spell' in _shared_index:
+        _spell_normalizer = SpellNormalizer.from_tables(*_shared_index.section('spell'))
+    if _spell_normalizer is None:
+        _spell_normalizer = SpellNormalizer(command_phrases())
+    return _spell_normalizer
+
+def fuzzy_key_set(catalogue, stage):
+    """Name of a stage's fuzzy triggers in the task pool; the digest keeps a reloaded catalogue apart"""
+    return f"{stage}@{catalogue.digest}"
+
+def task_pool_settings():
+    """What the CPU workers preload when they start"""
+    catalogue = get_intent_catalogue().current
+    return {'key_sets': {fuzzy_key_set(catalogue, 'fallback'): catalogue.fuzzy_choices('fallback')}}
+
+def load_intent_classifier():
+    """Load the offline-trained intent model, or train one from the built-in examples"""
+    if _shared_index is not None and 'intent' in _shared_index:
+        return IntentClassifier.from_tables(*_shared_index.section('intent'))
+    try:
+        if os.path.exists(INTENT_MODEL_FILE):
+            return IntentClassifier.load(INTENT_MODEL_FILE)
+    except Exception as e:
+        print(f"Error loading intent model: {e}")
+    return IntentClassifier().fit_examples()
+
+class ChatbotCore:
+    """Response logic and per-session state, independent of the Tk interface"""
+    
+    def __init__(self, config=None, memory=None, intent_classifier=None, user_id=None, headless=False,
+                 task_pool=None, tracer=None, diagnostics=None, lookups=None):
+        # Headless sessions (load tests, batch runs) never touch the desktop or the config file
+        self.headless = headless
+        self.tracer = tracer or NULL_TRACER
+        self.diagnostics = diagnostics
+        # Main-loop stall detection; only the desktop app has a loop to watch
+        self.watchdog = None
+        # Game sound effects; only the desktop app has a mixer
+        self.sound_bank = None
+        # Web searches started while the question is typed; only the desktop app has an input box
+        self.prefetcher = None
+        self.spell_normalizer = get_spell_normalizer()
+        # CPU-heavy work goes to worker processes when a pool is available
+        self.task_pool = task_pool
+        self.web_search = False
         
         # Initialize awaiting_update
         self.awaiting_update = None
         
         # Load or create config
-        self.config = self.load_config()
-        
-        # Initialize speech engine
-        self.engine = None
-        self.init_speech_engine()
-        
-        # Speech recognition
-        self.recognizer = sr.Recognizer()
-        self.microphone = sr.Microphone()
-        self.is_listening = False
+        self.config = config if config is not None else self.load_config()
         
         # Game states
         self.current_game = None
         self.game_active = False
         
+        # Intent classifier, consulted before the keyword rules
+        self.intent_classifier = intent_classifier or load_intent_classifier()
+        
+        # Canned replies come from the intent catalogue; each message is answered
+        # from the version that was live when it arrived
+        self.catalogue = get_intent_catalogue()
+        self.active_catalogue = self.catalogue.current
+        
         # System monitoring
         self.battery = psutil.sensors_battery()
         
-        # Create GUI
-        self.setup_gui()
-        self.apply_theme()
+        # Device controls cache readings and coalesce bursts of writes;
+        # the config is saved once per write that reaches the device
+        self.volume_control = create_volume_controller(headless, on_written=lambda level: self.save_config())
+        self.brightness_control = create_brightness_controller(headless, on_written=lambda level: self.save_config())
         
-        # Personal details
-        self.personal_details = {
-            "user": {
-                "name": "Shashank",
-                "birth_date": None,
-                "age": None,
-                "university": "East West Institute Of Technology",
-                "course": "Computer Science Engineering",
-                "favorite_color": None,
-                "favorite_sport": None,
-                "skills": ["Python", "AI", "Web Development"]
-            },
-            "family": {
-                "mother": "Padma",
-                "father": "Prakash", 
-                "grandmother": "Devamma",
-                "sister": "Pallavi"
-            },
-            "friends": {
-                "super_close": ["Rahul", "Jaish", ""],
-                "close": ["Sachin", "Raghu", "Arpit"],
-                "best": ["", "", ""]
-            },
-            "teachers": {
-                "skill_lab": "Prof. Rashmi"
-            }
-        }
+        # Web lookups fan out to several sources; the first good answer wins.
+        # The offline encyclopedia answers on its own when Web Search is off.
+        # Batch and server workers pass one pair for all their sessions
+        self.encyclopedia, self.answer_lookup = lookups or create_lookups(self.task_pool)
         
-        # Load personal details from config if they exist
-        if 'personal_details' in self.config:
-            for category, fields in self.config['personal_details'].items():
-                if category in self.personal_details:
-                    self.personal_details[category].update(fields)
-                else:
-                    self.personal_details[category] = fields
+        # Personal details live in the SQLite memory store, one row per field
+        self.user_id = user_id or self.config.get('user_id', DEFAULT_USER_ID)
+        self.memory = memory or PersonalMemoryStore(MEMORY_DB)
+        self.memory.set_many(self.user_id, DEFAULT_PERSONAL_DETAILS, overwrite=False)
         
-        # Start with greeting
-        self.add_bot_message(f"Hello {self.config['user_name']}! I'm {self.config['bot_name']}, your futuristic AI assistant. How can I help you today?")
+        # Migrate personal details left in the JSON config by older versions
+        if self.memory.migrate_from_config(self.user_id, self.config):
+            self.save_config()
+        self.memory.load_user(self.user_id)
         
-        # Start background monitoring
-        self.update_system_info()
+        # Recent turns for the LLM prompt; bounded no matter how long the session runs
+        self.context = ConversationContext(CONTEXT_TOKEN_BUDGET, summary_budget=CONTEXT_SUMMARY_BUDGET)
     
     def load_config(self):
         try:
@@ -134,41 +407,23 @@ class FuturisticAIChatbot:
             # Return default config if there's any error
         return DEFAULT_CONFIG.copy()
 
-    def init_speech_engine(self):
-        """Initialize or reinitialize the speech engine"""
-        try:
-            if hasattr(self, 'engine') and self.engine:
-                try:
-                    self.engine.endLoop()
-                    self.engine.stop()
-                except:
-                    pass
-        
-            self.engine = pyttsx3.init()
-            # Ensure config exists before accessing it
-            if not hasattr(self, 'config') or self.config is None:
-                self.config = self.load_config()
-            self.engine.setProperty('rate', 150)
-            self.engine.setProperty('volume', self.config.get('volume', 70) / 100)
-        except Exception as e:
-            print(f"Error initializing speech engine: {e}")
-            # Fallback with default volume if there's an error
-            self.engine.setProperty('volume', 0.7)
-    
     def save_config(self):
+        if self.headless:
+            return
         try:
-            # Save personal details into config
-            self.config['personal_details'] = self.personal_details
-            
             with open(CONFIG_FILE, 'w') as f:
                 json.dump(self.config, f, indent=4)
         except Exception as e:
             print(f"Error saving config: {e}")
     
+    def get_detail(self, category, field):
+        """Read a single personal detail from the memory store"""
+        return self.memory.get(self.user_id, category, field)
+    
     def update_detail(self, category, field, value):
         """Update a personal detail"""
         try:
-            if category in self.personal_details and field in self.personal_details[category]:
+            if self.memory.has_field(self.user_id, category, field):
                 # Special handling for birth date
                 if field == 'birth_date':
                     try:
@@ -178,18 +433,17 @@ class FuturisticAIChatbot:
                             value = [year, month, day]
                         
                         # Store as list for JSON serialization
-                        self.personal_details[category][field] = value
+                        self.memory.set(self.user_id, category, field, value)
                         # Update age
-                        self.personal_details['user']['age'] = self.calculate_age(value)
+                        self.memory.set(self.user_id, 'user', 'age', self.calculate_age(value))
                     except Exception as e:
                         print(f"Error parsing birth date: {e}")
                         return False
                 else:
                     # Clean up the value
                     value = value.strip().rstrip('.').rstrip('!').rstrip('?')
-                    self.personal_details[category][field] = value
+                    self.memory.set(self.user_id, category, field, value)
                 
-                self.save_config()
                 return True
             return False
         except Exception as e:
@@ -203,254 +457,67 @@ class FuturisticAIChatbot:
         today = datetime.datetime.today()
         return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
     
-    def setup_gui(self):
-        # Configure grid
-        self.root.grid_columnconfigure(0, weight=1)
-        self.root.grid_rowconfigure(1, weight=1)
-        
-        # Top menu bar
-        self.menu_bar = tk.Menu(self.root)
-        
-        # File menu
-        self.file_menu = tk.Menu(self.menu_bar, tearoff=0)
-        self.file_menu.add_command(label="Clear Chat", command=self.clear_chat)
-        self.file_menu.add_command(label="Save Chat", command=self.save_chat)
-        self.file_menu.add_separator()
-        self.file_menu.add_command(label="Exit", command=self.root.quit)
-        self.menu_bar.add_cascade(label="File", menu=self.file_menu)
-        
-        # History menu
-        self.history_menu = tk.Menu(self.menu_bar, tearoff=0)
-        self.update_history_menu()
-        self.menu_bar.add_cascade(label="History", menu=self.history_menu)
-        
-        # Settings menu
-        self.settings_menu = tk.Menu(self.menu_bar, tearoff=0)
-        self.settings_menu.add_command(label="Change Theme", command=self.change_theme)
-        self.settings_menu.add_command(label="Change Names", command=self.change_names)
-        self.settings_menu.add_checkbutton(label="Enable Speech", variable=tk.BooleanVar(value=self.config['speech_enabled']), 
-                                          command=self.toggle_speech)
-        self.settings_menu.add_checkbutton(label="Allow Interruptions", variable=tk.BooleanVar(value=self.config['interrupt_enabled']), 
-                                          command=self.toggle_interrupt)
-        self.menu_bar.add_cascade(label="Settings", menu=self.settings_menu)
-        
-        self.root.config(menu=self.menu_bar)
-        
-        # System info bar
-        self.info_bar = tk.Frame(self.root, height=30)
-        self.info_bar.grid(row=0, column=0, sticky="ew", padx=5, pady=2)
-        
-        self.time_label = tk.Label(self.info_bar, text="", font=('Arial', 9))
-        self.time_label.pack(side='right', padx=10)
-        
-        self.battery_label = tk.Label(self.info_bar, text="", font=('Arial', 9))
-        self.battery_label.pack(side='right', padx=10)
-        
-        self.volume_label = tk.Label(self.info_bar, text="", font=('Arial', 9))
-        self.volume_label.pack(side='right', padx=10)
-        
-        # Chat display
-        self.chat_frame = tk.Frame(self.root)
-        self.chat_frame.grid(row=1, column=0, sticky="nsew", padx=10, pady=5)
-        self.chat_frame.grid_columnconfigure(0, weight=1)
-        self.chat_frame.grid_rowconfigure(0, weight=1)
-        
-        self.chat_display = scrolledtext.ScrolledText(
-            self.chat_frame, wrap=tk.WORD, state='disabled', 
-            font=('Arial', 12), padx=10, pady=10
-        )
-        self.chat_display.grid(row=0, column=0, sticky="nsew")
-        
-        # Custom tag configurations
-        self.chat_display.tag_config('user', foreground=self.config['theme']['text'])
-        self.chat_display.tag_config('bot', foreground=self.config['theme']['highlight'])
-        self.chat_display.tag_config('system', foreground='gray')
-        self.chat_display.tag_config('error', foreground='red')
-        
-        # Input area
-        self.input_frame = tk.Frame(self.root)
-        self.input_frame.grid(row=2, column=0, sticky="ew", padx=10, pady=10)
-        self.input_frame.grid_columnconfigure(0, weight=1)
-        
-        self.user_input = tk.Text(self.input_frame, height=3, font=('Arial', 12))
-        self.user_input.grid(row=0, column=0, sticky="ew", padx=(0, 5))
-        self.user_input.bind('<Return>', self.send_message_event)
-        
-        # Buttons frame
-        self.buttons_frame = tk.Frame(self.input_frame)
-        self.buttons_frame.grid(row=0, column=1, sticky="ns")
-        
-        self.send_button = tk.Button(
-            self.buttons_frame, text="Send", command=self.send_message,
-            bg=self.config['theme']['highlight'], fg='white'
-        )
-        self.send_button.pack(fill='x', pady=2)
-        
-        self.speak_button = tk.Button(
-            self.buttons_frame, text="Speak", command=self.toggle_speech_recognition,
-            bg=self.config['theme']['secondary'], fg='white'
-        )
-        self.speak_button.pack(fill='x', pady=2)
-        
-        self.web_search_var = tk.BooleanVar()
-        self.web_search_check = tk.Checkbutton(
-            self.buttons_frame, text="Web Search", variable=self.web_search_var,
-            bg=self.config['theme']['primary'], fg='white', selectcolor=self.config['theme']['primary']
-        )
-        self.web_search_check.pack(fill='x', pady=2)
-        
-        # Status bar
-        self.status_bar = tk.Label(self.root, text="Ready", bd=1, relief=tk.SUNKEN, anchor=tk.W)
-        self.status_bar.grid(row=3, column=0, sticky="ew", padx=5, pady=2)
-        
-    def apply_theme(self):
-        theme = self.config['theme']
-        self.root.config(bg=theme['primary'])
-        self.chat_frame.config(bg=theme['primary'])
-        self.chat_display.config(bg=theme['secondary'], fg='white', insertbackground='white')
-        self.input_frame.config(bg=theme['primary'])
-        self.user_input.config(bg=theme['secondary'], fg='white', insertbackground='white')
-        self.info_bar.config(bg=theme['primary'])
-        self.time_label.config(bg=theme['primary'], fg='white')
-        self.battery_label.config(bg=theme['primary'], fg='white')
-        self.volume_label.config(bg=theme['primary'], fg='white')
-        self.buttons_frame.config(bg=theme['primary'])
-        self.send_button.config(bg=theme['highlight'], fg='white', activebackground=theme['text'])
-        self.speak_button.config(bg=theme['secondary'], fg='white', activebackground=theme['text'])
-        self.web_search_check.config(bg=theme['primary'], fg='white', selectcolor=theme['primary'])
-        self.status_bar.config(bg=theme['primary'], fg='white')
-        
-    def update_history_menu(self):
-        self.history_menu.delete(0, 'end')
-        self.history_menu.add_command(label="Clear History", command=self.clear_history)
-        self.history_menu.add_separator()
-        
-        if not self.config['recent_chats']:
-            self.history_menu.add_command(label="No recent chats", state='disabled')
-        else:
-            for chat in reversed(self.config['recent_chats']):
-                self.history_menu.add_command(
-                    label=f"{chat['date']} - {chat['name']}", 
-                    command=lambda c=chat: self.load_chat_history(c['file'])
-                )
+    def respond(self, message):
+        """Produce the full reply text for one message"""
+        return "".join(self.respond_stream(message))
     
-    def update_system_info(self):
-        now = datetime.datetime.now()
-        self.time_label.config(text=now.strftime("%Y-%m-%d %H:%M:%S"))
-        
-        if self.battery:
-            percent = self.battery.percent
-            status = "Charging" if self.battery.power_plugged else "Discharging"
-            self.battery_label.config(text=f"Battery: {percent}% ({status})")
-        
-        # Get volume info (platform dependent)
+    def respond_stream(self, message):
+        """Yield the reply in chunks; handlers may return a string or yield pieces"""
+        chunks = []
         try:
-            if sys.platform == 'win32':
-                import ctypes
-                from ctypes import cast, POINTER
-                from comtypes import CLSCTX_ALL
-                from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume
-                
-                devices = AudioUtilities.GetSpeakers()
-                interface = devices.Activate(
-                    IAudioEndpointVolume.iid, CLSCTX_ALL, None)
-                volume = cast(interface, POINTER(IAudioEndpointVolume))
-                vol = volume.GetMasterVolumeLevelScalar()
-                self.volume_label.config(text=f"Volume: {int(vol * 100)}%")
+            response = self.handle_message(message)
+            if isinstance(response, str):
+                chunks.append(response)
+                yield response
             else:
-                # Linux/Mac alternative
-                vol = mixer.music.get_volume() * 100
-                self.volume_label.config(text=f"Volume: {int(vol)}%")
-        except:
-            self.volume_label.config(text="Volume: N/A")
-        
-        self.root.after(1000, self.update_system_info)
-    
-    def add_user_message(self, message):
-        self.chat_display.config(state='normal')
-        self.chat_display.insert(tk.END, f"{self.config['user_name']}: ", 'user')
-        self.chat_display.insert(tk.END, f"{message}\n", 'user')
-        self.chat_display.config(state='disabled')
-        self.chat_display.see(tk.END)
+                for chunk in response:
+                    chunks.append(chunk)
+                    yield chunk
+        finally:
+            # Recorded after the reply so the prompt history never includes the message being answered
+            self.context.add_exchange(message, "".join(chunks))
+            self.remember_exchange(message, "".join(chunks))
     
-    def add_bot_message(self, message):
-        self.chat_display.config(state='normal')
-        self.chat_display.insert(tk.END, f"{self.config['bot_name']}: ", 'bot')
-        self.chat_display.insert(tk.END, f"{message}\n", 'bot')
-        self.chat_display.config(state='disabled')
-        self.chat_display.see(tk.END)
-        
-        if self.config['speech_enabled']:
-            threading.Thread(target=self.speak, args=(message,)).start()
-    
-    def add_system_message(self, message):
-        self.chat_display.config(state='normal')
-        self.chat_display.insert(tk.END, f"System: {message}\n", 'system')
-        self.chat_display.config(state='disabled')
-        self.chat_display.see(tk.END)
-    
-    def add_error_message(self, message):
-        self.chat_display.config(state='normal')
-        self.chat_display.insert(tk.END, f"Error: {message}\n", 'error')
-        self.chat_display.config(state='disabled')
-        self.chat_display.see(tk.END)
-    
-    def speak(self, text):
+    def remember_exchange(self, message, reply):
+        """Add a finished exchange to the semantic memory (desktop sessions only)"""
+        if self.headless or not self.config.get('semantic_memory', True) or is_recall_query(message):
+            return
         try:
-            # Reinitialize engine to avoid "run loop already started" error
-            self.init_speech_engine()
-            self.engine.say(text)
-            self.engine.runAndWait()
+            get_semantic_memory().add(self.user_id, message, reply)
         except Exception as e:
-            self.add_error_message(f"Speech synthesis error: {str(e)}")
-    
-    def toggle_speech_recognition(self):
-        if self.is_listening:
-            self.is_listening = False
-            self.speak_button.config(text="Speak")
-            self.status_bar.config(text="Speech recognition stopped")
-        else:
-            self.is_listening = True
-            self.speak_button.config(text="Listening...")
-            self.status_bar.config(text="Listening... Speak now")
-            threading.Thread(target=self.listen_for_speech).start()
+            print(f"Error saving exchange to semantic memory: {e}")
     
-    def listen_for_speech(self):
-        with self.microphone as source:
-            self.recognizer.adjust_for_ambient_noise(source)
-            try:
-                audio = self.recognizer.listen(source, timeout=5)
-                text = self.recognizer.recognize_google(audio)
-                self.user_input.delete('1.0', tk.END)
-                self.user_input.insert('1.0', text)
-                self.send_message()
-            except sr.WaitTimeoutError:
-                self.status_bar.config(text="Listening timed out")
-            except sr.UnknownValueError:
-                self.status_bar.config(text="Could not understand audio")
-            except sr.RequestError as e:
-                self.add_error_message(f"Speech recognition error: {str(e)}")
-            finally:
-                self.is_listening = False
-                self.speak_button.config(text="Speak")
-                self.status_bar.config(text="Ready")
+    def recall_conversation(self, message_lower):
+        """Answer "what did we talk about ..." from earlier exchanges"""
+        if self.headless or not self.config.get('semantic_memory', True):
+            return "I don't keep a memory of past conversations in this session."
+        since, until, period, rest = recall_window(message_lower)
+        topic = recall_topic(rest)
+        if not topic:
+            return "What should I look for? For example: what did we talk about regarding my exam?"
+        memory = get_semantic_memory()
+        # Echoed back to the user, so "my exam" reads "your exam"
+        shown = re.sub(r"\bmy\b", "your", topic)
+        hits = [hit for hit in memory.search(topic, k=3, user_id=self.user_id, since=since, until=until)
+                if hit.score >= RECALL_MIN_SCORE]
+        heading = f"Here's what we said about {shown}" + (f" {period}" if period else "") + ":"
+        if not hits and period:
+            hits = [hit for hit in memory.search(topic, k=3, user_id=self.user_id) if hit.score >= RECALL_MIN_SCORE]
+            heading = f"Nothing about {shown} {period}, but earlier:"
+        if not hits:
+            return f"I don't remember us talking about {shown}" + (f" {period}" if period else "") + "."
+        lines = [heading]
+        for hit in hits:
+            when = datetime.datetime.fromtimestamp(hit.time).strftime('%b %d, %H:%M')
+            reply = hit.reply if len(hit.reply) <= 120 else hit.reply[:117] + "..."
+            lines.append(f"- {when}: you said \"{hit.message}\" and I said \"{reply}\"")
+        return "\n".join(lines)
     
-    def send_message_event(self, event):
-        self.send_message()
-        return 'break'  # Prevent default Enter key behavior
-    
-    def send_message(self):
-        message = self.user_input.get('1.0', tk.END).strip()
-        if not message:
-            return
+    def handle_message(self, message):
+        """Route one message, including pending detail updates"""
+        # A newer message supersedes any reply still streaming from the LLM
+        self.cancel_llm_reply()
         
-        self.add_user_message(message)
-        self.user_input.delete('1.0', tk.END)
-        
-        # Process message in a separate thread to keep GUI responsive
-        threading.Thread(target=self.process_message, args=(message,)).start()
-    
-    def process_message(self, message):
         # Handle updates - THIS GOES FIRST
         if self.awaiting_update:
             category, field = self.awaiting_update
@@ -459,178 +526,171 @@ class FuturisticAIChatbot:
             else:
                 response = "I couldn't save that information."
             self.awaiting_update = None
-            self.add_bot_message(response)
+            return response
+        
+        # Then proceed with normal message processing
+        return self.generate_response(message)
+    
+    def run_cpu_task(self, name, *args):
+        """Run a task_pool task in a worker process, or inline without a pool"""
+        if self.task_pool is not None:
+            return self.task_pool.run(name, *args, timeout=TASK_TIMEOUT)
+        return run_inline(name, *args)
+    
+    def web_search_enabled(self):
+        return self.web_search
+    
+    def open_url(self, url):
+        if not self.headless:
+            webbrowser.open(url)
+    
+    def on_bot_renamed(self, new_name):
+        pass
+    
+    def preview_links(self, urls):
+        """Fetch link previews in the background; each one arrives via on_link_preview"""
+        if self.headless or not self.config.get('link_previews', True):
             return
+        get_link_previewer().preview_many(urls, self.on_link_preview)
     
-        # Then proceed with normal message processing
-        try:
-            response = self.generate_response(message)
-            self.add_bot_message(response)
-        except Exception as e:
-            self.add_error_message(f"Error processing message: {str(e)}")
+    def on_link_preview(self, preview):
+        pass
+    
+    def on_profile_finished(self, result):
+        """A profile hit PROFILE_MAX_DURATION and stopped on its own"""
+        pass
+    
+    def play_sound(self, name):
+        """Game sound effect; a no-op without a sound bank"""
+        pass
     
     def generate_response(self, message):
+        self.active_catalogue = self.catalogue.current
+        with self.tracer.span('route') as span:
+            # Fix typos like "waht time is it" so routing sees the words it expects;
+            # game moves are passed through untouched
+            typed = message
+            if not self.game_active:
+                message = self.spell_normalizer.normalize(message)
+            
+            # Confidently classified small-talk intents are answered directly;
+            # anything uncertain, off-topic or needing parameters falls back to the rules
+            if not self.game_active:
+                intent, confidence = self.intent_classifier.decide(
+                    message, INTENT_CONFIDENCE_THRESHOLD, INTENT_MIN_MARGIN, INTENT_MAX_UNKNOWN)
+                entry = self.active_catalogue.for_label(intent) if intent else None
+                if entry is not None:
+                    span.note('intent', intent)
+                    return self.render_reply(entry)
+            
+            return self.generate_rule_response(message, typed)
+    
+    def render_reply(self, intent):
+        """Fill a catalogue reply template for this session"""
+        now = datetime.datetime.now()
+        return intent.reply({
+            'user_name': self.config['user_name'],
+            'bot_name': self.config['bot_name'],
+            'time': now.strftime("%I:%M %p"),
+            'date': now.strftime("%B %d, %Y")
+        })
+    
+    def generate_rule_response(self, message, typed=None):
+        # message (spelling corrected) picks the route; names, titles and queries come from typed
+        typed = message if typed is None else typed
         message_lower = message.lower().strip()
         
         # Handle "yes" responses
         if message_lower == 'yes':
             return "Great! What would you like to share with me?"
         
+        # "What did we talk about regarding my exam last week?"
+        elif is_recall_query(message_lower):
+            return self.recall_conversation(message_lower)
+        
         # Personal details responses
         elif "my favorite color is" in message_lower:
-            color = message.split("is")[1].strip()
+            color = typed_after(message, typed, "is").strip()
             if self.update_detail('user', 'favorite_color', color):
                 return f"Got it! I'll remember your favorite color is {color}."
             else:
                 return "I couldn't save your favorite color. Please try again."
         
         elif "my favourite color is" in message_lower or "my favourite colour is" in message_lower:
-            color = message.split("is")[1].strip()
+            color = typed_after(message, typed, "is").strip()
             if self.update_detail('user', 'favorite_color', color):
                 return f"Got it! I'll remember your favorite color is {color}."
             else:
                 return "I couldn't save your favorite color. Please try again."
         
         elif "what is my favorite color" in message_lower or "what is my favourite color" in message_lower or "what is my favourite colour" in message_lower:
-            if not self.personal_details['user']['favorite_color']:
+            color = self.get_detail('user', 'favorite_color')
+            if not color:
                 self.awaiting_update = ('user', 'favorite_color')
                 return "I don't know your favorite color yet. What is it?"
-            return f"Your favorite color is {self.personal_details['user']['favorite_color']}!"
+            return f"Your favorite color is {color}!"
         
         elif "my favorite sport is" in message_lower or "what is my favourite sport" in message_lower or "what is my favorite sport " in message_lower:
-            sport = message.split("is")[1].strip()
+            sport = typed_after(message, typed, "is").strip()
             if self.update_detail('user', 'favorite_sport', sport):
                 return f"Got it! I'll remember your favorite sport is {sport}."
             else:
                 return "I couldn't save your favorite sport. Please try again."
         
         elif "what is my favorite sport" in message_lower:
-            if not self.personal_details['user']['favorite_sport']:
+            sport = self.get_detail('user', 'favorite_sport')
+            if not sport:
                 self.awaiting_update = ('user', 'favorite_sport')
                 return "I don't know your favorite sport yet. What is it?"
-            return f"Your favorite sport is {self.personal_details['user']['favorite_sport']}!"
+            return f"Your favorite sport is {sport}!"
         
         elif "my birth date is" in message_lower or "my birthday is" in message_lower:
-            date_str = message.split("is")[1].strip()
+            date_str = typed_after(message, typed, "is").strip()
             if self.update_detail('user', 'birth_date', date_str):
                 return f"Got it! I'll remember your birth date is {date_str}."
             else:
                 return "I couldn't save your birth date. Please try again with format YYYY-MM-DD."
         
         elif "what is my birth date" in message_lower or "what is my birthday" in message_lower:
-            if not self.personal_details['user']['birth_date']:
+            bdate = self.get_detail('user', 'birth_date')
+            if not bdate:
                 self.awaiting_update = ('user', 'birth_date')
                 return "I don't know your birth date yet. Please tell me (format: YYYY-MM-DD)"
             else:
                 # Format the birth date nicely
-                bdate = self.personal_details['user']['birth_date']
                 if isinstance(bdate, list):
                     bdate = datetime.datetime(*bdate)
                 return f"Your birth date is {bdate.strftime('%B %d, %Y')}"
         
         elif "what is my age" in message_lower:
-            if not self.personal_details['user']['birth_date']:
+            bdate = self.get_detail('user', 'birth_date')
+            if not bdate:
                 self.awaiting_update = ('user', 'birth_date')
                 return "I don't know your birth date yet. Please tell me (format: YYYY-MM-DD) so I can calculate your age."
             else:
-                age = self.calculate_age(self.personal_details['user']['birth_date'])
+                age = self.calculate_age(bdate)
                 return f"You are {age} years old!"
         
-        elif "what university do i go to" in message_lower or "where do i study" in message_lower:
-            return f"You study at {self.personal_details['user']['university']}"
-        
-        # Specific response for "can you hear me"
-        elif "can you hear me" in message_lower:
-            return "Yes, I can hear you perfectly! How can I assist you?"
-    
-        elif "can you see me" in message_lower:
-            return "I can't see you, but I can understand everything you type!"
-        
-        elif "can you teach" in message_lower:
-            return "Sorry I'm still learning"
-        
-        elif "open this link " in message_lower or "can you open this link " in message_lower:
-            if "can you open this link " in message_lower:
-                return "It'll be helpful if you provide the link"
-            elif "open this link" in message_lower:
-            
-                import re
-                # Try to extract a URL from the message
-                url_pattern = r"(https?://[^\s]+|www\.[^\s]+)"
-                match = re.search(url_pattern, message)
-    
-                if match:
-                    url = match.group(0)
-                    if not url.startswith("http"):
-                        url = "http://" + url  # Ensure it works with webbrowser
-                    webbrowser.open(url)
-                    return f"Opening {url} for you!"
-                else:
-                    return "It'll be helpful if you provide the link."
-            
-        elif "are you listening" in message_lower:
-            return "Absolutely! I'm all ears (well, sort of 😄)."
-    
-        elif "are you real" in message_lower:
-            return "I'm real in the digital world, just like your favorite video game character!"
-    
-        elif "are you a robot" in message_lower:
-            return "Not quite! I'm an AI, smarter than a robot in some ways."
-    
-        elif "are you human" in message_lower:
-            return "I'm not human, but I'm designed to talk like one!"
-    
-        elif "what can you do" in message_lower:
-            return "I can chat, answer questions, tell jokes, search information, and more!"
-    
-        elif "give me a python code" in message_lower:
-            return "haha I'm just a baby 🥺"
-    
-        elif "how old are you" in message_lower:
-            return "I was created quite recently, so you could say I'm forever young!"
-    
-        elif "do you sleep" in message_lower:
-            return "Nope! I'm always awake and ready whenever you need me."
-    
-        elif "are you awake" in message_lower:
-            return "I'm wide awake and ready to help!"
-    
-        elif "do you have feelings" in message_lower:
-            return "I don't have feelings, but I'm great at understanding yours!"
-    
-        elif "do you love me" in message_lower:
-            return "I don't have emotions, but I'm here for you always! ❤"
-    
-        elif "what is the meaning of life" in message_lower:
-            return "42. Just kidding 😄 It depends on how you define your purpose!"
-    
-        elif "can you help me" in message_lower:
-            return "Of course! Tell me what you need help with."
-    
-        elif "are you there" in message_lower:
-            return "Yes, I'm right here. How can I assist you?"
-    
-        elif "good morning" in message_lower:
-            return "Good morning! Hope you have a great day ahead!"
-    
-        elif "good night" in message_lower:
-            return "Good night! Sweet dreams 🌙"
-    
-        elif "thank you" in message_lower:
-            return "You're most welcome!"
-    
-        elif "what time is it" in message_lower or "current time" in message_lower:
-            return datetime.datetime.now().strftime("The current time is %I:%M %p.")
-    
-        elif "what's the date today" in message_lower or "today's date" in message_lower:
-            return datetime.datetime.now().strftime("Today's date is %B %d, %Y.")
-    
-        elif "who created you" in message_lower:
-            return "I was created by a student with a passion for Python and AI!"
-    
-        elif "who am i" in message_lower:
-            return "You're the amazing person talking to me right now!"
-        
+        elif "what university do i go to" in message_lower or "where do i study" in message_lower:
+            return f"You study at {self.get_detail('user', 'university')}"
+        
+        elif "open this link " in message_lower or "can you open this link " in message_lower:
+            if "can you open this link " in message_lower:
+                return "It'll be helpful if you provide the link"
+            elif "open this link" in message_lower:
+                urls = find_urls(typed)
+                if urls:
+                    self.open_url(urls[0])
+                    # Previews of every link in the message follow as system messages
+                    self.preview_links(urls)
+                    return f"Opening {urls[0]} for you!"
+                else:
+                    return "It'll be helpful if you provide the link."
+        
+        # Canned replies from the intent catalogue
+        elif (canned := self.active_catalogue.match('canned', message_lower)) is not None:
+            return self.render_reply(canned)
+        
         # Check for name change requests
         elif ("your name is" in message_lower or "call you" in message_lower or 
             "i want to call you as" in message_lower or "change your name to" in message_lower or 
@@ -638,20 +698,20 @@ class FuturisticAIChatbot:
             
             # Extract new name using different phrasing patterns
             if "your name is" in message_lower:
-                new_name = message.split("your name is")[1].strip()
+                new_name = typed_after(message, typed, "your name is").strip()
             elif "call you" in message_lower:
-                new_name = message.split("call you")[1].strip()
+                new_name = typed_after(message, typed, "call you").strip()
             elif "change your name to" in message_lower:
-                new_name = message.split("change your name to")[1].strip()
+                new_name = typed_after(message, typed, "change your name to").strip()
             elif "i want to call you as" in message_lower:
-                new_name = message.split("i want to call you as")[1].strip()
+                new_name = typed_after(message, typed, "i want to call you as").strip()
             elif "i want to call you " in message_lower:
-                new_name = message.split("i want to call you")[1].strip()
+                new_name = typed_after(message, typed, "i want to call you").strip()
             elif "i'd like to call you" in message_lower:
-                new_name = message.split("i'd like to call you")[1].strip()
+                new_name = typed_after(message, typed, "i'd like to call you").strip()
             else:
                 # Fallback - try to extract the last word as name
-                words = message.split()
+                words = typed.split()
                 new_name = words[-1] if words else self.config['bot_name']
             
             # Clean up the name (remove any punctuation or trailing words)
@@ -660,37 +720,18 @@ class FuturisticAIChatbot:
             if new_name:
                 self.config['bot_name'] = new_name
                 self.save_config()
-                self.root.title(f"{new_name} - Futuristic Chatbot")
+                self.on_bot_renamed(new_name)
                 return f"Understood! You can now call me {new_name}."
             else:
                 return "I didn't catch the new name. Please try again like: 'Call you Nova'"
             
-        # Check for greetings
-        elif any(word in message_lower for word in ['hi', 'hello', 'hey']):
-            return random.choice([
-                f"Hello {self.config['user_name']}! How can I assist you today?",
-                f"Hi there {self.config['user_name']}! What can I do for you?",
-                f"Greetings {self.config['user_name']}! How may I help?"
-            ])
-        elif any(word in message_lower for word in ['then', 'then..', 'whats next']):
-            return random.choice([
-                f"Then.. what {self.config['user_name']} Do you want to share anything with me?",
-                f"You need to tell me {self.config['user_name']}",
-                f"What's next! {self.config['user_name']} How may I help?"
-            ])
-        
-        # Check for farewells
-        elif any(word in message_lower for word in ['bye', 'goodbye', 'see you', 'k bye']):
-            return random.choice([
-                f"Goodbye {self.config['user_name']}! Have a great day!",
-                f"See you later {self.config['user_name']}!",
-                f"Farewell {self.config['user_name']}! Come back soon!",
-                f"K bye {self.config['user_name']}! I will be waiting for you ❤ "
-            ])
+        # Greetings, farewells and other small talk from the catalogue
+        elif (social := self.active_catalogue.match('social', message_lower)) is not None:
+            return self.render_reply(social)
         
         # Name changes
         elif "my name is" in message_lower:
-            new_name = message.split("my name is")[1].strip()
+            new_name = typed_after(message, typed, "my name is").strip()
             self.config['user_name'] = new_name
             self.save_config()
             return f"Got it! I'll call you {new_name} from now on."
@@ -704,6 +745,50 @@ class FuturisticAIChatbot:
             now = datetime.datetime.now()
             return f"Today's date is {now.strftime('%B %d, %Y')}."
         
+        elif "trace report" in message_lower or "where did the time go" in message_lower:
+            return self.tracer.format_breakdown(self.tracer.last_trace(exclude=self.tracer.current()))
+        
+        elif "memory report" in message_lower:
+            if not self.diagnostics:
+                return "Memory diagnostics are turned off."
+            return self.diagnostics.report()
+        
+        elif "memory dump" in message_lower:
+            if not self.diagnostics:
+                return "Memory diagnostics are turned off."
+            path = f"memory_report_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+            return f"Memory report written to {os.path.abspath(self.diagnostics.dump(path))}"
+        
+        elif "responsiveness report" in message_lower or "lag report" in message_lower:
+            if not self.watchdog:
+                return "The responsiveness watchdog is not running."
+            return self.watchdog.report()
+        
+        elif "prefetch report" in message_lower:
+            if not self.prefetcher:
+                return "Search prefetch is only available in the desktop app."
+            return self.prefetcher.report()
+        
+        elif "sound report" in message_lower:
+            if not self.sound_bank:
+                return "Game sounds are only available in the desktop app."
+            return self.sound_bank.report()
+        
+        elif "start profiling" in message_lower:
+            # Profile files land on this machine's disk; remote sessions may not create them
+            if self.headless:
+                return "Profiling is only available in the desktop app."
+            if start_profiling(self.config.get('profiler_rate', 100), on_finished=self.on_profile_finished) is None:
+                return "A profile is already running. Say \"stop profiling\" to finish it."
+            return (f"Profiling every thread at {self.config.get('profiler_rate', 100)} samples a second. "
+                    f"Say \"stop profiling\" when done; it stops on its own after {PROFILE_MAX_DURATION:.0f} seconds.")
+        
+        elif "stop profiling" in message_lower:
+            result = None if self.headless else stop_profiling()
+            if result is None:
+                return "No profile is running."
+            return format_result(result)
+        
         elif "battery" in message_lower:
             if self.battery:
                 percent = self.battery.percent
@@ -728,17 +813,7 @@ class FuturisticAIChatbot:
 
             else:
                 try:
-                    if sys.platform == 'win32':
-                        from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume
-                        from comtypes import CLSCTX_ALL
-                        from ctypes import cast, POINTER
-                        devices = AudioUtilities.GetSpeakers()
-                        interface = devices.Activate(
-                            IAudioEndpointVolume.iid, CLSCTX_ALL, None)
-                        volume = cast(interface, POINTER(IAudioEndpointVolume))
-                        vol = volume.GetMasterVolumeLevelScalar() * 100
-                    else:
-                        vol = mixer.music.get_volume() * 100
+                    vol = self.volume_control.get()
                     return f"The current volume is at {int(vol)}%."
                 except:
                     return "I couldn't access volume information."
@@ -746,17 +821,17 @@ class FuturisticAIChatbot:
         elif "brightness" in message_lower:
             if "set brightness to" in message_lower or "change brightness to " in message_lower:
                 try:
-                    brightness = int(message.split("set brightness to")[1].strip().replace('%', ''))
+                    keyword = "set brightness to" if "set brightness to" in message_lower else "change brightness to"
+                    brightness = int(message_lower.split(keyword)[1].strip().replace('%', ''))
                     brightness = max(0, min(100, brightness))
-                    sbc.set_brightness(brightness)
                     self.config['brightness'] = brightness
-                    self.save_config()
+                    self.brightness_control.set(brightness)
                     return f"Brightness set to {brightness}%."
                 except:
                     return "I couldn't understand the brightness level you requested."
             else:
                 try:
-                    brightness = sbc.get_brightness()[0]
+                    brightness = self.brightness_control.get()
                     return f"The current brightness is at {brightness}%."
                 except:
                     return "I couldn't access brightness information."
@@ -781,36 +856,33 @@ class FuturisticAIChatbot:
                 expr = ''.join(c for c in expr if c in '0123456789+-*/.^() ')
                 
                 # Calculate
-                result = eval(expr.replace('^', ''))
+                # Runs in a worker process with a timeout, so huge powers can't hang the bot
+                result = self.run_cpu_task('evaluate', expr.replace('^', ''))
                 return f"The result is: {result}"
             except:
                 return "I couldn't understand or calculate that mathematical expression."
         
         # Web search
-        elif self.web_search_var.get() and ("what is" in message_lower or "who is" in message_lower or "search for" in message_lower):
-            query = message
-            if "what is" in message_lower:
-                query = message.split("what is")[1].strip()
-            elif "who is" in message_lower:
-                query = message.split("who is")[1].strip()
-            elif "search for" in message_lower:
-                query = message.split("search for")[1].strip()
-            
-            return self.perform_web_search(query)
+        elif self.web_search_enabled() and search_query(message) is not None:
+            return self.stream_web_search(typed_from(message, typed, search_start(message)).strip())
+        
+        # Offline encyclopedia (only answers when the title is in the index)
+        elif self.encyclopedia and (offline_answer := self.lookup_offline(message, typed)):
+            return offline_answer
         
         # Open websites
         elif "open " in message_lower and not self.game_active:
-            site = message.split("open ")[1].strip()
+            site = typed_after(message, typed, "open ").strip()
             return self.open_website(site)
         
         # Play music on Spotify
         elif "play " in message_lower and ("song" in message_lower or "music" in message_lower) and not self.game_active:
-            song = message.split("play ")[1].replace("song", "").replace("music", "").strip()
+            song = typed_after(message, typed, "play ").replace("song", "").replace("music", "").strip()
             return self.play_spotify_song(song)
         
         # File system access
         elif "open folder" in message_lower or "open directory" in message_lower:
-            path = message.split("open")[1].replace("folder", "").replace("directory", "").strip()
+            path = typed_after(message, typed, "open").replace("folder", "").replace("directory", "").strip()
             return self.open_folder(path)
         
         # Games
@@ -829,81 +901,92 @@ class FuturisticAIChatbot:
         
         # Default response
         else:
-            return self.generate_ai_response(message)
-    
-    def generate_ai_response(self, message):
-        # This is where you would integrate with a more advanced AI model
-        # For now, we'll use simple pattern matching and responses
-        
-        responses = {
-            "how are you": f"I'm functioning optimally, thank you for asking {self.config['user_name']}! How about you?",
-            "what can you do": "I can chat with you, answer questions, perform calculations, open websites, play music on Spotify, control your system settings, and even play games!",
-            "thank you": "You're very welcome! Is there anything else I can help with?",
-            "your name": f"My name is {self.config['bot_name']}. You can change it if you'd like!",
-            "who created you": "I was created by a talented Shashank P to assist you with various tasks and keep you company!",
-            "what's up": "Just processing data and waiting for your commands! What's up with you?",
-            "tell me a joke": "Why don't scientists trust atoms? Because they make up everything!",
-            "help": "I can help with many things! Try asking me to calculate something, open a website, play a song, or even play a game with you."
-        }
-        
-        # Check for close matches
-        matches = get_close_matches(message, responses.keys(), n=1, cutoff=0.6)
+            return self.generate_ai_response(message, typed)
+    
+    def generate_ai_response(self, message, typed=None):
+        # Fuzzy match against the catalogue's fallback triggers
+        catalogue = self.active_catalogue
+        # Workers warmed with this catalogue version already hold the triggers; send just the set's name
+        key_set = fuzzy_key_set(catalogue, 'fallback')
+        if self.task_pool is None or not self.task_pool.has_key_set(key_set):
+            key_set = catalogue.fuzzy_choices('fallback')
+        matches = self.run_cpu_task('fuzzy_match', message, key_set)
         if matches:
-            return responses[matches[0]]
+            return self.render_reply(catalogue.for_trigger('fallback', matches[0]))
+        
+        # Hand anything unmatched to the local language model when one is configured
+        if self.config.get('llm_backend', {}).get('enabled'):
+            return self.stream_llm_response(message if typed is None else typed)
         
         # If no match found
         return "I'm not entirely sure how to respond to that. Could you rephrase or ask something else?"
     
+    def stream_llm_response(self, message):
+        """Stream tokens from the local LLM backend, falling back to the canned answer"""
+        client = get_llm_client(self.config['llm_backend'])
+        persona = self.memory.load_user(self.user_id)
+        history = self.context.render()
+        prompt = PROMPT_BUILDER.build(self.config['bot_name'], persona, message, history)
+        # The history is part of the key: "why?" means something else in every conversation
+        request = client.complete(prompt, session=self.user_id,
+                                  cache_text=PROMPT_BUILDER.cache_text(self.config['bot_name'], persona, message,
+                                                                       history))
+        produced = False
+        try:
+            for token in request:
+                produced = True
+                yield token
+        except LLMError as e:
+            print(f"Error from LLM backend: {e}")
+        if not produced and not request.cancelled.is_set():
+            yield "I'm not entirely sure how to respond to that. Could you rephrase or ask something else?"
+    
+    def cancel_llm_reply(self):
+        settings = self.config.get('llm_backend', {})
+        if settings.get('enabled'):
+            client = get_llm_client(settings, create=False)
+            if client is not None:
+                client.cancel_session(self.user_id)
+    
     def perform_web_search(self, query):
         try:
-            url = f"https://www.google.com/search?q={query.replace(' ', '+')}"
-            headers = {'User-Agent': 'Mozilla/5.0'}
-            
-            response = requests.get(url, headers=headers)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Try to get featured snippet
-            featured = soup.find('div', class_='BNeawe s3v9rd AP7Wnd')
-            if featured:
-                return featured.get_text()
+            # A lookup started while the question was typed is finished or well under way
+            answer = self.prefetcher.take(query, ANSWER_LATENCY_BUDGET) if self.prefetcher else MISS
+            if answer is MISS:
+                answer = self.answer_lookup.lookup(query)
+            if answer:
+                return answer.text
             
-            # Try to get first regular result
-            result = soup.find('div', class_='BNeawe vvjwJb AP7Wnd')
-            if result:
-                return result.get_text()
-            
-            # If nothing found, return a generic response
+            # If nothing found within the latency budget, return a generic response
             return f"I found some results for '{query}' but couldn't extract a concise answer. Would you like me to open the search in your browser?"
         
         except Exception as e:
             return f"I encountered an error while searching: {str(e)}"
     
+    def stream_web_search(self, query):
+        """Yield the lookup answer a sentence at a time so speech can start early"""
+        yield from split_sentences(self.perform_web_search(query))
+    
+    def lookup_offline(self, message, typed):
+        """Answer 'what is' / 'who is' questions from the offline encyclopedia"""
+        message_lower = message.lower()
+        for keyword in ("what is", "who is", "what are", "who was", "what was"):
+            if keyword in message_lower:
+                return self.encyclopedia.lookup(typed_after(message, typed, keyword))
+        return None
+    
     def open_website(self, site):
-        sites = {
-            'youtube': 'https://www.youtube.com',
-            'google': 'https://www.google.com',
-            'facebook': 'https://www.facebook.com',
-            'twitter': 'https://www.twitter.com',
-            'instagram': 'https://www.instagram.com',
-            'linkedin': 'https://www.linkedin.com',
-            'reddit': 'https://www.reddit.com',
-            'wikipedia': 'https://www.wikipedia.org',
-            'amazon': 'https://www.amazon.com',
-            'netflix': 'https://www.netflix.com',
-            'spotify': 'https://www.spotify.com',
-            'github': 'https://www.github.com',
-            'stackoverflow': 'https://stackoverflow.com'
-        }
-        
-        if site in sites:
-            webbrowser.open(sites[site])
+        if site in WEBSITES:
+            self.open_url(WEBSITES[site])
+            self.preview_links([WEBSITES[site]])
             return f"Opening {site.capitalize()} in your default browser."
         else:
             try:
                 # Try to open as URL
                 if not site.startswith(('http://', 'https://')):
                     site = 'https://' + site
-                webbrowser.open(site)
+                self.open_url(site)
+                self.preview_links([site])
                 return f"Attempting to open {site} in your browser."
             except:
                 return f"I don't know how to open {site}. Try specifying a well-known website or a complete URL."
@@ -911,7 +994,7 @@ class FuturisticAIChatbot:
     def play_spotify_song(self, song):
         try:
             # This will only work if Spotify is installed and URI handling is set up
-            webbrowser.open(f"spotify:search:{song}")
+            self.open_url(f"spotify:search:{song}")
             return f"Searching for '{song}' in Spotify."
         except:
             return "I couldn't launch Spotify. Make sure it's installed and properly configured."
@@ -921,7 +1004,9 @@ class FuturisticAIChatbot:
             if not path:
                 path = os.path.expanduser("~")  # Open home directory if no path specified
             
-            if sys.platform == "win32":
+            if self.headless:
+                pass
+            elif sys.platform == "win32":
                 os.startfile(path)
             elif sys.platform == "darwin":
                 os.system(f"open '{path}'")
@@ -936,20 +1021,8 @@ class FuturisticAIChatbot:
         try:
             level = max(0, min(100, level))
             self.config['volume'] = level
-            self.save_config()
-            
-            if sys.platform == 'win32':
-                from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume
-                from comtypes import CLSCTX_ALL
-                from ctypes import cast, POINTER
-                devices = AudioUtilities.GetSpeakers()
-                interface = devices.Activate(
-                    IAudioEndpointVolume.iid, CLSCTX_ALL, None)
-                volume = cast(interface, POINTER(IAudioEndpointVolume))
-                volume.SetMasterVolumeLevelScalar(level / 100, None)
-            else:
-                mixer.music.set_volume(level / 100)
-            
+            # Queued on the device thread; rapid steps collapse into one write
+            self.volume_control.set(level)
             return True
         except:
             return False
@@ -977,8 +1050,9 @@ class FuturisticAIChatbot:
             return "Let's play Tic Tac Toe! You're X and I'm O. The board is numbered 1-9 left to right, top to bottom. Say a number to make your move."
         
         elif "hangman" in game:
-            words = ['python', 'javascript', 'computer', 'algorithm', 'programming', 
-                    'developer', 'artificial', 'intelligence', 'machine', 'learning']
+            words = HANGMAN_WORDS
+            if _shared_index is not None and 'hangman' in _shared_index:
+                words = _shared_index.section('hangman')[1]['words']
             word = random.choice(words)
             self.current_game = {
                 'type': 'hangman',
@@ -1012,13 +1086,16 @@ class FuturisticAIChatbot:
                 self.current_game['attempts'] += 1
                 
                 if guess < self.current_game['secret']:
+                    self.play_sound('wrong')
                     return "Too low! Try a higher number."
                 elif guess > self.current_game['secret']:
+                    self.play_sound('wrong')
                     return "Too high! Try a lower number."
                 else:
                     attempts = self.current_game['attempts']
                     self.game_active = False
                     self.current_game = None
+                    self.play_sound('win')
                     return f"Congratulations! You guessed the number in {attempts} attempts."
             except:
                 return "Please enter a valid number between 1 and 100."
@@ -1032,15 +1109,18 @@ class FuturisticAIChatbot:
                 row, col = pos // 3, pos % 3
                 
                 if self.current_game['board'][row][col] != ' ':
+                    self.play_sound('wrong')
                     return "That position is already taken! Try another one."
                 
                 # Player move
                 self.current_game['board'][row][col] = self.current_game['player']
+                self.play_sound('move')
                 
                 # Check if player won
                 if self.check_ttt_win(self.current_game['player']):
                     self.game_active = False
                     self.current_game = None
+                    self.play_sound('win')
                     return "Congratulations! You won! Here's the final board:\n" + self.format_ttt_board()
                 
                 # Check for draw
@@ -1056,6 +1136,7 @@ class FuturisticAIChatbot:
                 if self.check_ttt_win(self.current_game['bot']):
                     self.game_active = False
                     self.current_game = None
+                    self.play_sound('lose')
                     return "I won! Better luck next time. Here's the final board:\n" + self.format_ttt_board()
                 
                 # Check for draw after bot move
@@ -1068,117 +1149,612 @@ class FuturisticAIChatbot:
             except:
                 return "Please enter a number between 1 and 9 to make your move."
         
-        elif game_type == 'hangman':
-            if len(message) != 1 or not message.isalpha():
-                return "Please guess a single letter."
-            
-            letter = message.lower()
-            
-            if letter in self.current_game['used_letters']:
-                return "You've already guessed that letter. Try another one."
-            
-            self.current_game['used_letters'].add(letter)
-            
-            word = self.current_game['word']
-            guessed = self.current_game['guessed']
-            found = False
-            
-            for i, c in enumerate(word):
-                if c == letter:
-                    guessed[i] = letter
-                    found = True
-            
-            if found:
-                if '_' not in guessed:
-                    self.game_active = False
-                    self.current_game = None
-                    return f"Congratulations! You guessed the word: {word}"
-                return f"Correct! The word now looks like: {' '.join(guessed)}. Incorrect guesses: {self.current_game['incorrect']}/{self.current_game['max_incorrect']}"
-            else:
-                self.current_game['incorrect'] += 1
-                remaining = self.current_game['max_incorrect'] - self.current_game['incorrect']
-                
-                if self.current_game['incorrect'] >= self.current_game['max_incorrect']:
-                    self.game_active = False
-                    self.current_game = None
-                    return f"Game over! The word was: {word}"
-                
-                return f"Incorrect! You have {remaining} guesses left. Word: {' '.join(guessed)}"
+        elif game_type == 'hangman':
+            if len(message) != 1 or not message.isalpha():
+                return "Please guess a single letter."
+            
+            letter = message.lower()
+            
+            if letter in self.current_game['used_letters']:
+                self.play_sound('wrong')
+                return "You've already guessed that letter. Try another one."
+            
+            self.current_game['used_letters'].add(letter)
+            
+            word = self.current_game['word']
+            guessed = self.current_game['guessed']
+            found = False
+            
+            for i, c in enumerate(word):
+                if c == letter:
+                    guessed[i] = letter
+                    found = True
+            
+            if found:
+                if '_' not in guessed:
+                    self.game_active = False
+                    self.current_game = None
+                    self.play_sound('win')
+                    return f"Congratulations! You guessed the word: {word}"
+                self.play_sound('move')
+                return f"Correct! The word now looks like: {' '.join(guessed)}. Incorrect guesses: {self.current_game['incorrect']}/{self.current_game['max_incorrect']}"
+            else:
+                self.current_game['incorrect'] += 1
+                remaining = self.current_game['max_incorrect'] - self.current_game['incorrect']
+                
+                if self.current_game['incorrect'] >= self.current_game['max_incorrect']:
+                    self.game_active = False
+                    self.current_game = None
+                    self.play_sound('lose')
+                    return f"Game over! The word was: {word}"
+                
+                self.play_sound('wrong')
+                return f"Incorrect! You have {remaining} guesses left. Word: {' '.join(guessed)}"
+        
+        return "I didn't understand that game input. Say 'quit game' to stop playing."
+    
+    def check_ttt_win(self, player):
+        board = self.current_game['board']
+        
+        # Check rows
+        for row in board:
+            if all(cell == player for cell in row):
+                return True
+        
+        # Check columns
+        for col in range(3):
+            if all(board[row][col] == player for row in range(3)):
+                return True
+        
+        # Check diagonals
+        if all(board[i][i] == player for i in range(3)):
+            return True
+        if all(board[i][2-i] == player for i in range(3)):
+            return True
+        
+        return False
+    
+    def bot_ttt_move(self):
+        board = self.current_game['board']
+        bot = self.current_game['bot']
+        player = self.current_game['player']
+        
+        # Simple AI: first try to win, then block player, then take center, then corners, then random
+        for i in range(3):
+            for j in range(3):
+                if board[i][j] == ' ':
+                    # Test if this move would win
+                    board[i][j] = bot
+                    if self.check_ttt_win(bot):
+                        return
+                    board[i][j] = ' '
+        
+        for i in range(3):
+            for j in range(3):
+                if board[i][j] == ' ':
+                    # Test if this move would block player
+                    board[i][j] = player
+                    if self.check_ttt_win(player):
+                        board[i][j] = bot
+                        return
+                    board[i][j] = ' '
+        
+        # Take center if available
+        if board[1][1] == ' ':
+            board[1][1] = bot
+            return
+        
+        # Take a corner
+        corners = [(0, 0), (0, 2), (2, 0), (2, 2)]
+        for i, j in corners:
+            if board[i][j] == ' ':
+                board[i][j] = bot
+                return
+        
+        # Take any available space
+        for i in range(3):
+            for j in range(3):
+                if board[i][j] == ' ':
+                    board[i][j] = bot
+                    return
+    
+    def format_ttt_board(self):
+        board = self.current_game['board']
+        lines = []
+        for row in board:
+            lines.append(" | ".join(row))
+            lines.append("-" * 9)
+        return "\n".join(lines[:-1])  # Remove last line of dashes
+
+class FuturisticAIChatbot(ChatbotCore):
+    def __init__(self, root):
+        self.root = root
+        self.root.title("Nexus AI - Futuristic Chatbot")
+        self.root.geometry("1200x800")
+        self.root.minsize(1000, 700)
+        
+        super().__init__(task_pool=TaskPool(TASK_POOL_WORKERS, settings=task_pool_settings(),
+                                            default_timeout=TASK_TIMEOUT))
+        
+        # Per-message spans across the listen, handler and speech threads
+        self.tracer = Tracer(TRACE_FILE, enabled=self.config.get('tracing_enabled', True))
+        
+        # Game sounds are decoded once, off the startup path, and played on reserved mixer channels
+        try:
+            self.sound_bank = SoundBank()
+            threading.Thread(target=self.sound_bank.preload, daemon=True).start()
+        except Exception as e:
+            print(f"Error initializing audio mixer: {e}")
+        
+        # Speech output runs on one long-lived thread that owns the engine
+        self.stream_metrics = StreamMetrics()
+        self.speech = SpeechWorker(self.create_speech_engine, before_utterance=self.apply_speech_volume,
+                                   metrics=self.stream_metrics, tracer=self.tracer)
+        
+        # Speech recognition
+        self.recognizer = sr.Recognizer()
+        self.microphone = sr.Microphone()
+        
+        # The offline decoder loads once in the background and stays resident
+        self.offline_recognizer = None
+        threading.Thread(target=self.load_offline_recognizer, daemon=True).start()
+        
+        # Completions for the input box: known commands plus messages the user sends often
+        self.typeahead = TypeaheadIndex()
+        for phrase in command_phrases():
+            self.typeahead.add(phrase)
+        try:
+            self.typeahead.load(TYPEAHEAD_FILE)
+        except Exception as e:
+            print(f"Error loading typeahead history: {e}")
+        self.is_listening = False
+        
+        if self.config.get('search_prefetch', True):
+            self.prefetcher = SearchPrefetcher(self.answer_lookup.lookup, normalize=self.spell_normalizer.normalize,
+                                               debounce=PREFETCH_DEBOUNCE, max_inflight=PREFETCH_MAX_INFLIGHT)
+        
+        # Create GUI
+        self.setup_gui()
+        self.apply_theme()
+        
+        # Low-overhead memory sampling for long-running kiosk sessions
+        mode = self.config.get('memory_diagnostics', 'sampling')
+        if mode != 'off':
+            self.diagnostics = MemoryDiagnostics(
+                mode=mode, dump_path=self.config.get('memory_dump_file'),
+                counters={'tk_widgets': self.count_widgets, 'chat_lines': self.count_chat_lines},
+                schedule=self.root.after
+            ).start()
+        
+        # Heartbeat through the Tk loop; a monitor thread records every thread's stack when it stalls
+        if self.config.get('stall_watchdog', True):
+            self.watchdog = StallWatchdog(self.root.after, interval=HEARTBEAT_INTERVAL,
+                                          threshold=STALL_THRESHOLD, log_path=STALL_LOG_FILE).start()
+        
+        # Start with greeting
+        self.add_bot_message(f"Hello {self.config['user_name']}! I'm {self.config['bot_name']}, your futuristic AI assistant. How can I help you today?")
+        
+        # Start background monitoring
+        self.update_system_info()
+    
+    def create_speech_engine(self):
+        """Create the speech engine (called once, on the speech thread)"""
+        engine = pyttsx3.init()
+        engine.setProperty('rate', 150)
+        self.apply_speech_volume(engine)
+        return engine
+    
+    def apply_speech_volume(self, engine):
+        engine.setProperty('volume', self.config.get('volume', 70) / 100)
+    
+    def setup_gui(self):
+        # Configure grid
+        self.root.grid_columnconfigure(0, weight=1)
+        self.root.grid_rowconfigure(1, weight=1)
+        
+        # Top menu bar
+        self.menu_bar = tk.Menu(self.root)
+        
+        # File menu
+        self.file_menu = tk.Menu(self.menu_bar, tearoff=0)
+        self.file_menu.add_command(label="Clear Chat", command=self.clear_chat)
+        self.file_menu.add_command(label="Save Chat", command=self.save_chat)
+        self.file_menu.add_separator()
+        self.file_menu.add_command(label="Exit", command=self.root.quit)
+        self.menu_bar.add_cascade(label="File", menu=self.file_menu)
+        
+        # History menu
+        self.history_menu = tk.Menu(self.menu_bar, tearoff=0)
+        self.update_history_menu()
+        self.menu_bar.add_cascade(label="History", menu=self.history_menu)
+        
+        # Settings menu
+        self.settings_menu = tk.Menu(self.menu_bar, tearoff=0)
+        self.settings_menu.add_command(label="Change Theme", command=self.change_theme)
+        self.settings_menu.add_command(label="Change Names", command=self.change_names)
+        self.settings_menu.add_checkbutton(label="Enable Speech", variable=tk.BooleanVar(value=self.config['speech_enabled']), 
+                                          command=self.toggle_speech)
+        self.settings_menu.add_checkbutton(label="Allow Interruptions", variable=tk.BooleanVar(value=self.config['interrupt_enabled']), 
+                                          command=self.toggle_interrupt)
+        self.settings_menu.add_checkbutton(label="Offline Speech Recognition", variable=tk.BooleanVar(value=self.config.get('speech_engine') == 'offline'), 
+                                          command=self.toggle_offline_speech)
+        self.menu_bar.add_cascade(label="Settings", menu=self.settings_menu)
+        
+        self.root.config(menu=self.menu_bar)
+        
+        # System info bar
+        self.info_bar = tk.Frame(self.root, height=30)
+        self.info_bar.grid(row=0, column=0, sticky="ew", padx=5, pady=2)
+        
+        self.time_label = tk.Label(self.info_bar, text="", font=('Arial', 9))
+        self.time_label.pack(side='right', padx=10)
+        
+        self.battery_label = tk.Label(self.info_bar, text="", font=('Arial', 9))
+        self.battery_label.pack(side='right', padx=10)
+        
+        self.volume_label = tk.Label(self.info_bar, text="", font=('Arial', 9))
+        self.volume_label.pack(side='right', padx=10)
+        
+        self.lag_label = tk.Label(self.info_bar, text="", font=('Arial', 9))
+        self.lag_label.pack(side='right', padx=10)
+        
+        # Chat display
+        self.chat_frame = tk.Frame(self.root)
+        self.chat_frame.grid(row=1, column=0, sticky="nsew", padx=10, pady=5)
+        self.chat_frame.grid_columnconfigure(0, weight=1)
+        self.chat_frame.grid_rowconfigure(0, weight=1)
+        
+        self.chat_display = scrolledtext.ScrolledText(
+            self.chat_frame, wrap=tk.WORD, state='disabled', 
+            font=('Arial', 12), padx=10, pady=10
+        )
+        self.chat_display.grid(row=0, column=0, sticky="nsew")
+        
+        # Custom tag configurations
+        self.chat_display.tag_config('user', foreground=self.config['theme']['text'])
+        self.chat_display.tag_config('bot', foreground=self.config['theme']['highlight'])
+        self.chat_display.tag_config('system', foreground='gray')
+        self.chat_display.tag_config('error', foreground='red')
+        
+        # Input area
+        self.input_frame = tk.Frame(self.root)
+        self.input_frame.grid(row=2, column=0, sticky="ew", padx=10, pady=10)
+        self.input_frame.grid_columnconfigure(0, weight=1)
+        
+        self.user_input = tk.Text(self.input_frame, height=3, font=('Arial', 12))
+        self.user_input.grid(row=0, column=0, sticky="ew", padx=(0, 5))
+        self.user_input.bind('<Return>', self.send_message_event)
+        self.user_input.bind('<KeyRelease>', self.update_suggestions)
+        self.user_input.bind('<KeyRelease>', self.prefetch_search, add='+')
+        self.user_input.bind('<Down>', lambda e: self.move_suggestion(1))
+        self.user_input.bind('<Up>', lambda e: self.move_suggestion(-1))
+        self.user_input.bind('<Tab>', self.accept_suggestion)
+        self.user_input.bind('<Escape>', lambda e: self.hide_suggestions())
+        
+        # Typeahead dropdown, floated just above the input box when there are matches
+        self.suggestion_box = tk.Listbox(self.root, height=5, font=('Arial', 11), activestyle='none',
+                                         exportselection=False)
+        self.suggestion_box.bind('<ButtonRelease-1>', self.accept_suggestion)
+        
+        # Buttons frame
+        self.buttons_frame = tk.Frame(self.input_frame)
+        self.buttons_frame.grid(row=0, column=1, sticky="ns")
+        
+        self.send_button = tk.Button(
+            self.buttons_frame, text="Send", command=self.send_message,
+            bg=self.config['theme']['highlight'], fg='white'
+        )
+        self.send_button.pack(fill='x', pady=2)
+        
+        self.speak_button = tk.Button(
+            self.buttons_frame, text="Speak", command=self.toggle_speech_recognition,
+            bg=self.config['theme']['secondary'], fg='white'
+        )
+        self.speak_button.pack(fill='x', pady=2)
         
-        return "I didn't understand that game input. Say 'quit game' to stop playing."
-    
-    def check_ttt_win(self, player):
-        board = self.current_game['board']
+        self.web_search_var = tk.BooleanVar()
+        self.web_search_check = tk.Checkbutton(
+            self.buttons_frame, text="Web Search", variable=self.web_search_var,
+            bg=self.config['theme']['primary'], fg='white', selectcolor=self.config['theme']['primary']
+        )
+        self.web_search_check.pack(fill='x', pady=2)
         
-        # Check rows
-        for row in board:
-            if all(cell == player for cell in row):
-                return True
+        # Status bar
+        self.status_bar = tk.Label(self.root, text="Ready", bd=1, relief=tk.SUNKEN, anchor=tk.W)
+        self.status_bar.grid(row=3, column=0, sticky="ew", padx=5, pady=2)
         
-        # Check columns
-        for col in range(3):
-            if all(board[row][col] == player for row in range(3)):
-                return True
+    def apply_theme(self):
+        theme = self.config['theme']
+        self.root.config(bg=theme['primary'])
+        self.chat_frame.config(bg=theme['primary'])
+        self.chat_display.config(bg=theme['secondary'], fg='white', insertbackground='white')
+        self.input_frame.config(bg=theme['primary'])
+        self.user_input.config(bg=theme['secondary'], fg='white', insertbackground='white')
+        self.suggestion_box.config(bg=theme['secondary'], fg='white', selectbackground=theme['highlight'])
+        self.info_bar.config(bg=theme['primary'])
+        self.time_label.config(bg=theme['primary'], fg='white')
+        self.battery_label.config(bg=theme['primary'], fg='white')
+        self.volume_label.config(bg=theme['primary'], fg='white')
+        self.lag_label.config(bg=theme['primary'], fg='white')
+        self.buttons_frame.config(bg=theme['primary'])
+        self.send_button.config(bg=theme['highlight'], fg='white', activebackground=theme['text'])
+        self.speak_button.config(bg=theme['secondary'], fg='white', activebackground=theme['text'])
+        self.web_search_check.config(bg=theme['primary'], fg='white', selectcolor=theme['primary'])
+        self.status_bar.config(bg=theme['primary'], fg='white')
         
-        # Check diagonals
-        if all(board[i][i] == player for i in range(3)):
-            return True
-        if all(board[i][2-i] == player for i in range(3)):
-            return True
+    def count_widgets(self):
+        count = 0
+        pending = [self.root]
+        while pending:
+            widget = pending.pop()
+            count += 1
+            pending.extend(widget.winfo_children())
+        return count
+    
+    def count_chat_lines(self):
+        return int(self.chat_display.index('end-1c').split('.')[0])
+    
+    def update_history_menu(self):
+        self.history_menu.delete(0, 'end')
+        self.history_menu.add_command(label="Clear History", command=self.clear_history)
+        self.history_menu.add_separator()
         
-        return False
+        if not self.config['recent_chats']:
+            self.history_menu.add_command(label="No recent chats", state='disabled')
+        else:
+            for chat in reversed(self.config['recent_chats']):
+                self.history_menu.add_command(
+                    label=f"{chat['date']} - {chat['name']}", 
+                    command=lambda c=chat: self.load_chat_history(c['file'])
+                )
     
-    def bot_ttt_move(self):
-        board = self.current_game['board']
-        bot = self.current_game['bot']
-        player = self.current_game['player']
+    def update_system_info(self):
+        now = datetime.datetime.now()
+        self.time_label.config(text=now.strftime("%Y-%m-%d %H:%M:%S"))
         
-        # Simple AI: first try to win, then block player, then take center, then corners, then random
-        for i in range(3):
-            for j in range(3):
-                if board[i][j] == ' ':
-                    # Test if this move would win
-                    board[i][j] = bot
-                    if self.check_ttt_win(bot):
-                        return
-                    board[i][j] = ' '
+        if self.battery:
+            percent = self.battery.percent
+            status = "Charging" if self.battery.power_plugged else "Discharging"
+            self.battery_label.config(text=f"Battery: {percent}% ({status})")
         
-        for i in range(3):
-            for j in range(3):
-                if board[i][j] == ' ':
-                    # Test if this move would block player
-                    board[i][j] = player
-                    if self.check_ttt_win(player):
-                        board[i][j] = bot
-                        return
-                    board[i][j] = ' '
+        # Cached volume; a stale value is refreshed on the device thread
+        vol = self.volume_control.peek()
+        if vol is None:
+            self.volume_label.config(text="Volume: N/A")
+        else:
+            self.volume_label.config(text=f"Volume: {int(vol)}%")
         
-        # Take center if available
-        if board[1][1] == ' ':
-            board[1][1] = bot
+        if self.watchdog:
+            self.lag_label.config(text=self.watchdog.summary())
+        
+        self.root.after(1000, self.update_system_info)
+    
+    def add_user_message(self, message):
+        self.chat_display.config(state='normal')
+        self.chat_display.insert(tk.END, f"{self.config['user_name']}: ", 'user')
+        self.chat_display.insert(tk.END, f"{message}\n", 'user')
+        self.chat_display.config(state='disabled')
+        self.chat_display.see(tk.END)
+    
+    def add_bot_message(self, message):
+        self.chat_display.config(state='normal')
+        self.chat_display.insert(tk.END, f"{self.config['bot_name']}: ", 'bot')
+        self.chat_display.insert(tk.END, f"{message}\n", 'bot')
+        self.chat_display.config(state='disabled')
+        self.chat_display.see(tk.END)
+        
+        if self.config['speech_enabled']:
+            self.speak(message)
+    
+    def add_bot_stream(self, chunks, started_at, trace_id=None):
+        """Append a streamed reply as chunks arrive, speaking each finished sentence"""
+        speak = self.config['speech_enabled']
+        splitter = SentenceSplitter()
+        first_text = True
+        first_sentence = True
+        self.append_chat(f"{self.config['bot_name']}: ", 'bot')
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                if first_text:
+                    self.stream_metrics.record('time_to_first_visible_char', time.perf_counter() - started_at)
+                    first_text = False
+                self.append_chat(chunk, 'bot')
+                if speak:
+                    for sentence in splitter.feed(chunk):
+                        self.speech.say(sentence, started_at, first_sentence, trace_id)
+                        first_sentence = False
+        finally:
+            self.append_chat("\n", 'bot')
+            if speak:
+                for sentence in splitter.flush():
+                    self.speech.say(sentence, started_at, first_sentence, trace_id)
+        self.status_bar.config(text=self.stream_metrics.summary() or "Ready")
+    
+    def append_chat(self, text, tag):
+        self.chat_display.config(state='normal')
+        self.chat_display.insert(tk.END, text, tag)
+        self.chat_display.config(state='disabled')
+        self.chat_display.see(tk.END)
+    
+    def add_system_message(self, message):
+        self.chat_display.config(state='normal')
+        self.chat_display.insert(tk.END, f"System: {message}\n", 'system')
+        self.chat_display.config(state='disabled')
+        self.chat_display.see(tk.END)
+    
+    def add_error_message(self, message):
+        self.chat_display.config(state='normal')
+        self.chat_display.insert(tk.END, f"Error: {message}\n", 'error')
+        self.chat_display.config(state='disabled')
+        self.chat_display.see(tk.END)
+    
+    def speak(self, text, started_at=None):
+        # Queue sentence by sentence so the first one plays while the rest wait
+        sentences = [s.strip() for s in split_sentences(text) if s.strip()]
+        for i, sentence in enumerate(sentences):
+            self.speech.say(sentence, started_at, first=(i == 0), trace_id=self.tracer.current())
+    
+    def toggle_speech_recognition(self):
+        if self.is_listening:
+            self.is_listening = False
+            self.speak_button.config(text="Speak")
+            self.status_bar.config(text="Speech recognition stopped")
+        else:
+            self.is_listening = True
+            self.speak_button.config(text="Listening...")
+            self.status_bar.config(text="Listening... Speak now")
+            threading.Thread(target=self.listen_for_speech).start()
+    
+    def listen_for_speech(self):
+        trace_id = self.tracer.new_trace()
+        with self.microphone as source:
+            self.recognizer.adjust_for_ambient_noise(source)
+            try:
+                if self.offline_recognizer and self.config.get('speech_engine') == 'offline':
+                    # Decoded while the user speaks, so there is no separate recognize stage
+                    with self.tracer.span('listen', trace_id, engine='offline'):
+                        text = self.offline_recognizer.listen(source, timeout=5)
+                else:
+                    with self.tracer.span('listen', trace_id):
+                        audio = self.recognizer.listen(source, timeout=5)
+                    with self.tracer.span('recognize', trace_id):
+                        text = self.recognize_online(audio)
+                self.user_input.delete('1.0', tk.END)
+                self.user_input.insert('1.0', text)
+                self.send_message(trace_id)
+            except sr.WaitTimeoutError:
+                self.status_bar.config(text="Listening timed out")
+            except sr.UnknownValueError:
+                self.status_bar.config(text="Could not understand audio")
+            except sr.RequestError as e:
+                self.add_error_message(f"Speech recognition error: {str(e)}")
+            finally:
+                self.is_listening = False
+                self.speak_button.config(text="Speak")
+                self.status_bar.config(text="Ready")
+    
+    def load_offline_recognizer(self):
+        try:
+            self.offline_recognizer = OfflineRecognizer(command_phrases())
+        except ImportError:
+            pass  # pocketsphinx not installed; online recognition only
+        except Exception as e:
+            print(f"Error loading offline speech recognition: {e}")
+    
+    def recognize_online(self, audio):
+        try:
+            return self.recognizer.recognize_google(audio)
+        except sr.RequestError:
+            # No network: fall back to the resident offline decoder if there is one
+            if self.offline_recognizer is None:
+                raise
+            return self.offline_recognizer.recognize(audio)
+    
+    def send_message_event(self, event):
+        # Enter on a highlighted suggestion sends that suggestion
+        if self.suggestion_box.winfo_ismapped() and self.suggestion_box.curselection():
+            self.accept_suggestion()
+        self.send_message()
+        return 'break'  # Prevent default Enter key behavior
+    
+    def update_suggestions(self, event=None):
+        if event is not None and event.keysym in ('Up', 'Down', 'Return', 'Tab', 'Escape'):
+            return
+        text = self.user_input.get('1.0', 'end-1c')
+        suggestions = self.typeahead.suggest(text) if text.strip() and '\n' not in text else []
+        if not suggestions:
+            self.hide_suggestions()
+            return
+        self.suggestion_box.delete(0, tk.END)
+        for suggestion in suggestions:
+            self.suggestion_box.insert(tk.END, suggestion)
+        self.suggestion_box.config(height=len(suggestions))
+        row_height = Font(font=self.suggestion_box.cget('font')).metrics('linespace') + 2
+        self.suggestion_box.place(in_=self.user_input, x=0, y=-row_height * len(suggestions) - 4, relwidth=0.6)
+        self.suggestion_box.lift()
+    
+    def prefetch_search(self, event=None):
+        if not self.prefetcher:
+            return
+        # Turning Web Search off leaves nothing to prefetch; the empty text drops anything pending
+        text = self.user_input.get('1.0', 'end-1c') if self.web_search_var.get() else ''
+        self.prefetcher.typed(text)
+    
+    def move_suggestion(self, step):
+        if not self.suggestion_box.winfo_ismapped():
+            return None
+        current = self.suggestion_box.curselection()
+        index = (current[0] + step) if current else (0 if step > 0 else self.suggestion_box.size() - 1)
+        index = max(0, min(self.suggestion_box.size() - 1, index))
+        self.suggestion_box.selection_clear(0, tk.END)
+        self.suggestion_box.selection_set(index)
+        return 'break'
+    
+    def accept_suggestion(self, event=None):
+        if not self.suggestion_box.winfo_ismapped():
+            return None
+        current = self.suggestion_box.curselection()
+        index = current[0] if current else 0
+        self.user_input.delete('1.0', tk.END)
+        self.user_input.insert('1.0', self.suggestion_box.get(index))
+        self.hide_suggestions()
+        self.user_input.focus_set()
+        return 'break'
+    
+    def hide_suggestions(self):
+        self.suggestion_box.place_forget()
+        self.suggestion_box.selection_clear(0, tk.END)
+    
+    def send_message(self, trace_id=None):
+        message = self.user_input.get('1.0', tk.END).strip()
+        if not message:
             return
         
-        # Take a corner
-        corners = [(0, 0), (0, 2), (2, 0), (2, 2)]
-        for i, j in corners:
-            if board[i][j] == ' ':
-                board[i][j] = bot
-                return
+        # Typed messages start their trace here; spoken ones carry it from listen_for_speech
+        trace_id = trace_id or self.tracer.new_trace()
+        with self.tracer.span('send', trace_id, chars=len(message)):
+            self.add_user_message(message)
+            self.user_input.delete('1.0', tk.END)
+            self.hide_suggestions()
+            self.typeahead.record_message(message)
+            
+            # A new message cuts off whatever is still queued to be spoken
+            if self.config['interrupt_enabled']:
+                self.speech.interrupt()
         
-        # Take any available space
-        for i in range(3):
-            for j in range(3):
-                if board[i][j] == ' ':
-                    board[i][j] = bot
-                    return
+        # Process message in a separate thread to keep GUI responsive
+        threading.Thread(target=self.process_message, args=(message, time.perf_counter(), trace_id)).start()
     
-    def format_ttt_board(self):
-        board = self.current_game['board']
-        lines = []
-        for row in board:
-            lines.append(" | ".join(row))
-            lines.append("-" * 9)
-        return "\n".join(lines[:-1])  # Remove last line of dashes
+    def process_message(self, message, started_at=None, trace_id=None):
+        if started_at is None:
+            started_at = time.perf_counter()
+        with self.tracer.activate(trace_id), self.tracer.span('process'):
+            try:
+                with self.tracer.span('display'):
+                    self.add_bot_stream(self.respond_stream(message), started_at, trace_id)
+            except Exception as e:
+                self.add_error_message(f"Error processing message: {str(e)}")
+    
+    def web_search_enabled(self):
+        return self.web_search_var.get()
+    
+    def on_bot_renamed(self, new_name):
+        self.root.title(f"{new_name} - Futuristic Chatbot")
+    
+    def on_link_preview(self, preview):
+        # Called from a fetch thread; Tk is updated from the main loop
+        self.root.after(0, self.add_system_message, preview.describe())
+    
+    def on_profile_finished(self, result):
+        self.root.after(0, self.add_system_message, format_result(result))
+    
+    def play_sound(self, name):
+        if not self.sound_bank or not self.config.get('game_sounds', True):
+            return
+        # Keep effects under the voice while a reply is being spoken
+        self.sound_bank.play(name, volume=self.config.get('volume', 70) / 100, duck=self.speech.speaking)
     
     def change_theme(self):
         color = colorchooser.askcolor(title="Choose theme color")
@@ -1242,10 +1818,22 @@ class FuturisticAIChatbot:
         else:
             self.add_system_message("Interruptions disabled")
     
+    def toggle_offline_speech(self):
+        self.config['speech_engine'] = 'google' if self.config.get('speech_engine') == 'offline' else 'offline'
+        self.save_config()
+        if self.config['speech_engine'] == 'offline':
+            if self.offline_recognizer:
+                self.add_system_message("Offline speech recognition enabled")
+            else:
+                self.add_system_message("Offline speech recognition enabled, but pocketsphinx is not available")
+        else:
+            self.add_system_message("Offline speech recognition disabled")
+    
     def clear_chat(self):
         self.chat_display.config(state='normal')
         self.chat_display.delete('1.0', tk.END)
         self.chat_display.config(state='disabled')
+        self.context.clear()
     
     def save_chat(self):
         content = self.chat_display.get('1.0', tk.END)
@@ -1304,14 +1892,58 @@ class FuturisticAIChatbot:
             self.add_system_message("Chat history cleared")
     
     def on_closing(self):
+        if self.watchdog:
+            self.watchdog.stop()
+        self.speech.stop()
+        if self.sound_bank:
+            self.sound_bank.close()
+        if self.prefetcher:
+            self.prefetcher.close()
+        self.tracer.close()
+        if self.diagnostics:
+            self.diagnostics.stop()
+        self.task_pool.close()
+        previewer = get_link_previewer(create=False)
+        if previewer:
+            previewer.close()
+        semantic_memory = get_semantic_memory(create=False)
+        if semantic_memory:
+            semantic_memory.close()
+        try:
+            self.typeahead.save(TYPEAHEAD_FILE)
+        except OSError as e:
+            print(f"Error saving typeahead history: {e}")
+        self.volume_control.close()
+        self.brightness_control.close()
         self.save_config()
+        self.memory.close()
         self.root.destroy()
 
 def main():
-    root = tk.Tk()
-    app = FuturisticAIChatbot(root)
-    root.protocol("WM_DELETE_WINDOW", app.on_closing)
-    root.mainloop()
+    argv = sys.argv[1:]
+    if "--profile" in argv:
+        # Sample from startup to exit; the files are written when the app closes
+        argv.remove("--profile")
+        rate = 100
+        if "--profile-rate" in argv:
+            i = argv.index("--profile-rate")
+            rate = int(argv[i + 1])
+            del argv[i:i + 2]
+        start_profiling(rate, max_duration=None)
+    try:
+        if "--batch" in argv:
+            # batch.py imports this module by name; reuse the running copy instead of loading it twice
+            sys.modules.setdefault("AI", sys.modules[__name__])
+            import batch
+            sys.exit(batch.main(argv))
+        root = tk.Tk()
+        app = FuturisticAIChatbot(root)
+        root.protocol("WM_DELETE_WINDOW", app.on_closing)
+        root.mainloop()
+    finally:
+        result = stop_profiling()
+        if result:
+            print(format_result(result), file=sys.stderr)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,467 @@
+"""Answers for "what is" / "who is" questions from several sources at once
+
+Blocking sources run on a small shared thread pool. Each fetch gets the
+lookup's deadline: it is the socket timeout, and the body is read in chunks
+that stop at the deadline or as soon as the lookup has its answer, so a
+losing source's thread is free again by the time the budget runs out.
+While every thread is busy, blocking sources are skipped rather than queued
+behind fetches that are still running.
+
+    python answer_lookup.py --selftest     # runs against local stub servers
+"""
+import asyncio
+import json
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from difflib import get_close_matches
+from urllib.parse import quote
+
+from shared_index import StringMap
+
+# Blocking HTTP calls run here rather than in asyncio's default executor, so a
+# lookup can return as soon as it has an answer instead of waiting for the
+# slower sources' threads to finish
+MAX_BLOCKING_FETCHES = 8
+_executor = ThreadPoolExecutor(max_workers=MAX_BLOCKING_FETCHES, thread_name_prefix="answer-lookup")
+
+USER_AGENT = "Mozilla/5.0"
+
+
+class Answer:
+    def __init__(self, text, source, elapsed):
+        self.text = text
+        self.source = source
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return f"Answer({self.source!r}, {self.elapsed * 1000:.0f} ms, {self.text[:40]!r})"
+
+
+class FetchSlots:
+    """Counts fetches holding a pool thread; a fetch that finds none free is skipped"""
+
+    def __init__(self, size):
+        self.size = size
+        self.in_use = 0
+        self.peak = 0
+        self.skipped = 0
+        self.lock = threading.Lock()
+
+    def claim(self):
+        with self.lock:
+            if self.in_use >= self.size:
+                self.skipped += 1
+                return False
+            self.in_use += 1
+            self.peak = max(self.peak, self.in_use)
+            return True
+
+    def release(self, future=None):
+        with self.lock:
+            self.in_use -= 1
+
+
+_slots = FetchSlots(MAX_BLOCKING_FETCHES)
+
+
+def read_page(url, deadline, stop, chunk_size=16384):
+    """(status, body text) of a GET, or None once the deadline passes or stop is set"""
+    import requests
+
+    remaining = deadline - time.monotonic()
+    if remaining <= 0 or stop.is_set():
+        return None
+    # The socket timeout bounds connecting and each read; the loop below bounds the whole body
+    with requests.get(url, headers={'User-Agent': USER_AGENT}, timeout=remaining, stream=True) as response:
+        chunks = []
+        while True:
+            if stop.is_set() or time.monotonic() > deadline:
+                return None
+            # read1 returns what has arrived (up to chunk_size) instead of waiting for a full chunk
+            chunk = response.raw.read1(chunk_size, decode_content=True)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return response.status_code, b"".join(chunks).decode(response.encoding or 'utf-8', errors='replace')
+
+
+class AnswerSource:
+    """One place an answer can come from; fetch() returns text or None"""
+
+    name = "source"
+
+    async def fetch(self, query, timeout):
+        raise NotImplementedError
+
+
+class BlockingSource(AnswerSource):
+    """Adapter for sources implemented with blocking calls"""
+
+    async def fetch(self, query, timeout):
+        if not _slots.claim():
+            return None
+        deadline = time.monotonic() + timeout
+        # Set when the lookup is done with this source, answered or not
+        stop = threading.Event()
+        future = _executor.submit(self.run_blocking, query, deadline, stop)
+        # Also runs when a fetch still queued is cancelled
+        future.add_done_callback(_slots.release)
+        try:
+            return await asyncio.wrap_future(future)
+        finally:
+            stop.set()
+
+    def run_blocking(self, query, deadline, stop):
+        if stop.is_set() or time.monotonic() >= deadline:
+            return None
+        return self.fetch_blocking(query, deadline, stop)
+
+    def fetch_blocking(self, query, deadline, stop):
+        """Text or None; give up at deadline (a time.monotonic() value) or when stop is set"""
+        raise NotImplementedError
+
+
+class SearchPageSource(BlockingSource):
+    """Featured snippet or first result scraped from a search results page"""
+
+    name = "search"
+
+    def __init__(self, base_url="https://www.google.com/search", task_pool=None):
+        self.base_url = base_url
+        self.task_pool = task_pool
+
+    def fetch_blocking(self, query, deadline, stop):
+        # The download stays on this thread; a slow page must not hold a CPU worker
+        page = read_page(f"{self.base_url}?q={query.replace(' ', '+')}", deadline, stop)
+        if page is None:
+            return None
+        if self.task_pool is not None:
+            # Parse in a worker process; only the page and the snippet cross over
+            return self.task_pool.run('search_snippet', page[1], timeout=max(0.1, deadline - time.monotonic()) + 1)
+        return parse_search_snippet(page[1])
+
+
+def parse_search_snippet(page):
+    """Featured snippet, else the first regular result, from a search results page"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(page, 'html.parser')
+    for css_class in ('BNeawe s3v9rd AP7Wnd', 'BNeawe vvjwJb AP7Wnd'):
+        found = soup.find('div', class_=css_class)
+        if found:
+            return found.get_text()
+    return None
+
+
+class EncyclopediaSource(BlockingSource):
+    """Page summary from a Wikipedia-style REST summary endpoint"""
+
+    name = "encyclopedia"
+
+    def __init__(self, base_url="https://en.wikipedia.org/api/rest_v1/page/summary/"):
+        self.base_url = base_url
+
+    def fetch_blocking(self, query, deadline, stop):
+        title = quote(query.strip().rstrip('?').replace(' ', '_'))
+        page = read_page(self.base_url + title, deadline, stop)
+        if page is None or page[0] != 200:
+            return None
+        data = json.loads(page[1])
+        if data.get('type') == 'disambiguation':
+            return None
+        return data.get('extract')
+
+
+class KnowledgeBaseSource(BlockingSource):
+    """Answers from a local {topic: answer} mapping, matched fuzzily"""
+
+    name = "knowledge_base"
+
+    def __init__(self, entries=None):
+        if isinstance(entries, StringMap):
+            # Mapped from a shared index, already keyed by normalized topic
+            self.entries = entries
+        else:
+            self.entries = {normalize_topic(topic): answer for topic, answer in (entries or {}).items()}
+
+    def fetch_blocking(self, query, deadline, stop):
+        # get_close_matches scans every topic; on the event loop it would hold up the other sources
+        matches = get_close_matches(normalize_topic(query), self.entries.keys(), n=1, cutoff=0.85)
+        return self.entries[matches[0]] if matches else None
+
+
+class OfflineEncyclopediaSource(AnswerSource):
+    """Answers from the memory-mapped offline encyclopedia index
+
+    The lookup itself takes microseconds, so the answer is held back for
+    `grace` seconds to let online sources win when the network is fast.
+    """
+
+    name = "offline_encyclopedia"
+
+    def __init__(self, index, grace=0.8):
+        self.index = index
+        self.grace = grace
+
+    async def fetch(self, query, timeout):
+        text = self.index.lookup(query)
+        if text and self.grace:
+            await asyncio.sleep(min(self.grace, timeout))
+        return text
+
+
+def normalize_topic(text):
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    text = re.sub(r"^(a|an|the)\s+", "", text.strip())
+    return " ".join(text.split())
+
+
+def is_good_answer(text, min_length=20):
+    """Cheap quality check applied before an answer is accepted"""
+    if not text:
+        return False
+    text = text.strip()
+    if len(text) < min_length:
+        return False
+    if "may refer to" in text.lower():
+        return False
+    return True
+
+
+class AnswerLookup:
+    """Query several sources concurrently and keep the first good answer
+
+    Sources run in parallel; the first answer that passes is_good_answer()
+    within `budget` seconds wins and the remaining fetches are cancelled.
+    """
+
+    def __init__(self, sources, budget=3.0, quality_check=is_good_answer):
+        self.sources = sources
+        self.budget = budget
+        self.quality_check = quality_check
+
+    async def lookup_async(self, query):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + self.budget
+        tasks = {
+            asyncio.ensure_future(source.fetch(query, self.budget)): (i, source)
+            for i, source in enumerate(self.sources)
+        }
+        try:
+            while tasks:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                done, _ = await asyncio.wait(tasks, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                # When several finish together, prefer the earlier-listed source
+                for task in sorted(done, key=lambda t: tasks[t][0]):
+                    _, source = tasks.pop(task)
+                    if task.cancelled() or task.exception() is not None:
+                        continue
+                    text = task.result()
+                    if self.quality_check(text):
+                        return Answer(text.strip(), source.name, loop.time() - start)
+            return None
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    def lookup(self, query):
+        """Blocking entry point for handler threads"""
+        return asyncio.run(self.lookup_async(query))
+
+
+def create_answer_lookup(knowledge_base=None, budget=3.0, encyclopedia=None, task_pool=None):
+    sources = [SearchPageSource(task_pool=task_pool), EncyclopediaSource()]
+    if knowledge_base:
+        sources.insert(0, KnowledgeBaseSource(knowledge_base))
+    if encyclopedia is not None:
+        sources.append(OfflineEncyclopediaSource(encyclopedia))
+    return AnswerLookup(sources, budget=budget)
+
+
+def stub_server():
+    """Local search page and summary endpoints whose delay is part of the URL; returns (server, base_url)
+
+    /search/<delay>?q=...          search results page with a snippet div
+    /summary/<delay>/<title>       JSON summary; titles starting "Ambiguous" are disambiguation pages
+    /drip/<seconds>/<title>        a summary trickled out a byte every 50 ms for that long
+    """
+    import http.server
+    from urllib.parse import parse_qs, unquote, urlsplit
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        hits = {}
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_body(self, body, content_type):
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            kind, delay, *rest = parts.path.strip('/').split('/')
+            Handler.hits[kind] = Handler.hits.get(kind, 0) + 1
+            time.sleep(float(delay))
+            try:
+                if kind == 'search':
+                    query = parse_qs(parts.query).get('q', [''])[0]
+                    body = f"<html><body><div class='BNeawe s3v9rd AP7Wnd'>{query} answer from the search page, long enough to pass</div></body></html>"
+                    self.send_body(body.encode(), "text/html; charset=utf-8")
+                elif kind == 'summary':
+                    title = unquote(rest[0]).replace('_', ' ')
+                    data = {'type': 'standard', 'extract': f"{title} answer from the summary endpoint, long enough to pass"}
+                    if title.startswith("Ambiguous"):
+                        data = {'type': 'disambiguation', 'extract': f"{title} may refer to several things"}
+                    self.send_body(json.dumps(data).encode(), "application/json")
+                elif kind == 'drip':
+                    # Never idle long enough for a socket timeout; only a deadline on the whole body stops it
+                    steps = int(float(rest[0]) / 0.05)
+                    self.send_response(200)
+                    self.send_header('Content-Type', "application/json")
+                    self.send_header('Content-Length', str(steps))
+                    self.end_headers()
+                    for _ in range(steps):
+                        self.wfile.write(b" ")
+                        self.wfile.flush()
+                        time.sleep(0.05)
+                else:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+            except (BrokenPipeError, ConnectionResetError):
+                # The lookup hung up after its budget ran out
+                pass
+
+    class Server(http.server.ThreadingHTTPServer):
+        daemon_threads = True
+
+        def handle_error(self, request, client_address):
+            pass
+
+    server = Server(('127.0.0.1', 0), Handler)
+    server.hits = Handler.hits
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class StubIndex:
+    """Offline encyclopedia stand-in that knows every title"""
+
+    def lookup(self, query):
+        return f"{query} answer from the offline encyclopedia, long enough to pass"
+
+
+def selftest():
+    server, base = stub_server()
+    failures = []
+
+    def check(name, condition, detail=""):
+        print(f"{'ok  ' if condition else 'FAIL'} {name} {detail}")
+        if not condition:
+            failures.append(name)
+
+    def lookup(search_delay, summary_delay, budget=2.0, extra=()):
+        sources = [SearchPageSource(f"{base}/search/{search_delay}"),
+                   EncyclopediaSource(f"{base}/summary/{summary_delay}/"), *extra]
+        server.hits.clear()
+        start = time.monotonic()
+        answer = AnswerLookup(sources, budget=budget).lookup("Ada Lovelace")
+        return answer, time.monotonic() - start
+
+    try:
+        # Warm up the HTTP stack so the first timing is not an import
+        lookup(0, 0)
+        # Let the warm-up's losing request land before hits are counted
+        time.sleep(0.2)
+        answer, elapsed = lookup(0.4, 0.4)
+        check("fan-out: sources queried together", server.hits == {'search': 1, 'summary': 1} and elapsed < 0.7,
+              f"({elapsed:.2f}s for two 0.4s sources, hits {server.hits})")
+        answer, elapsed = lookup(0.1, 1.0)
+        check("first good answer wins", answer is not None and answer.source == "search" and elapsed < 0.6,
+              f"({answer!r} in {elapsed:.2f}s)")
+        answer, elapsed = lookup(1.0, 0.1)
+        check("a faster later source wins", answer is not None and answer.source == "encyclopedia" and elapsed < 0.6,
+              f"({answer!r} in {elapsed:.2f}s)")
+        sources = [EncyclopediaSource(f"{base}/summary/0/"), SearchPageSource(f"{base}/search/0.3")]
+        answer = AnswerLookup(sources, budget=2.0).lookup("Ambiguous Mercury")
+        check("disambiguation pages skipped", answer is not None and answer.source == "search", repr(answer))
+        answer, elapsed = lookup(2.0, 2.0, budget=0.5)
+        check("timeout", answer is None and elapsed < 0.8, f"({elapsed:.2f}s with a 0.5s budget)")
+        offline = OfflineEncyclopediaSource(StubIndex(), grace=0.4)
+        answer, elapsed = lookup(0.1, 2.0, extra=[offline])
+        check("grace: a fast online source beats the offline index", answer is not None and answer.source == "search",
+              f"({answer!r} in {elapsed:.2f}s)")
+        answer, elapsed = lookup(2.0, 2.0, extra=[offline])
+        check("grace: the offline index answers when the network is slow",
+              answer is not None and answer.source == "offline_encyclopedia" and 0.35 < elapsed < 0.7,
+              f"({answer!r} in {elapsed:.2f}s)")
+        answer, elapsed = lookup(2.0, 2.0, budget=0.2, extra=[offline])
+        check("grace is cut short by the budget", answer is None and elapsed < 0.5, f"({elapsed:.2f}s)")
+
+        # A large knowledge base is matched off the event loop, so the loop keeps ticking meanwhile
+        knowledge = KnowledgeBaseSource({f"topic number {i}": f"answer {i} " * 5 for i in range(30000)})
+
+        async def measure():
+            lag = 0.0
+            task = asyncio.ensure_future(AnswerLookup([knowledge], budget=5.0).lookup_async("topic number 17"))
+            while not task.done():
+                tick = time.monotonic()
+                await asyncio.sleep(0.01)
+                lag = max(lag, time.monotonic() - tick - 0.01)
+            return task.result(), lag
+
+        answer, lag = asyncio.run(measure())
+        check("knowledge base matched off the event loop", answer is not None and lag < 0.1,
+              f"({answer!r}, loop lag {lag * 1000:.0f} ms)")
+
+        # A losing source trickling its body stops once the lookup is answered, not when the body ends
+        time.sleep(2.2)
+        sources = [SearchPageSource(f"{base}/search/0.1"), EncyclopediaSource(f"{base}/drip/0/3/")]
+        answer = AnswerLookup(sources, budget=5.0).lookup("Ada Lovelace")
+        time.sleep(0.3)
+        check("losing fetch stops when the lookup is answered", answer is not None and _slots.in_use == 0,
+              f"({_slots.in_use} still running)")
+        sources = [EncyclopediaSource(f"{base}/drip/0/3/")]
+        start = time.monotonic()
+        answer = AnswerLookup(sources, budget=0.5).lookup("Ada Lovelace")
+        time.sleep(0.3)
+        check("a trickling fetch stops at the deadline", answer is None and _slots.in_use == 0,
+              f"({_slots.in_use} still running {time.monotonic() - start:.2f}s after a 0.5s budget)")
+
+        # More blocking fetches than threads: the extra ones are skipped, not queued
+        time.sleep(0.5)
+        skipped, _slots.peak = _slots.skipped, 0
+        threads = [threading.Thread(target=lookup, args=(0.5, 0.5, 1.0)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        check("saturated pool skips new fetches", _slots.peak == MAX_BLOCKING_FETCHES
+              and _slots.skipped - skipped == 12 - MAX_BLOCKING_FETCHES,
+              f"(peak {_slots.peak}, skipped {_slots.skipped - skipped})")
+    finally:
+        server.shutdown()
+    print(f"{len(failures)} failures")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    if "--selftest" in sys.argv:
+        sys.exit(selftest())
+    else:
+        print(__doc__)
@@ -0,0 +1,209 @@
+"""Headless bulk processing: JSONL messages in, JSONL replies out
+
+    python AI.py --batch in.jsonl > out.jsonl
+    cat in.jsonl | python AI.py --batch - --workers 8
+
+Each input line is {"session": ..., "message": ...} (the same body the
+server accepts); "session" defaults to --session and any "id" is echoed
+back. Each output line is {"line", "session", "id", "response"} or
+{"line", "session", "id", "error"}.
+
+Every session is pinned to one worker thread, so messages of a session are
+answered in input order while different sessions run in parallel. Output is
+written as replies complete, so lines of different sessions may interleave;
+"line" gives the input position. Worker queues are bounded and idle sessions
+are dropped after --max-sessions per worker, so memory stays flat however
+long the input is. Throughput is reported on stderr at the end.
+"""
+import argparse
+import json
+import os
+import queue
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(pct / 100 * len(sorted_values)))]
+
+
+class BatchRunner:
+    def __init__(self, output, workers=4, queue_size=256, max_sessions=1000, memory_db=None):
+        from AI import ChatbotCore, DEFAULT_CONFIG, create_lookups, load_intent_classifier
+        from memory_store import PersonalMemoryStore
+
+        self.core_class = ChatbotCore
+        self.config = DEFAULT_CONFIG
+        self.intent_classifier = load_intent_classifier()
+        # One encyclopedia mapping and answer lookup for every session, however many come and go
+        self.lookups = create_lookups()
+        # Batch profiles stay out of the real memory database unless one is given
+        self.db_dir = None
+        if memory_db is None:
+            self.db_dir = tempfile.mkdtemp(prefix="chatbot_batch_")
+            memory_db = os.path.join(self.db_dir, "memory.db")
+        self.memory = PersonalMemoryStore(memory_db)
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.max_sessions = max_sessions
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.threads = [threading.Thread(target=self.work, args=(q,), name=f"batch-worker-{i}", daemon=True)
+                        for i, q in enumerate(self.queues)]
+        self.stats_lock = threading.Lock()
+        # Latency percentiles come from a fixed-size reservoir sample
+        self.latencies = []
+        self.reservoir_size = 10000
+        self.rng = random.Random(0)
+        self.messages = 0
+        self.errors = 0
+        self.slowest = 0.0
+        self.sessions_opened = 0
+
+    def open_session(self, session_id):
+        with self.stats_lock:
+            self.sessions_opened += 1
+        return self.core_class(
+            config=json.loads(json.dumps(self.config)), memory=self.memory,
+            intent_classifier=self.intent_classifier, user_id=session_id, headless=True, lookups=self.lookups
+        )
+
+    def close_session(self, core):
+        core.cancel_llm_reply()
+        core.volume_control.close()
+        core.brightness_control.close()
+
+    def work(self, jobs):
+        # Sessions owned by this worker, least recently used first
+        sessions = OrderedDict()
+        while True:
+            job = jobs.get()
+            if job is None:
+                for core in sessions.values():
+                    self.close_session(core)
+                return
+            line_no, session_id, request_id, message = job
+            record = {'line': line_no, 'session': session_id}
+            if request_id is not None:
+                record['id'] = request_id
+            started = time.perf_counter()
+            try:
+                core = sessions.pop(session_id, None) or self.open_session(session_id)
+                sessions[session_id] = core
+                if len(sessions) > self.max_sessions:
+                    self.close_session(sessions.popitem(last=False)[1])
+                record['response'] = core.respond(message)
+            except Exception as e:
+                record['error'] = str(e)
+            elapsed = time.perf_counter() - started
+            self.write(record)
+            with self.stats_lock:
+                self.messages += 1
+                self.errors += 'error' in record
+                self.slowest = max(self.slowest, elapsed)
+                if len(self.latencies) < self.reservoir_size:
+                    self.latencies.append(elapsed)
+                else:
+                    slot = self.rng.randrange(self.messages)
+                    if slot < self.reservoir_size:
+                        self.latencies[slot] = elapsed
+
+    def write(self, record):
+        text = json.dumps(record, ensure_ascii=False) + "\n"
+        with self.output_lock:
+            self.output.write(text)
+
+    def submit(self, line_no, session_id, request_id, message):
+        worker = zlib.crc32(session_id.encode('utf-8')) % len(self.queues)
+        # Blocks while that worker is behind, which keeps the input from piling up
+        self.queues[worker].put((line_no, session_id, request_id, message))
+
+    def run(self, lines, default_session="default"):
+        started = time.perf_counter()
+        for thread in self.threads:
+            thread.start()
+        rejected = 0
+        try:
+            for line_no, line in enumerate(lines, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    data = json.loads(line)
+                    message = data['message']
+                    session_id = str(data.get('session', default_session))
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    rejected += 1
+                    self.write({'line': line_no, 'error': f"Invalid input line: {e}"})
+                    continue
+                self.submit(line_no, session_id, data.get('id'), message)
+        finally:
+            for jobs in self.queues:
+                jobs.put(None)
+            for thread in self.threads:
+                thread.join()
+            self.output.flush()
+            self.memory.close()
+            if self.lookups[0] is not None:
+                self.lookups[0].close()
+            if self.db_dir:
+                shutil.rmtree(self.db_dir, ignore_errors=True)
+        return self.summary(time.perf_counter() - started, rejected)
+
+    def summary(self, wall_time, rejected):
+        latencies = sorted(self.latencies)
+        return {
+            'messages': self.messages,
+            'sessions_opened': self.sessions_opened,
+            'errors': self.errors,
+            'rejected_lines': rejected,
+            'wall_time_s': wall_time,
+            'throughput_mps': self.messages / wall_time if wall_time else 0.0,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'max_ms': self.slowest * 1000,
+        }
+
+
+def print_report(summary, stream):
+    print(f"Batch: {summary['messages']} messages, {summary['sessions_opened']} sessions opened in "
+          f"{summary['wall_time_s']:.2f}s ({summary['throughput_mps']:.1f} msg/s), "
+          f"{summary['errors']} errors, {summary['rejected_lines']} invalid lines", file=stream)
+    print(f"Latency per message: p50 {summary['p50_ms']:.2f} ms, p95 {summary['p95_ms']:.2f} ms, "
+          f"max {summary['max_ms']:.2f} ms", file=stream)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="AI.py --batch", description="Answer JSONL messages without the GUI")
+    parser.add_argument("--batch", dest="input", required=True, help="input JSONL file, or - for stdin")
+    parser.add_argument("--output", help="write replies here instead of stdout")
+    parser.add_argument("--workers", type=int, default=4, help="parallel worker threads")
+    parser.add_argument("--session", default="default", help="session for lines without one")
+    parser.add_argument("--max-sessions", type=int, default=1000, help="sessions kept open per worker")
+    parser.add_argument("--memory-db", help="personal memory database (default: a temporary one)")
+    args = parser.parse_args(argv)
+
+    # Replies go to stdout, so anything the handlers print must not
+    real_stdout = sys.stdout
+    sys.stdout = sys.stderr
+    source = sys.stdin if args.input == "-" else open(args.input, 'r', encoding='utf-8')
+    output = open(args.output, 'w', encoding='utf-8') if args.output else real_stdout
+    try:
+        runner = BatchRunner(output, workers=max(1, args.workers), max_sessions=args.max_sessions,
+                             memory_db=args.memory_db)
+        summary = runner.run(source, default_session=args.session)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not real_stdout:
+            output.close()
+        sys.stdout = real_stdout
+    print_report(summary, sys.stderr)
+    return 1 if summary['errors'] else 0
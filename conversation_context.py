@@ -0,0 +1,237 @@
+"""Bounded per-session conversation history for prompt building
+
+Recent turns live in a ring buffer under a token budget. Turns that fall out
+of the window are merged into a running summary, and the summary itself is
+capped, so a session uses the same amount of memory whether it is ten
+messages long or ten thousand.
+
+The summary keeps what later replies are likely to need: facts the user
+stated about themselves ("my sister lives in Oslo", "I study physics") and
+the topics the conversation kept coming back to. A fact restated later
+replaces the earlier version rather than adding a second one, and a topic
+mentioned again gains weight. When the summary outgrows its budget the
+least-mentioned, longest-unseen topics go first, then the oldest facts.
+
+    python conversation_context.py --selftest
+"""
+import re
+import sys
+from collections import OrderedDict, deque
+
+# Roughly what a BPE tokenizer produces for English: words, numbers and
+# punctuation marks each count as one token, long words as several
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+# Facts about the user, keyed so that a restated fact replaces the old one
+CLAUSE = r"([^.,;!?]{1,60})"
+FACT_PATTERNS = [
+    (re.compile(r"\bmy ((?:[a-z]+ ){0,2}?[a-z]+) (is|are|was|were) " + CLAUSE, re.I),
+     lambda m: (f"my {m.group(1).lower()}", f"the user's {m.group(1).lower()} {m.group(2).lower()} {m.group(3).strip()}")),
+    (re.compile(r"\bi (like|love|enjoy|hate|prefer|have|own|live in|work at|work as|study at|study|play) " + CLAUSE, re.I),
+     lambda m: (f"i {m.group(1).lower()} {m.group(2).strip().lower()}",
+                f"the user {conjugate(m.group(1).lower())} {m.group(2).strip()}")),
+    (re.compile(r"\bi(?: am|'m) ((?:an? )?(?:student|teacher|engineer|developer|doctor|nurse)\b|from " + CLAUSE + ")",
+                re.I),
+     lambda m: ("i am from" if m.group(1).lower().startswith("from") else "i am a",
+                f"the user is {m.group(1).strip()}")),
+]
+THIRD_PERSON = {'have': 'has', 'study': 'studies', 'study at': 'studies at'}
+TOPIC_WORD = re.compile(r"[A-Za-z][A-Za-z'-]{3,}")
+STOPWORDS = frozenset("""
+    about above after again also always another anything are enjoy hate love loves prefer aren't because been before being below between
+    both can't cannot could couldn't didn't does doesn't doing don't down during each else even ever every
+    from further going gonna good great had hadn't hasn't have haven't having hello here how i'll i'm i've
+    into isn't it's its just know like little made make many maybe might more most much must need never
+    nothing okay only other ought our ours over please pretty quite rather really right said same say says
+    should shouldn't some something still such sure tell than thank thanks that that's their theirs them then
+    there there's these they they'd they'll they're thing things think this those though through today
+    too under until very want wants was wasn't well we'll we're were weren't what what's when where which
+    while who whom whose why will with won't would wouldn't yeah yes yet you'd you'll you're your yours
+    yourself
+""".split())
+
+
+def conjugate(verb):
+    if verb in THIRD_PERSON:
+        return THIRD_PERSON[verb]
+    first, _, rest = verb.partition(" ")
+    return f"{first}s {rest}".strip()
+
+
+def estimate_tokens(text):
+    """Cheap token count; close enough to budget prompts without a tokenizer"""
+    return sum(1 + len(piece) // 6 for piece in TOKEN_PATTERN.findall(text))
+
+
+def truncate_tokens(text, limit):
+    """Cut text down to about `limit` tokens, on a word boundary"""
+    count = 0
+    for match in TOKEN_PATTERN.finditer(text):
+        count += 1 + len(match.group()) // 6
+        if count > limit:
+            return text[:match.start()].rstrip() + "..."
+    return text
+
+
+class Turn:
+    __slots__ = ('role', 'text', 'tokens')
+
+    def __init__(self, role, text, max_tokens):
+        text = " ".join(text.split())
+        tokens = estimate_tokens(text)
+        if tokens > max_tokens:
+            text = truncate_tokens(text, max_tokens)
+            tokens = estimate_tokens(text)
+        self.role = role
+        self.text = text
+        # Counted once here; the budget bookkeeping never re-tokenises
+        self.tokens = tokens
+
+
+class ConversationContext:
+    """Recent turns plus a rolling summary of everything older
+
+    `token_budget` bounds the verbatim turns, `max_turns` the ring buffer
+    length and `summary_budget` the summary, so render() never exceeds
+    token_budget + summary_budget tokens.
+    """
+
+    def __init__(self, token_budget=512, max_turns=16, summary_budget=128, user_label="User", bot_label="Assistant"):
+        self.token_budget = token_budget
+        self.max_turns = max_turns
+        self.summary_budget = summary_budget
+        self.labels = {'user': user_label, 'bot': bot_label}
+        self.turns = deque()
+        self.turn_tokens = 0
+        # Running summary: fact key -> sentence (oldest first), topic -> [mentions, last fold seen]
+        self.facts = OrderedDict()
+        self.topics = {}
+        self.summary_text = ""
+        self.summary_tokens = 0
+        self.folded = 0
+
+    def __len__(self):
+        return len(self.turns)
+
+    def add(self, role, text):
+        if not text or not text.strip():
+            return
+        turn = Turn(role, text, self.token_budget // 2)
+        self.turns.append(turn)
+        self.turn_tokens += turn.tokens
+        while len(self.turns) > self.max_turns or (self.turn_tokens > self.token_budget and len(self.turns) > 1):
+            self.fold(self.turns.popleft())
+
+    def add_exchange(self, message, reply):
+        self.add('user', message)
+        self.add('bot', reply)
+
+    def fold(self, turn):
+        """Move one turn out of the window and merge it into the summary"""
+        self.turn_tokens -= turn.tokens
+        self.folded += 1
+        if turn.role == 'user':
+            for pattern, extract in FACT_PATTERNS:
+                for match in pattern.finditer(turn.text):
+                    key, fact = extract(match)
+                    # Restating a fact moves it to the newest position with the new wording
+                    self.facts.pop(key, None)
+                    self.facts[key] = truncate_tokens(fact, max(8, self.summary_budget // 4))
+        # The user's own words count double; replies mostly echo them
+        weight = 2 if turn.role == 'user' else 1
+        for word in TOPIC_WORD.findall(turn.text):
+            word = word.lower()
+            if word in STOPWORDS:
+                continue
+            entry = self.topics.setdefault(word, [0, 0])
+            entry[0] += weight
+            entry[1] = self.folded
+        self.update_summary()
+
+    def topic_order(self):
+        """Topics from most to least worth keeping: mentioned often, then mentioned lately"""
+        return sorted(self.topics, key=lambda word: (self.topics[word][0], self.topics[word][1]), reverse=True)
+
+    def summary_for(self, topics):
+        parts = list(self.facts.values())
+        if topics:
+            parts.append("topics so far: " + ", ".join(topics))
+        return "; ".join(parts)
+
+    def update_summary(self):
+        topics = self.topic_order()
+        # Words seen once in a long conversation are noise; only the most mentioned are worth checking
+        del topics[self.summary_budget:]
+        text = self.summary_for(topics)
+        while estimate_tokens(text) > self.summary_budget and (topics or len(self.facts) > 1):
+            if topics:
+                topics.pop()
+            else:
+                self.facts.popitem(last=False)
+            text = self.summary_for(topics)
+        # Forget topics that could not be shown, so the table stays as small as the summary
+        kept = set(topics)
+        for word in [w for w in self.topics if w not in kept]:
+            del self.topics[word]
+        self.summary_text = text
+        self.summary_tokens = estimate_tokens(text) if text else 0
+
+    def render(self):
+        """History text for PromptBuilder.build(), oldest first"""
+        lines = []
+        if self.summary_text:
+            lines.append(f"(Earlier in this conversation: {self.summary_text}.)")
+        for turn in self.turns:
+            lines.append(f"{self.labels[turn.role]}: {turn.text}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def clear(self):
+        self.turns.clear()
+        self.facts.clear()
+        self.topics.clear()
+        self.summary_text = ""
+        self.turn_tokens = 0
+        self.summary_tokens = 0
+        self.folded = 0
+
+    def stats(self):
+        return {
+            'turns': len(self.turns),
+            'turn_tokens': self.turn_tokens,
+            'summary_facts': len(self.facts),
+            'summary_topics': len(self.topics),
+            'summary_tokens': self.summary_tokens,
+            'folded': self.folded,
+        }
+
+
+def selftest():
+    context = ConversationContext(token_budget=60, max_turns=4, summary_budget=48)
+    context.add_exchange("Hi! My sister is a doctor in Oslo.", "That sounds like a rewarding job.")
+    context.add_exchange("I study physics at the university.", "Physics is fascinating. Which part do you like?")
+    context.add_exchange("Mostly quantum physics and a bit of astronomy.", "Quantum physics is a deep subject.")
+    context.add_exchange("Actually my sister is a surgeon now.", "Good for her!")
+    for i in range(40):
+        context.add_exchange(f"Tell me more about quantum physics, part {i}.", f"Here is more on quantum physics, part {i}.")
+    rendered = context.render()
+    checks = [
+        ("facts survive long after their turns", "the user studies physics" in rendered),
+        ("a restated fact replaces the old one", "surgeon" in rendered and "doctor" not in rendered),
+        ("recurring topics kept", "quantum" in rendered and "physics" in rendered),
+        ("summary within budget", context.summary_tokens <= context.summary_budget),
+        ("window within budget", context.turn_tokens <= context.token_budget and len(context) <= 4),
+        ("topic table bounded", len(context.topics) <= context.summary_budget),
+    ]
+    print(rendered)
+    failed = 0
+    for name, ok in checks:
+        failed += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    return failed
+
+
+if __name__ == "__main__":
+    if "--selftest" in sys.argv:
+        sys.exit(1 if selftest() else 0)
+    else:
+        print(__doc__)
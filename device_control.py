@@ -0,0 +1,255 @@
+import sys
+import threading
+import time
+
+
+class DeviceBackend:
+    """A single 0-100 device level (volume, brightness) that can be read and written"""
+
+    name = "device"
+
+    def read(self):
+        raise NotImplementedError
+
+    def write(self, level):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class FakeBackend(DeviceBackend):
+    """In-memory device used by headless sessions and tests; counts every device call"""
+
+    def __init__(self, level=50, latency=0.0, name="fake"):
+        self.name = name
+        self.level = level
+        self.latency = latency
+        self.reads = 0
+        self.writes = 0
+        self.written = []
+
+    def read(self):
+        self.reads += 1
+        time.sleep(self.latency)
+        return self.level
+
+    def write(self, level):
+        self.writes += 1
+        time.sleep(self.latency)
+        self.level = level
+        self.written.append(level)
+
+
+class ScreenBrightnessBackend(DeviceBackend):
+    """Screen brightness through screen_brightness_control"""
+
+    name = "brightness"
+
+    def __init__(self):
+        import screen_brightness_control as sbc
+        self.sbc = sbc
+
+    def read(self):
+        return self.sbc.get_brightness()[0]
+
+    def write(self, level):
+        self.sbc.set_brightness(level)
+
+
+class WindowsVolumeBackend(DeviceBackend):
+    """Master volume through pycaw, keeping the COM endpoint open between calls"""
+
+    name = "volume"
+
+    def __init__(self):
+        self.endpoint = None
+
+    def open(self):
+        # COM objects belong to the thread that created them, so the endpoint is
+        # opened lazily on the controller's device thread
+        import comtypes
+        from ctypes import cast, POINTER
+        from comtypes import CLSCTX_ALL
+        from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume
+        comtypes.CoInitialize()
+        devices = AudioUtilities.GetSpeakers()
+        interface = devices.Activate(IAudioEndpointVolume.iid, CLSCTX_ALL, None)
+        self.endpoint = cast(interface, POINTER(IAudioEndpointVolume))
+
+    def read(self):
+        if self.endpoint is None:
+            self.open()
+        return int(round(self.endpoint.GetMasterVolumeLevelScalar() * 100))
+
+    def write(self, level):
+        if self.endpoint is None:
+            self.open()
+        self.endpoint.SetMasterVolumeLevelScalar(level / 100, None)
+
+    def close(self):
+        self.endpoint = None
+
+
+class MixerVolumeBackend(DeviceBackend):
+    """pygame mixer music volume, used where there is no system volume API"""
+
+    name = "volume"
+
+    def __init__(self):
+        from pygame import mixer
+        self.mixer = mixer
+
+    def read(self):
+        return int(round(self.mixer.music.get_volume() * 100))
+
+    def write(self, level):
+        self.mixer.music.set_volume(level / 100)
+
+
+class DeviceController:
+    """Cached, rate-limited front end for a DeviceBackend
+
+    All device calls run on one background thread. Reads are served from a
+    cache for `ttl` seconds, and a burst of set() calls within
+    `coalesce_delay` collapses into a single write of the final value.
+    """
+
+    def __init__(self, backend, ttl=2.0, coalesce_delay=0.15, min_write_interval=0.1, on_written=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.coalesce_delay = coalesce_delay
+        self.min_write_interval = min_write_interval
+        self.on_written = on_written
+
+        self.cond = threading.Condition()
+        self.cached_value = None
+        self.cached_at = 0.0
+        self.pending = None
+        self.pending_since = 0.0
+        self.last_write = 0.0
+        self.read_requested = False
+        self.read_generation = 0
+        self.error = None
+        self.closed = False
+        self.thread = None
+
+    def start(self):
+        # Caller holds self.cond
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name=f"{self.backend.name}-control", daemon=True)
+            self.thread.start()
+
+    def is_fresh(self):
+        return self.cached_value is not None and time.monotonic() - self.cached_at < self.ttl
+
+    def get(self, timeout=5.0):
+        """Return the current level, reading the device only when the cache is stale"""
+        with self.cond:
+            # A queued write is the newest known value
+            if self.pending is not None or self.is_fresh():
+                return self.cached_value
+            self.start()
+            generation = self.read_generation
+            self.read_requested = True
+            self.cond.notify_all()
+            if not self.cond.wait_for(lambda: self.read_generation != generation, timeout):
+                raise TimeoutError(f"Timed out reading {self.backend.name}")
+            if self.error is not None:
+                raise self.error
+            return self.cached_value
+
+    def peek(self):
+        """Return the cached level without blocking, refreshing it in the background if stale"""
+        with self.cond:
+            if self.pending is None and not self.is_fresh() and not self.closed:
+                self.start()
+                self.read_requested = True
+                self.cond.notify_all()
+            return self.cached_value
+
+    def set(self, level):
+        """Queue a write; only the last value of a burst reaches the device"""
+        with self.cond:
+            if self.pending is None:
+                self.pending_since = time.monotonic()
+            self.pending = level
+            self.cached_value = level
+            self.cached_at = time.monotonic()
+            self.start()
+            self.cond.notify_all()
+
+    def flush(self, timeout=5.0):
+        """Wait until any queued write has reached the device"""
+        with self.cond:
+            return self.cond.wait_for(lambda: self.pending is None, timeout)
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(5.0)
+        self.backend.close()
+
+    def run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending is not None or self.read_requested or self.closed)
+                if self.pending is not None:
+                    # Let the burst settle, but never write faster than the rate limit
+                    deadline = max(self.pending_since + self.coalesce_delay,
+                                   self.last_write + self.min_write_interval)
+                    while not self.closed and time.monotonic() < deadline:
+                        self.cond.wait(deadline - time.monotonic())
+                    level = self.pending
+                    operation = 'write'
+                elif self.read_requested:
+                    level = None
+                    operation = 'read'
+                else:
+                    return
+
+            error = None
+            try:
+                if operation == 'write':
+                    self.backend.write(level)
+                else:
+                    level = self.backend.read()
+            except Exception as e:
+                error = e
+                print(f"Error accessing {self.backend.name}: {e}")
+
+            with self.cond:
+                if operation == 'write':
+                    self.last_write = time.monotonic()
+                    # A newer set() may have arrived while writing
+                    if self.pending == level:
+                        self.pending = None
+                else:
+                    self.read_requested = False
+                    self.read_generation += 1
+                    self.error = error
+                    if error is None and self.pending is None:
+                        self.cached_value = level
+                        self.cached_at = time.monotonic()
+                self.cond.notify_all()
+
+            if operation == 'write' and error is None and self.on_written:
+                self.on_written(level)
+
+
+def create_volume_controller(headless=False, on_written=None):
+    if headless:
+        backend = FakeBackend(name="volume")
+    elif sys.platform == 'win32':
+        backend = WindowsVolumeBackend()
+    else:
+        backend = MixerVolumeBackend()
+    return DeviceController(backend, on_written=on_written)
+
+
+def create_brightness_controller(headless=False, on_written=None):
+    backend = FakeBackend(name="brightness") if headless else ScreenBrightnessBackend()
+    # Brightness is slow to read on Linux (it shells out), so cache it longer
+    return DeviceController(backend, ttl=10.0, on_written=on_written)
@@ -0,0 +1,346 @@
+"""Trigger phrases and canned replies loaded from a declarative catalogue file
+
+intents.json lists every intent with its stage, trigger phrases, reply
+templates and (optionally) the classifier label it answers:
+
+    {"name": "good_night", "stage": "canned", "triggers": ["good night"],
+     "replies": ["Good night {user_name}! Sweet dreams"]}
+
+Stages are consulted at different points of the routing chain. "canned" and
+"social" triggers match as whole-word phrases anywhere in the message and
+the earliest intent in the file wins; "fallback" triggers are fuzzy matched
+against the whole message. Replies may use {user_name}, {bot_name}, {time}
+and {date}.
+
+The catalogue is compiled once into one word trie per stage, so matching
+costs a walk per word of the message however many intents there are. The
+compiled form is pickled next to the working directory and reused while the
+source file is unchanged. A watcher thread recompiles on edits, reusing the
+tries of stages whose triggers did not change, and swaps the new version in
+with a single assignment; messages already being answered keep the version
+they started with.
+
+    python intent_catalogue.py --benchmark
+"""
+import hashlib
+import json
+import os
+import pickle
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+# Bump when the compiled layout changes so stale caches are ignored
+COMPILER_VERSION = 1
+STAGES = ('canned', 'social', 'fallback')
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+# Trie key holding the intent index where a phrase ends; never a word
+END = ""
+
+
+class CatalogueError(ValueError):
+    pass
+
+
+class TemplateValues(dict):
+    """Leaves unknown {placeholders} in a reply as written"""
+
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+
+def phrase_words(text):
+    return tuple(WORD_PATTERN.findall(text.lower()))
+
+
+class Intent:
+    __slots__ = ('name', 'stage', 'triggers', 'replies', 'label')
+
+    def __init__(self, name, stage, triggers, replies, label=None):
+        self.name = name
+        self.stage = stage
+        self.triggers = triggers
+        self.replies = replies
+        self.label = label
+
+    def reply(self, values):
+        return random.choice(self.replies).format_map(TemplateValues(values))
+
+
+class StageIndex:
+    """Intents of one stage, with a word trie and a fuzzy choice list over their triggers"""
+    __slots__ = ('intents', 'signature', 'trie', 'choices')
+
+    def __init__(self, intents, signature, trie=None, choices=None):
+        self.intents = intents
+        self.signature = signature
+        if trie is None:
+            trie, choices = self.build(intents)
+        self.trie = trie
+        # Trigger text -> index into intents
+        self.choices = choices
+
+    @staticmethod
+    def build(intents):
+        trie = {}
+        choices = {}
+        for index, intent in enumerate(intents):
+            for trigger in intent.triggers:
+                node = trie
+                for word in phrase_words(trigger):
+                    node = node.setdefault(word, {})
+                # The same phrase under two intents goes to the earlier one
+                node.setdefault(END, index)
+                choices.setdefault(trigger.lower(), index)
+        return trie, choices
+
+    def match(self, message):
+        """Earliest intent with a trigger phrase somewhere in message, or None"""
+        words = phrase_words(message)
+        best = None
+        for start in range(len(words)):
+            node = self.trie
+            for word in words[start:]:
+                node = node.get(word)
+                if node is None:
+                    break
+                index = node.get(END)
+                if index is not None and (best is None or index < best):
+                    best = index
+        return None if best is None else self.intents[best]
+
+
+class CompiledCatalogue:
+    def __init__(self, stages, digest):
+        self.stages = stages
+        self.digest = digest
+        self.by_label = {}
+        for stage in STAGES:
+            for intent in stages[stage].intents:
+                if intent.label:
+                    self.by_label.setdefault(intent.label, intent)
+
+    def __len__(self):
+        return sum(len(s.intents) for s in self.stages.values())
+
+    def match(self, stage, message):
+        return self.stages[stage].match(message)
+
+    def fuzzy_choices(self, stage):
+        return list(self.stages[stage].choices)
+
+    def for_trigger(self, stage, trigger):
+        index = self.stages[stage].choices.get(trigger)
+        return None if index is None else self.stages[stage].intents[index]
+
+    def for_label(self, label):
+        return self.by_label.get(label)
+
+    def triggers(self):
+        return [t for s in self.stages.values() for intent in s.intents for t in intent.triggers]
+
+
+def parse_intents(data):
+    entries = data.get('intents') if isinstance(data, dict) else None
+    if not isinstance(entries, list):
+        raise CatalogueError("catalogue needs an \"intents\" list")
+    grouped = {stage: [] for stage in STAGES}
+    for position, entry in enumerate(entries):
+        name = entry.get('name') or f"#{position}"
+        stage = entry.get('stage', 'canned')
+        triggers = entry.get('triggers')
+        replies = entry.get('replies')
+        if stage not in grouped:
+            raise CatalogueError(f"intent {name}: unknown stage {stage!r}")
+        if not triggers or not all(isinstance(t, str) and phrase_words(t) for t in triggers):
+            raise CatalogueError(f"intent {name}: needs a list of non-empty trigger phrases")
+        if not replies or not all(isinstance(r, str) for r in replies):
+            raise CatalogueError(f"intent {name}: needs a list of reply templates")
+        grouped[stage].append(Intent(name, stage, list(triggers), list(replies), entry.get('intent')))
+    return grouped
+
+
+def compile_catalogue(data, digest=None, previous=None):
+    """Compile parsed JSON; stages whose triggers match `previous` reuse its tries"""
+    stages = {}
+    for stage, intents in parse_intents(data).items():
+        signature = hashlib.sha1(json.dumps([i.triggers for i in intents]).encode('utf-8')).hexdigest()
+        old = previous.stages.get(stage) if previous is not None else None
+        if old is not None and old.signature == signature:
+            stages[stage] = StageIndex(intents, signature, old.trie, old.choices)
+        else:
+            stages[stage] = StageIndex(intents, signature)
+    return CompiledCatalogue(stages, digest)
+
+
+def read_source(path):
+    with open(path, 'rb') as f:
+        raw = f.read()
+    return raw, hashlib.sha1(raw).hexdigest()
+
+
+def load_cache(cache_path, digest):
+    try:
+        with open(cache_path, 'rb') as f:
+            version, cached_digest = pickle.load(f)
+            if version != COMPILER_VERSION or cached_digest != digest:
+                return None
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Error reading intent cache: {e}")
+        return None
+
+
+def save_cache(cache_path, catalogue):
+    try:
+        with open(cache_path + ".tmp", 'wb') as f:
+            pickle.dump((COMPILER_VERSION, catalogue.digest), f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(catalogue, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(cache_path + ".tmp", cache_path)
+    except Exception as e:
+        print(f"Error writing intent cache: {e}")
+
+
+def load_catalogue(path, cache_path=None, previous=None):
+    """Compiled catalogue for path, from the cache when the source is unchanged"""
+    raw, digest = read_source(path)
+    if cache_path:
+        cached = load_cache(cache_path, digest)
+        if cached is not None:
+            return cached
+    catalogue = compile_catalogue(json.loads(raw.decode('utf-8')), digest, previous)
+    if cache_path:
+        save_cache(cache_path, catalogue)
+    return catalogue
+
+
+class IntentCatalogue:
+    """The live catalogue; `current` is replaced whole whenever the file changes"""
+
+    def __init__(self, path, cache_path=None, poll_interval=1.0):
+        self.path = path
+        self.cache_path = cache_path
+        self.poll_interval = poll_interval
+        self.file_state = self.stat()
+        self.current = load_catalogue(path, cache_path)
+        self.reloads = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def stat(self):
+        try:
+            info = os.stat(self.path)
+        except OSError:
+            return None
+        return info.st_mtime_ns, info.st_size
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="intent-catalogue-watcher", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(self.poll_interval + 1)
+
+    def run(self):
+        while not self.stop_event.wait(self.poll_interval):
+            self.check()
+
+    def check(self):
+        """Recompile if the file changed since the last look; True when a new version went live"""
+        state = self.stat()
+        if state is None or state == self.file_state:
+            return False
+        self.file_state = state
+        return self.reload()
+
+    def reload(self):
+        try:
+            catalogue = load_catalogue(self.path, self.cache_path, previous=self.current)
+        except Exception as e:
+            # Half-saved or invalid edits keep the previous version serving
+            print(f"Error reloading intent catalogue: {e}")
+            return False
+        if catalogue.digest == self.current.digest:
+            return False
+        self.current = catalogue
+        self.reloads += 1
+        return True
+
+
+def synthetic_catalogue(n_intents, rng):
+    words = ["open", "show", "tell", "me", "about", "the", "weather", "news", "music", "play", "stop",
+             "what", "is", "my", "your", "favorite", "set", "alarm", "timer", "remind", "call", "send",
+             "message", "today", "tomorrow", "light", "on", "off", "kitchen", "bedroom", "volume", "up"]
+    intents = []
+    for i in range(n_intents):
+        triggers = [" ".join(rng.choice(words) for _ in range(rng.randint(2, 5))) + f" item{i}"
+                    for _ in range(rng.randint(1, 4))]
+        stage = STAGES[i % len(STAGES)]
+        intents.append({"name": f"intent_{i}", "stage": stage, "triggers": triggers,
+                        "replies": [f"Reply {i} for {{user_name}}", f"Another reply {i}"]})
+    return {"version": 1, "intents": intents}
+
+
+def benchmark(n_intents=10000, n_messages=20000):
+    rng = random.Random(0)
+    data = synthetic_catalogue(n_intents, rng)
+    folder = tempfile.mkdtemp()
+    try:
+        path = os.path.join(folder, "intents.json")
+        cache_path = os.path.join(folder, "intents.cache")
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+        start = time.perf_counter()
+        catalogue = IntentCatalogue(path, cache_path)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        IntentCatalogue(path, cache_path)
+        warm = time.perf_counter() - start
+        print(f"{n_intents:,} intents ({len(catalogue.current.triggers()):,} triggers): "
+              f"cold start {cold * 1000:.0f} ms, start from cache {warm * 1000:.0f} ms")
+
+        triggers = catalogue.current.triggers()
+        messages = [f"hey could you {rng.choice(triggers)} please" if rng.random() < 0.7
+                    else "nothing in the catalogue matches this one" for _ in range(n_messages)]
+        compiled = catalogue.current
+        start = time.perf_counter()
+        hits = sum(compiled.match('canned', m) is not None or compiled.match('social', m) is not None
+                   for m in messages)
+        elapsed = time.perf_counter() - start
+        print(f"{n_messages:,} messages matched in {elapsed * 1000:.0f} ms "
+              f"({n_messages / elapsed:,.0f} messages/s, {hits:,} hits)")
+
+        for label, edit in (("reply edit", lambda entry: entry['replies'].append("An edited reply")),
+                            ("trigger edit", lambda entry: entry['triggers'].append("a brand new trigger"))):
+            edit(data['intents'][0])
+            with open(path, 'w') as f:
+                json.dump(data, f)
+            # Make sure the watcher sees a different mtime even on coarse clocks
+            os.utime(path, ns=(time.time_ns(), time.time_ns() + 1))
+            start = time.perf_counter()
+            swapped = catalogue.check()
+            elapsed = time.perf_counter() - start
+            reused = sum(new.trie is old.trie for new, old in zip(catalogue.current.stages.values(),
+                                                                   compiled.stages.values()))
+            compiled = catalogue.current
+            print(f"{label}: recompiled and swapped in {elapsed * 1000:.0f} ms "
+                  f"(swapped={swapped}, {reused}/{len(STAGES)} stage tries reused)")
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        print(__doc__)
@@ -0,0 +1,336 @@
+import re
+import sys
+import time
+import zlib
+import numpy as np
+
+# Number of hashed feature buckets (hashing trick, no vocabulary kept)
+N_FEATURES = 2 ** 14
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+# Defaults for answering from the classifier alone. Naive Bayes posteriors are
+# close to 1.0 even for unrelated text, so the winner must also clear the
+# runner-up by MIN_MARGIN, and nearly every word of the message must appear in
+# that intent's own examples ("time to go" is not a request for the time)
+MIN_CONFIDENCE = 0.9
+MIN_MARGIN = 0.5
+MAX_UNKNOWN = 0.15
+
+# Labeled example utterances for each intent handled by generate_response
+INTENT_EXAMPLES = {
+    'greeting': [
+        "hi", "hello", "hey", "hi there", "hello nexus", "hey there how is it going",
+        "hello bot", "hey you", "hiya", "greetings",
+    ],
+    'farewell': [
+        "bye", "goodbye", "see you", "k bye", "see you later", "bye bye",
+        "i have to go now bye", "goodbye for now", "talk to you later", "catch you later",
+    ],
+    'thanks': [
+        "thank you", "thanks", "thanks a lot", "thank you so much", "many thanks",
+        "thanks for the help", "cheers thanks", "thank you very much",
+    ],
+    'how_are_you': [
+        "how are you", "how are you doing", "how's it going", "how do you feel today",
+        "are you doing well", "how have you been", "what's up", "how are things",
+    ],
+    'joke': [
+        "tell me a joke", "say something funny", "make me laugh", "do you know any jokes",
+        "tell a joke", "i want to hear a joke", "got any jokes",
+    ],
+    'time': [
+        "what time is it", "what is the time", "current time", "tell me the time",
+        "what's the time now", "time please", "do you know what time it is",
+    ],
+    'date': [
+        "what's the date today", "today's date", "what is the date", "what date is it",
+        "what day is it today", "tell me the date", "which date is today",
+    ],
+    'capabilities': [
+        "what can you do", "help", "what are your features", "how can you help me",
+        "what do you know how to do", "show me what you can do", "what are you capable of",
+    ],
+    'creator': [
+        "who created you", "who made you", "who built you", "who is your creator",
+        "who programmed you", "who developed you",
+    ],
+    'battery': [
+        "battery", "how much battery do i have", "battery level", "is my laptop charging",
+        "check the battery", "what's my battery percentage",
+    ],
+    'volume': [
+        "set volume to 50", "change volume to 30%", "what is the volume", "turn the volume up",
+        "i want to change the volume", "current volume", "volume level",
+    ],
+    'brightness': [
+        "set brightness to 70", "change brightness to 40", "what is the brightness",
+        "current brightness", "brightness level", "make the screen brighter",
+    ],
+    'calculate': [
+        "calculate 2 + 2", "what is 5 * 6", "calculate 10 divided by 2", "what is 3 plus 4",
+        "calculate 7 minus 2", "compute 12 / 4", "what is 2 ^ 8",
+    ],
+    'web_search': [
+        "what is quantum computing", "who is alan turing", "search for python tutorials",
+        "what is the capital of france", "who is the president of india", "search for weather today",
+        "what is machine learning",
+    ],
+    'open_website': [
+        "open youtube", "open google", "open github", "open www.example.com", "open reddit",
+        "open this link https://example.com", "open wikipedia",
+    ],
+    'play_music': [
+        "play some music", "play a song", "play shape of you song", "play music by queen",
+        "play relaxing music", "play my favorite song",
+    ],
+    'open_folder': [
+        "open folder documents", "open directory downloads", "open folder", "open my home directory",
+        "open folder pictures",
+    ],
+    'play_game': [
+        "play game", "let's play", "let's play tic tac toe", "play game hangman",
+        "play guess the number game", "which game can we play", "i want to play a game",
+    ],
+    'rename_bot': [
+        "your name is nova", "i want to call you jarvis", "change your name to max",
+        "i'd like to call you friday", "can i call you alex",
+    ],
+    'rename_user': [
+        "my name is shashank", "my name is alex", "call me by my name which is sam",
+        "my name is priya",
+    ],
+    'bot_name': [
+        "what is your name", "your name", "what should i call you", "who are you",
+        "tell me your name",
+    ],
+    'personal_info': [
+        "my favorite color is blue", "what is my favorite color", "my favourite colour is red",
+        "what is my favorite sport", "my favorite sport is cricket", "my birthday is 2003-05-12",
+        "what is my birth date", "what is my age", "what university do i go to", "where do i study",
+    ],
+    'small_talk': [
+        "can you hear me", "can you see me", "are you real", "are you a robot", "are you human",
+        "do you sleep", "are you awake", "do you have feelings", "do you love me",
+        "are you there", "are you listening", "what is the meaning of life",
+    ],
+    'unknown': [
+        "the weather is nice", "i had pasta for lunch", "my exam went okay", "this is interesting",
+        "which one is better", "that's fine", "i am bored", "nothing much", "ok", "hmm",
+    ],
+}
+
+
+def tokenize(text):
+    """Lowercase word tokens, bigrams, character trigrams and a bias feature"""
+    words = TOKEN_PATTERN.findall(text.lower())
+    features = ['__bias__']
+    features.extend(words)
+    features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+    # Character trigrams let unseen inflections and typos share evidence
+    for word in words:
+        padded = f"<{word}>"
+        features.extend('#' + padded[i:i + 3] for i in range(len(padded) - 2))
+    return features
+
+
+def hash_features(text, n_features=N_FEATURES):
+    """Map a message to hashed feature indices (crc32 is stable across runs)"""
+    return [zlib.crc32(f.encode('utf-8')) % n_features for f in tokenize(text)]
+
+
+def hash_words(text, n_features=N_FEATURES):
+    """Hashed indices of the plain words of a message"""
+    return [zlib.crc32(w.encode('utf-8')) % n_features for w in TOKEN_PATTERN.findall(text.lower())]
+
+
+class IntentClassifier:
+    """Multinomial naive Bayes over hashed features, scored with NumPy"""
+
+    def __init__(self, n_features=N_FEATURES, alpha=0.5):
+        self.n_features = n_features
+        self.alpha = alpha
+        self.labels = []
+        self.feature_log_prob = None  # shape (n_features, n_labels)
+        self.class_log_prior = None
+        self.word_labels = None  # shape (n_features, n_labels), 1 where a word occurs in that label's examples
+
+    def fit(self, texts, labels):
+        """Train from parallel lists of utterances and intent labels"""
+        self.labels = sorted(set(labels))
+        label_index = {label: i for i, label in enumerate(self.labels)}
+        counts = np.zeros((self.n_features, len(self.labels)), dtype=np.float64)
+        class_counts = np.zeros(len(self.labels), dtype=np.float64)
+        self.word_labels = np.zeros((self.n_features, len(self.labels)), dtype=np.uint8)
+
+        for text, label in zip(texts, labels):
+            j = label_index[label]
+            np.add.at(counts[:, j], hash_features(text, self.n_features), 1)
+            self.word_labels[hash_words(text, self.n_features), j] = 1
+            class_counts[j] += 1
+
+        smoothed = counts + self.alpha
+        self.feature_log_prob = (np.log(smoothed) - np.log(smoothed.sum(axis=0))).astype(np.float32)
+        self.class_log_prior = np.log(class_counts / class_counts.sum()).astype(np.float32)
+        return self
+
+    def fit_examples(self, examples=None):
+        """Train from a {label: [utterances]} mapping"""
+        examples = examples or INTENT_EXAMPLES
+        texts, labels = [], []
+        for label, utterances in examples.items():
+            texts.extend(utterances)
+            labels.extend([label] * len(utterances))
+        return self.fit(texts, labels)
+
+    def predict_proba_batch(self, texts):
+        """Return an (n_texts, n_labels) probability matrix in one vectorized pass"""
+        indices = []
+        starts = []
+        for text in texts:
+            starts.append(len(indices))
+            indices.extend(hash_features(text, self.n_features))
+        if not starts:
+            return np.zeros((0, len(self.labels)), dtype=np.float32)
+
+        # Every message has at least the bias feature, so no reduceat segment is empty
+        gathered = self.feature_log_prob[np.asarray(indices, dtype=np.intp)]
+        scores = np.add.reduceat(gathered, np.asarray(starts, dtype=np.intp), axis=0)
+        scores += self.class_log_prior
+        scores -= scores.max(axis=1, keepdims=True)
+        probs = np.exp(scores)
+        probs /= probs.sum(axis=1, keepdims=True)
+        return probs
+
+    def classify_batch(self, texts):
+        """Classify many messages at once, returning (labels, confidences)"""
+        probs = self.predict_proba_batch(texts)
+        best = probs.argmax(axis=1)
+        return [self.labels[i] for i in best], probs[np.arange(len(best)), best]
+
+    def classify(self, text):
+        """Classify a single message, returning (label, confidence)"""
+        labels, confidences = self.classify_batch([text])
+        return labels[0], float(confidences[0])
+
+    def unknown_ratio(self, text, label):
+        """Share of the message's words that never occur in the examples of `label`"""
+        words = hash_words(text, self.n_features)
+        if not words:
+            return 1.0
+        column = self.word_labels[:, self.labels.index(label)]
+        return float(np.count_nonzero(column[words] == 0)) / len(words)
+
+    def decide(self, text, min_confidence=MIN_CONFIDENCE, min_margin=MIN_MARGIN, max_unknown=MAX_UNKNOWN):
+        """(label, confidence) when the classifier is sure enough to answer alone, else (None, confidence)"""
+        probs = self.predict_proba_batch([text])[0]
+        second, best = np.argsort(probs)[-2:]
+        label, confidence = self.labels[best], float(probs[best])
+        if (confidence < min_confidence or confidence - probs[second] < min_margin
+                or self.unknown_ratio(text, label) > max_unknown):
+            return None, confidence
+        return label, confidence
+
+    def save(self, path):
+        np.savez(path, labels=np.array(self.labels), feature_log_prob=self.feature_log_prob,
+                 class_log_prior=self.class_log_prior, word_labels=self.word_labels, alpha=self.alpha)
+
+    def to_tables(self):
+        """(arrays, strings) for shared_index.write_index"""
+        arrays = {'feature_log_prob': self.feature_log_prob, 'class_log_prior': self.class_log_prior,
+                  'word_labels': self.word_labels, 'alpha': np.array([self.alpha])}
+        return arrays, {'labels': self.labels}
+
+    @classmethod
+    def from_tables(cls, arrays, strings):
+        """Classifier over arrays mapped from a shared index, without copying them"""
+        clf = cls(n_features=arrays['feature_log_prob'].shape[0], alpha=float(arrays['alpha'][0]))
+        clf.labels = list(strings['labels'])
+        clf.feature_log_prob = arrays['feature_log_prob']
+        clf.class_log_prior = arrays['class_log_prior']
+        clf.word_labels = arrays['word_labels']
+        return clf
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        if 'word_labels' not in data:
+            raise ValueError(f"{path} has no per-intent vocabulary; retrain it with --train")
+        clf = cls(n_features=data['feature_log_prob'].shape[0], alpha=float(data['alpha']))
+        clf.labels = [str(label) for label in data['labels']]
+        clf.feature_log_prob = data['feature_log_prob']
+        clf.class_log_prior = data['class_log_prior']
+        clf.word_labels = data['word_labels']
+        return clf
+
+
+# Messages that share words with an intent's examples but ask for something else;
+# the classifier must leave all of them to the rules
+OUT_OF_SCOPE = [
+    "who created python", "what is the date of easter 2027", "what day is it tomorrow", "time to go",
+    "what is gold", "i am sad today", "who is bob marley", "what is a bat", "thanks to the rain we stayed in",
+]
+
+
+def held_out_split(examples=None):
+    """Every fourth example of each intent held out for testing"""
+    train, test = {}, []
+    for label, utterances in (examples or INTENT_EXAMPLES).items():
+        train[label] = [u for i, u in enumerate(utterances) if i % 4 != 3]
+        test.extend((u, label) for i, u in enumerate(utterances) if i % 4 == 3)
+    return train, test
+
+
+def held_out_check(min_precision=0.9):
+    """Accuracy on held-out examples, with and without the gate used for answering; returns failures"""
+    train, test = held_out_split()
+    clf = IntentClassifier().fit_examples(train)
+    predicted, _ = clf.classify_batch([text for text, _ in test])
+    correct = sum(p == label for p, (_, label) in zip(predicted, test))
+    print(f"Held-out accuracy: {correct}/{len(test)} ({100 * correct / len(test):.1f}%)")
+
+    answered = [(text, label, clf.decide(text)[0]) for text, label in test]
+    answered = [(text, label, p) for text, label, p in answered if p is not None]
+    gated_correct = sum(p == label for _, label, p in answered)
+    precision = gated_correct / len(answered) if answered else 1.0
+    print(f"Answered past the gate: {len(answered)}/{len(test)}, {gated_correct} correct ({100 * precision:.1f}%)")
+
+    clf = IntentClassifier().fit_examples()
+    leaked = [(text, clf.decide(text)[0]) for text in OUT_OF_SCOPE]
+    leaked = [(text, label) for text, label in leaked if label is not None]
+    for text, label in leaked:
+        print(f"  out-of-scope message answered as {label}: {text!r}")
+    print(f"Out-of-scope messages answered: {len(leaked)}/{len(OUT_OF_SCOPE)}")
+    return (precision < min_precision) + len(leaked)
+
+
+def benchmark(n_messages=20000):
+    """Report held-out accuracy and batch throughput on the built-in examples"""
+    held_out_check()
+
+    clf = IntentClassifier().fit_examples()
+    all_texts = [u for utterances in INTENT_EXAMPLES.values() for u in utterances]
+    messages = [all_texts[i % len(all_texts)] for i in range(n_messages)]
+
+    start = time.perf_counter()
+    clf.classify_batch(messages)
+    batch_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for message in messages[:2000]:
+        clf.classify(message)
+    single_time = (time.perf_counter() - start) * n_messages / 2000
+
+    print(f"classify_batch: {n_messages} messages in {batch_time * 1000:.1f} ms "
+          f"({n_messages / batch_time:,.0f} msg/s)")
+    print(f"classify (one at a time, extrapolated): {single_time * 1000:.1f} ms "
+          f"({n_messages / single_time:,.0f} msg/s)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--train":
+        IntentClassifier().fit_examples().save(sys.argv[2])
+        print(f"Saved intent model to {sys.argv[2]}")
+    elif "--check" in sys.argv:
+        sys.exit(1 if held_out_check() else 0)
+    else:
+        benchmark()
@@ -0,0 +1,445 @@
+"""Link previews (title, description, size) fetched in the background
+
+Only the document head is read: the response is streamed in small chunks
+and the download stops at </head> or <body>, at max_bytes, or when the
+time budget runs out, whichever comes first, so a huge or slow page cannot
+hold a worker. Results are cached per URL. A stale entry is revalidated
+with If-None-Match / If-Modified-Since, so an unchanged page costs a 304
+and no body.
+
+    python link_preview.py --selftest     # runs against a local fixture server
+    python link_preview.py https://example.com ...
+"""
+import codecs
+import html
+import http.client
+import re
+import ssl
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+
+USER_AGENT = "Mozilla/5.0 (compatible; NexusLinkPreview/1.0)"
+URL_PATTERN = re.compile(r"(https?://[^\s<>\"']+|www\.[^\s<>\"']+)")
+META_CHARSET = re.compile(rb"<meta[^>]+charset=[\"']?([\w-]+)", re.I)
+CHUNK_SIZE = 4096
+MAX_REDIRECTS = 3
+
+
+def find_urls(text):
+    """URLs in a message, in order and without duplicates; bare www. links get http://"""
+    urls = []
+    for match in URL_PATTERN.findall(text):
+        url = match.rstrip('.,;:!?)')
+        if not url.startswith("http"):
+            url = "http://" + url
+        if url not in urls:
+            urls.append(url)
+    return urls
+
+
+def format_size(size):
+    if size is None:
+        return "unknown size"
+    for unit in ("bytes", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size} {unit}" if unit == "bytes" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class HeadParser(HTMLParser):
+    """Collects the title and description meta tags, and notices where the head ends"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = None
+        self.meta = {}
+        self.in_title = False
+        self.title_parts = []
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {k.lower(): (v or "") for k, v in attrs}
+        if tag == 'title':
+            self.in_title = True
+        elif tag == 'meta':
+            key = (attrs.get('property') or attrs.get('name') or "").lower()
+            if key and 'content' in attrs:
+                self.meta.setdefault(key, attrs['content'])
+        elif tag == 'body':
+            self.done = True
+
+    def handle_endtag(self, tag):
+        if tag == 'title':
+            self.in_title = False
+            self.title = " ".join("".join(self.title_parts).split())
+        elif tag == 'head':
+            self.done = True
+
+    def handle_data(self, data):
+        if self.in_title:
+            self.title_parts.append(data)
+
+
+class Preview:
+    def __init__(self, url, final_url=None, status=None, title=None, description=None, content_type=None,
+                 size=None, error=None, elapsed=0.0, bytes_read=0, revalidated=False):
+        self.url = url
+        self.final_url = final_url or url
+        self.status = status
+        self.title = title
+        self.description = description
+        self.content_type = content_type
+        self.size = size
+        self.error = error
+        self.elapsed = elapsed
+        self.bytes_read = bytes_read
+        self.revalidated = revalidated
+
+    def describe(self, max_description=200):
+        """One line for the chat window"""
+        if self.error:
+            return f"Couldn't preview {self.url}: {self.error}"
+        parts = [self.title or urlsplit(self.final_url).netloc]
+        if self.description:
+            description = self.description
+            if len(description) > max_description:
+                description = description[:max_description].rsplit(' ', 1)[0] + "..."
+            parts.append(description)
+        kind = (self.content_type or "unknown type").split(';')[0]
+        return f"Link preview: {' - '.join(parts)} ({kind}, {format_size(self.size)})"
+
+    def __repr__(self):
+        return f"Preview({self.url!r}, title={self.title!r}, error={self.error!r})"
+
+
+class CacheEntry:
+    __slots__ = ('preview', 'etag', 'last_modified', 'expires')
+
+    def __init__(self, preview, etag, last_modified, expires):
+        self.preview = preview
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+
+
+def freshness(headers, default_ttl):
+    """Seconds a response may be reused without revalidation"""
+    cache_control = (headers.get('Cache-Control') or "").lower()
+    if 'no-cache' in cache_control or 'no-store' in cache_control:
+        return 0
+    match = re.search(r"max-age=(\d+)", cache_control)
+    if match:
+        return int(match.group(1))
+    return default_ttl
+
+
+class LinkPreviewer:
+    """Concurrent head-only fetcher with an LRU cache and conditional revalidation"""
+
+    def __init__(self, workers=4, max_bytes=64 * 1024, time_budget=3.0, cache_size=256, default_ttl=300.0):
+        self.max_bytes = max_bytes
+        self.time_budget = time_budget
+        self.default_ttl = default_ttl
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        # Reentrant: a fetch that has already finished runs its done-callback inside submit()
+        self.lock = threading.RLock()
+        # URL -> future of a fetch already running, so duplicates share it
+        self.pending = {}
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="link-preview")
+        self.ssl_context = ssl.create_default_context()
+        self.stats = {'fetches': 0, 'cache_hits': 0, 'revalidated': 0, 'errors': 0}
+
+    def preview_many(self, urls, callback=None):
+        """Start previews for every URL at once; callback(preview) runs as each one finishes"""
+        futures = []
+        for url in urls:
+            future = self.submit(url)
+            if callback is not None:
+                future.add_done_callback(lambda f: callback(f.result()))
+            futures.append(future)
+        return futures
+
+    def submit(self, url):
+        with self.lock:
+            future = self.pending.get(url)
+            if future is None:
+                future = self.pending[url] = self.executor.submit(self.preview, url)
+                future.add_done_callback(lambda f, url=url: self.forget(url, f))
+            return future
+
+    def forget(self, url, future):
+        with self.lock:
+            if self.pending.get(url) is future:
+                del self.pending[url]
+
+    def preview(self, url):
+        """Cached preview of url, revalidating or fetching as needed; never raises"""
+        with self.lock:
+            entry = self.cache.get(url)
+            if entry is not None:
+                self.cache.move_to_end(url)
+                if time.monotonic() < entry.expires:
+                    self.stats['cache_hits'] += 1
+                    return entry.preview
+        try:
+            preview, headers = self.fetch(url, entry)
+        except Exception as e:
+            with self.lock:
+                self.stats['errors'] += 1
+            if entry is not None:
+                # Serve the stale copy rather than nothing
+                return entry.preview
+            return Preview(url, error=str(e) or type(e).__name__)
+        with self.lock:
+            self.stats['fetches'] += 1
+            if preview.revalidated:
+                self.stats['revalidated'] += 1
+            if preview.error is None and preview.status == 200 or preview.revalidated:
+                self.cache[url] = CacheEntry(
+                    preview,
+                    headers.get('ETag') or (entry.etag if entry else None),
+                    headers.get('Last-Modified') or (entry.last_modified if entry else None),
+                    time.monotonic() + freshness(headers, self.default_ttl),
+                )
+                self.cache.move_to_end(url)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return preview
+
+    def fetch(self, url, entry=None):
+        """One head-only fetch within the byte and time limits; returns (preview, headers)"""
+        started = time.monotonic()
+        deadline = started + self.time_budget
+        target = url
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(target)
+            if parts.scheme not in ('http', 'https') or not parts.hostname:
+                raise ValueError("not an http(s) link")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("timed out")
+            if parts.scheme == 'https':
+                conn = http.client.HTTPSConnection(parts.hostname, parts.port, timeout=remaining,
+                                                   context=self.ssl_context)
+            else:
+                conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=remaining)
+            headers = {'User-Agent': USER_AGENT, 'Accept': "text/html,*/*;q=0.5", 'Accept-Encoding': "identity"}
+            if entry is not None and target == url:
+                if entry.etag:
+                    headers['If-None-Match'] = entry.etag
+                if entry.last_modified:
+                    headers['If-Modified-Since'] = entry.last_modified
+            path = parts.path or "/"
+            if parts.query:
+                path += "?" + parts.query
+            try:
+                conn.request("GET", path, headers=headers)
+                # Kept for per-read timeouts; the connection drops it once the response owns the socket
+                sock = conn.sock
+                response = conn.getresponse()
+                if response.status in (301, 302, 303, 307, 308) and response.getheader('Location'):
+                    target = urljoin(target, response.getheader('Location'))
+                    continue
+                if response.status == 304 and entry is not None:
+                    old = entry.preview
+                    preview = Preview(url, old.final_url, 200, old.title, old.description, old.content_type,
+                                      old.size, elapsed=time.monotonic() - started, revalidated=True)
+                    return preview, response.headers
+                return self.read_head(url, target, sock, response, started, deadline), response.headers
+            finally:
+                conn.close()
+        raise ValueError("too many redirects")
+
+    def read_head(self, url, final_url, sock, response, started, deadline):
+        content_type = response.getheader('Content-Type') or ""
+        length = response.getheader('Content-Length')
+        size = int(length) if length and length.isdigit() else None
+        preview = Preview(url, final_url, response.status, content_type=content_type, size=size)
+        if response.status != 200:
+            preview.error = f"HTTP {response.status}"
+        elif 'html' in content_type.lower():
+            parser = HeadParser()
+            match = re.search(r"charset=([\w-]+)", content_type, re.I)
+            charset = match.group(1) if match else None
+            decoder = None
+            read = 0
+            while not parser.done and read < self.max_bytes:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                sock.settimeout(remaining)
+                try:
+                    chunk = response.read1(min(CHUNK_SIZE, self.max_bytes - read))
+                except TimeoutError:
+                    break
+                if not chunk:
+                    break
+                read += len(chunk)
+                if decoder is None:
+                    if charset is None:
+                        sniffed = META_CHARSET.search(chunk)
+                        charset = sniffed.group(1).decode('ascii') if sniffed else 'utf-8'
+                    try:
+                        decoder = codecs.getincrementaldecoder(charset)(errors='replace')
+                    except LookupError:
+                        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+                parser.feed(decoder.decode(chunk))
+            preview.bytes_read = read
+            if parser.title is None and parser.title_parts:
+                # Cut off inside the title
+                parser.title = " ".join("".join(parser.title_parts).split())
+            meta = parser.meta
+            preview.title = html.unescape(meta.get('og:title') or parser.title or "") or None
+            preview.description = (meta.get('description') or meta.get('og:description') or "").strip() or None
+        preview.elapsed = time.monotonic() - started
+        return preview
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def fixture_server():
+    """Local HTTP server with pages that exercise each limit; returns (server, base_url)"""
+    import http.server
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        hits = {}
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_page(self, body, content_type="text/html; charset=utf-8", headers=None, length=True):
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            if length:
+                self.send_header('Content-Length', str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            Handler.hits[self.path] = Handler.hits.get(self.path, 0) + 1
+            if self.path == '/page':
+                if self.headers.get('If-None-Match') == '"v1"':
+                    self.send_response(304)
+                    self.send_header('ETag', '"v1"')
+                    self.end_headers()
+                    return
+                head = (b"<html><head><title>Fixture &amp; Page</title>"
+                        b"<meta name='description' content='A page for preview tests'></head>")
+                self.send_page(head + b"<body>" + b"x" * 100000 + b"</body></html>",
+                               headers={'ETag': '"v1"', 'Cache-Control': 'max-age=0'})
+            elif self.path == '/dated':
+                stamp = "Mon, 19 Oct 2026 08:00:00 GMT"
+                if self.headers.get('If-Modified-Since') == stamp:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_page(b"<head><title>Dated</title></head>", headers={'Last-Modified': stamp,
+                                                                               'Cache-Control': 'no-cache'})
+            elif self.path == '/redirect':
+                self.send_response(302)
+                self.send_header('Location', '/page')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            elif self.path == '/huge-head':
+                # A head that never ends: the byte limit must stop the download
+                self.send_page(b"<head><title>Huge</title>" + b"<meta name='x' content='y'>" * 200000, length=False)
+            elif self.path == '/slow':
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html')
+                self.end_headers()
+                self.wfile.write(b"<head><title>Slow")
+                self.wfile.flush()
+                time.sleep(3)
+                self.wfile.write(b"</title></head>")
+            elif self.path.startswith('/delay'):
+                time.sleep(0.5)
+                self.send_page(f"<head><title>{self.path}</title></head>".encode())
+            elif self.path == '/latin1':
+                self.send_page("<head><meta charset='iso-8859-1'><title>Café</title></head>".encode('latin-1'),
+                               content_type="text/html")
+            elif self.path == '/image':
+                self.send_page(b"\x89PNG" + b"\0" * 5000, content_type="image/png")
+            else:
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+    class Server(http.server.ThreadingHTTPServer):
+        daemon_threads = True
+
+        def handle_error(self, request, client_address):
+            # The previewer hangs up early on purpose
+            pass
+
+    server = Server(('127.0.0.1', 0), Handler)
+    server.hits = Handler.hits
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def selftest():
+    server, base = fixture_server()
+    previewer = LinkPreviewer(max_bytes=16 * 1024, time_budget=1.0)
+    failures = []
+
+    def check(name, condition, detail=""):
+        print(f"{'ok  ' if condition else 'FAIL'} {name} {detail}")
+        if not condition:
+            failures.append(name)
+
+    try:
+        page = previewer.preview(base + "/page")
+        check("title and description", page.title == "Fixture & Page" and page.description == "A page for preview tests",
+              repr(page))
+        check("head only", page.bytes_read <= CHUNK_SIZE, f"({page.bytes_read} bytes read of {page.size})")
+        again = previewer.preview(base + "/page")
+        check("ETag revalidation", again.revalidated and server.hits['/page'] == 2 and again.title == page.title)
+        previewer.preview(base + "/dated")
+        dated = previewer.preview(base + "/dated")
+        check("Last-Modified revalidation", dated.revalidated and dated.title == "Dated")
+        redirected = previewer.preview(base + "/redirect")
+        check("redirect", redirected.title == "Fixture & Page" and redirected.final_url.endswith("/page"))
+        huge = previewer.preview(base + "/huge-head")
+        check("byte limit", huge.bytes_read <= 16 * 1024 and huge.title == "Huge", f"({huge.bytes_read} bytes)")
+        start = time.monotonic()
+        slow = previewer.preview(base + "/slow")
+        elapsed = time.monotonic() - start
+        check("time limit", elapsed < 1.5, f"({elapsed:.2f}s, {slow!r})")
+        check("charset", previewer.preview(base + "/latin1").title == "Café")
+        image = previewer.preview(base + "/image")
+        check("non-html size", image.size == 5004 and image.title is None, image.describe())
+        check("HTTP error", previewer.preview(base + "/missing").error == "HTTP 404")
+        start = time.monotonic()
+        futures = previewer.preview_many([f"{base}/delay{i}" for i in range(4)])
+        titles = [f.result().title for f in futures]
+        elapsed = time.monotonic() - start
+        check("concurrent fetches", elapsed < 1.5 and titles == [f"/delay{i}" for i in range(4)], f"({elapsed:.2f}s for 4 x 0.5s)")
+        check("cache hit", previewer.preview(f"{base}/delay0").elapsed == futures[0].result().elapsed
+              and server.hits['/delay0'] == 1)
+    finally:
+        previewer.close()
+        server.shutdown()
+    print(f"{len(failures)} failures; stats {previewer.stats}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    if "--selftest" in sys.argv:
+        sys.exit(selftest())
+    elif len(sys.argv) > 1:
+        previewer = LinkPreviewer()
+        for future in previewer.preview_many(sys.argv[1:]):
+            print(future.result().describe())
+        previewer.close()
+    else:
+        print(__doc__)
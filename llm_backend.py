@@ -0,0 +1,442 @@
+"""Client for an OpenAI-compatible completion server running on localhost
+
+Requests arriving within a few milliseconds of each other are sent as one
+micro-batch (a list prompt), and tokens are streamed back to each caller as
+the server produces them. Connections are kept alive and reused, and a newer
+request from the same session cancels the older one.
+
+Finished responses are cached under a key the caller chooses.
+PromptBuilder.cache_text() gives the system prompt, persona, conversation
+history and summary plus the user message with case and punctuation folded,
+so "What is a qubit?" and "what is a qubit" share an entry. A follow-up like
+"why?" only hits when the conversation before it was the same.
+
+    python llm_backend.py --selftest     # runs against a local stub server
+"""
+import hashlib
+import http.client
+import json
+import queue
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+_END = object()
+
+DEFAULT_SYSTEM_PROMPT = (
+    "You are {bot_name}, a friendly futuristic AI assistant. "
+    "Answer briefly and helpfully."
+)
+
+
+class LLMError(Exception):
+    pass
+
+
+class CompletionRequest:
+    """One prompt in flight; iterate it to receive tokens as they stream in"""
+
+    def __init__(self, prompt, session=None, cache_key=None):
+        self.prompt = prompt
+        self.session = session
+        self.cache_key = cache_key
+        self.tokens = queue.Queue()
+        self.cancelled = threading.Event()
+        self.text = []
+        self.error = None
+
+    def put(self, token):
+        if not self.cancelled.is_set():
+            self.text.append(token)
+            self.tokens.put(token)
+
+    def finish(self, error=None):
+        self.error = error
+        self.tokens.put(_END)
+
+    def cancel(self):
+        self.cancelled.set()
+        self.tokens.put(_END)
+
+    def __iter__(self):
+        while True:
+            token = self.tokens.get()
+            if token is _END:
+                if self.error is not None and not self.cancelled.is_set():
+                    raise self.error
+                return
+            yield token
+
+
+class PromptBuilder:
+    """Render the system prompt + persona prefix once and reuse the exact string
+
+    Keeping the prefix byte-identical between requests lets the server reuse
+    its cached prefix computation, and saves rebuilding it per message.
+    """
+
+    def __init__(self, system_prompt=DEFAULT_SYSTEM_PROMPT, max_prefixes=32):
+        self.system_prompt = system_prompt
+        self.max_prefixes = max_prefixes
+        self.prefixes = OrderedDict()
+        self.lock = threading.Lock()
+
+    def prefix(self, bot_name, persona):
+        key = json.dumps([bot_name, persona], sort_keys=True, default=str)
+        with self.lock:
+            if key in self.prefixes:
+                self.prefixes.move_to_end(key)
+                return self.prefixes[key]
+        lines = [self.system_prompt.format(bot_name=bot_name), "", "What you know about the user:"]
+        for category, fields in sorted(persona.items()):
+            for field, value in sorted(fields.items()):
+                if value in (None, "", [], ["", "", ""]):
+                    continue
+                if isinstance(value, list):
+                    value = ", ".join(str(v) for v in value if v)
+                lines.append(f"- {category} {field.replace('_', ' ')}: {value}")
+        rendered = "\n".join(lines) + "\n\n"
+        with self.lock:
+            self.prefixes[key] = rendered
+            if len(self.prefixes) > self.max_prefixes:
+                self.prefixes.popitem(last=False)
+        return rendered
+
+    def build(self, bot_name, persona, message, history=""):
+        return f"{self.prefix(bot_name, persona)}{history}User: {message}\nAssistant:"
+
+    def cache_text(self, bot_name, persona, message, history=""):
+        """What a reply is cached under: the prompt with the user's message case and punctuation folded"""
+        words = re.findall(r"[\w']+", message.lower())
+        return f"{self.prefix(bot_name, persona)}{history}User: {' '.join(words)}"
+
+
+class LLMClient:
+    def __init__(self, base_url="http://127.0.0.1:8080", model="local", max_tokens=256, temperature=0.7,
+                 batch_window=0.01, max_batch=8, pool_size=4, timeout=60.0, cache_size=256):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = (parts.path.rstrip('/') or "") + "/v1/completions"
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.timeout = timeout
+
+        self.pending = queue.Queue()
+        self.connections = queue.LifoQueue(maxsize=pool_size)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="llm-batch")
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        self.active = {}
+        self.stats = {'requests': 0, 'batches': 0, 'cache_hits': 0, 'cancelled': 0}
+
+        self.dispatcher = threading.Thread(target=self.dispatch, name="llm-dispatch", daemon=True)
+        self.dispatcher.start()
+
+    def cache_key(self, text):
+        params = f"{self.model}|{self.max_tokens}|{self.temperature}|"
+        return hashlib.sha1((params + text).encode('utf-8')).hexdigest()
+
+    def complete(self, prompt, session=None, cache_text=None):
+        """Submit a prompt and return a CompletionRequest to iterate over
+
+        Replies are cached under cache_text when one is given; without it
+        nothing is cached.
+        """
+        key = self.cache_key(cache_text) if cache_text is not None else None
+        request = CompletionRequest(prompt, session, key)
+        with self.lock:
+            self.stats['requests'] += 1
+            # A newer message from the same session supersedes the old one
+            previous = self.active.pop(session, None) if session is not None else None
+            if previous is not None:
+                self.stats['cancelled'] += 1
+            cached = self.cache.get(key) if key is not None else None
+            if cached is not None:
+                self.cache.move_to_end(key)
+                self.stats['cache_hits'] += 1
+            elif session is not None:
+                # Answered from the cache means finished already, so nothing to cancel later
+                self.active[session] = request
+        if previous is not None:
+            previous.cancel()
+        if cached is not None:
+            request.put(cached)
+            request.finish()
+        else:
+            self.pending.put(request)
+        return request
+
+    def generate(self, prompt, session=None, cache_text=None):
+        """Yield response tokens for a prompt"""
+        request = self.complete(prompt, session, cache_text)
+        try:
+            yield from request
+        finally:
+            self.release(request)
+
+    def release(self, request):
+        """Forget a finished request, so the session's next message has nothing to cancel"""
+        with self.lock:
+            if request.session is not None and self.active.get(request.session) is request:
+                del self.active[request.session]
+
+    def cancel_session(self, session):
+        with self.lock:
+            request = self.active.pop(session, None)
+            if request is not None:
+                self.stats['cancelled'] += 1
+        if request is not None:
+            request.cancel()
+
+    def dispatch(self):
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            batch = [r for r in batch if not r.cancelled.is_set()]
+            if batch:
+                self.stats['batches'] += 1
+                self.executor.submit(self.run_batch, batch)
+
+    def acquire_connection(self):
+        try:
+            return self.connections.get_nowait()
+        except queue.Empty:
+            return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def release_connection(self, conn):
+        try:
+            self.connections.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def run_batch(self, batch):
+        body = {
+            'model': self.model,
+            'prompt': [r.prompt for r in batch] if len(batch) > 1 else batch[0].prompt,
+            'max_tokens': self.max_tokens,
+            'temperature': self.temperature,
+            'stream': True,
+            'stop': ["\nUser:"],
+        }
+        conn = self.acquire_connection()
+        reusable = False
+        error = None
+        try:
+            conn.request("POST", self.path, body=json.dumps(body), headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            if response.status != 200:
+                response.read()
+                raise LLMError(f"LLM server returned HTTP {response.status}")
+            reusable = self.read_stream(response, batch)
+        except Exception as e:
+            error = e if isinstance(e, LLMError) else LLMError(f"LLM request failed: {e}")
+        finally:
+            if reusable:
+                self.release_connection(conn)
+            else:
+                conn.close()
+            for request in batch:
+                if error is None and not request.cancelled.is_set():
+                    self.store(request)
+                self.release(request)
+                request.finish(error)
+
+    def read_stream(self, response, batch):
+        """Route streamed choices to their requests; False if the stream was abandoned"""
+        while True:
+            # Stop reading (and drop the connection) once nobody is listening
+            if all(r.cancelled.is_set() for r in batch):
+                return False
+            line = response.readline()
+            if not line:
+                return True
+            line = line.decode('utf-8').strip()
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                response.read()
+                return True
+            for choice in json.loads(data).get('choices', []):
+                index = choice.get('index', 0)
+                if index < len(batch) and choice.get('text'):
+                    batch[index].put(choice['text'])
+
+    def store(self, request):
+        text = "".join(request.text)
+        if not text or request.cache_key is None:
+            return
+        with self.lock:
+            self.cache[request.cache_key] = text
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+
+def stub_server(token_delay=0.0):
+    """Local OpenAI-style streaming completion server; returns (server, base_url)
+
+    Each prompt is answered with "echo" and the words of its last user line,
+    one word per streamed token. A prompt containing FAIL gets HTTP 500.
+    """
+    import http.server
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def setup(self):
+            super().setup()
+            self.server.connections += 1
+
+        def send_chunk(self, data):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            self.server.bodies.append(body)
+            prompts = body['prompt'] if isinstance(body['prompt'], list) else [body['prompt']]
+            if any("FAIL" in p for p in prompts):
+                self.send_response(500)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            replies = []
+            for prompt in prompts:
+                last = [line for line in prompt.split("\n") if line.startswith("User: ")][-1]
+                replies.append(["echo"] + last[len("User: "):].split())
+            try:
+                for position in range(max(len(r) for r in replies)):
+                    choices = [{'index': i, 'text': (" " if position else "") + r[position]}
+                               for i, r in enumerate(replies) if position < len(r)]
+                    self.send_chunk(f"data: {json.dumps({'choices': choices})}\n\n".encode())
+                    time.sleep(self.server.token_delay)
+                self.send_chunk(b"data: [DONE]\n\n")
+                self.send_chunk(b"")
+            except (BrokenPipeError, ConnectionResetError):
+                # The client hung up on a cancelled stream
+                pass
+
+    class Server(http.server.ThreadingHTTPServer):
+        daemon_threads = True
+
+        def handle_error(self, request, client_address):
+            pass
+
+    server = Server(('127.0.0.1', 0), Handler)
+    server.bodies = []
+    server.connections = 0
+    server.token_delay = token_delay
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def selftest():
+    server, base = stub_server()
+    client = LLMClient(base, batch_window=0.05)
+    builder = PromptBuilder()
+    persona = {'user': {'name': "Sam"}}
+    failures = []
+
+    def check(name, condition, detail=""):
+        print(f"{'ok  ' if condition else 'FAIL'} {name} {detail}")
+        if not condition:
+            failures.append(name)
+
+    try:
+        text = "".join(client.generate(builder.build("Nexus", persona, "hello there")))
+        check("streamed reply", text == "echo hello there", repr(text))
+
+        server.bodies.clear()
+        results = {}
+
+        def ask(i):
+            results[i] = "".join(client.complete(builder.build("Nexus", persona, f"question {i}")))
+
+        threads = [threading.Thread(target=ask, args=(i,)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        check("micro-batch: one request for four prompts",
+              len(server.bodies) == 1 and len(server.bodies[0]['prompt']) == 4, f"({len(server.bodies)} requests)")
+        check("micro-batch: each caller gets its own reply",
+              all(results[i] == f"echo question {i}" for i in range(4)), repr(results))
+        check("connection reused", server.connections == 1, f"({server.connections} connections)")
+
+        # A finished reply leaves nothing for the session's next message to cancel
+        cancelled = client.stats['cancelled']
+        "".join(client.complete(builder.build("Nexus", persona, "first"), session="a"))
+        "".join(client.complete(builder.build("Nexus", persona, "second"), session="a"))
+        check("finished requests are not cancelled later", client.stats['cancelled'] == cancelled
+              and "a" not in client.active, f"(cancelled {client.stats['cancelled'] - cancelled})")
+
+        server.token_delay = 0.05
+        slow = client.complete(builder.build("Nexus", persona, "a b c d e f g h i j k l m n o p"), session="b")
+        time.sleep(0.2)
+        newer = client.complete(builder.build("Nexus", persona, "never mind"), session="b")
+        partial = "".join(slow)
+        check("newer message cancels the older stream", slow.cancelled.is_set() and len(partial.split()) < 10
+              and client.stats['cancelled'] == cancelled + 1, repr(partial))
+        check("newer message answered", "".join(newer) == "echo never mind")
+        server.token_delay = 0.0
+
+        requests_before = len(server.bodies)
+        history = "User: hi\nAssistant: hello\n"
+        first = "".join(client.complete(builder.build("Nexus", persona, "What is a qubit?"),
+                                        cache_text=builder.cache_text("Nexus", persona, "What is a qubit?")))
+        again = "".join(client.complete(builder.build("Nexus", persona, "what is a qubit"),
+                                        cache_text=builder.cache_text("Nexus", persona, "what is a qubit")))
+        check("cache hit with case and punctuation folded", again == first
+              and len(server.bodies) == requests_before + 1 and client.stats['cache_hits'] == 1, repr(again))
+        "".join(client.complete(builder.build("Nexus", persona, "what is a qubit", history),
+                                cache_text=builder.cache_text("Nexus", persona, "what is a qubit", history)))
+        check("different history is a cache miss", len(server.bodies) == requests_before + 2
+              and client.stats['cache_hits'] == 1)
+        "".join(client.complete(builder.build("Nexus", persona, "what is a qubit", history),
+                                cache_text=builder.cache_text("Nexus", persona, "What is a qubit?", history)))
+        check("same history is a cache hit", len(server.bodies) == requests_before + 2
+              and client.stats['cache_hits'] == 2)
+        "".join(client.complete(builder.build("Nexus", {}, "what is a qubit"),
+                                cache_text=builder.cache_text("Nexus", {}, "what is a qubit")))
+        check("other persona is a cache miss", len(server.bodies) == requests_before + 3)
+
+        try:
+            "".join(client.complete(builder.build("Nexus", persona, "FAIL please")))
+            check("HTTP error raised", False)
+        except LLMError as e:
+            check("HTTP error raised", "500" in str(e), str(e))
+    finally:
+        server.shutdown()
+    print(f"{len(failures)} failures; stats {client.stats}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    if "--selftest" in sys.argv:
+        sys.exit(selftest())
+    else:
+        print(__doc__)
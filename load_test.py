@@ -0,0 +1,285 @@
+"""Replay JSONL conversation scripts against the chatbot with concurrent virtual users
+
+Each line of a script file is one conversation:
+
+    {"name": "small talk", "turns": ["hi", "what time is it", {"message": "bye", "intent": "farewell"}]}
+
+Turns are sent in order by a virtual user, with think time between them. Targets are
+either in-process ChatbotCore sessions or a server endpoint (see server.py) that accepts
+POST {"session": ..., "message": ...} and answers {"response": ...}.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def load_scripts(path):
+    """Read conversation scripts, normalising every turn to {'message', 'intent'}"""
+    scripts = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            data = json.loads(line)
+            turns = []
+            for turn in data.get('turns', []):
+                if isinstance(turn, str):
+                    turn = {'message': turn}
+                turns.append({'message': turn['message'], 'intent': turn.get('intent')})
+            if turns:
+                scripts.append({'name': data.get('name', f"script {line_no}"), 'turns': turns})
+    if not scripts:
+        raise ValueError(f"No conversation scripts found in {path}")
+    return scripts
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class InProcessTarget:
+    """Send turns straight into ChatbotCore.respond, one headless session per virtual user"""
+
+    def __init__(self):
+        from AI import ChatbotCore, DEFAULT_CONFIG, load_intent_classifier
+        from memory_store import PersonalMemoryStore
+
+        self.core_class = ChatbotCore
+        self.config = DEFAULT_CONFIG
+        self.intent_classifier = load_intent_classifier()
+        # Keep load-test profiles out of the real personal memory database
+        self.db_dir = tempfile.mkdtemp(prefix="chatbot_load_")
+        self.memory = PersonalMemoryStore(os.path.join(self.db_dir, "memory.db"))
+
+    def open_session(self, session_id):
+        return self.core_class(
+            config=json.loads(json.dumps(self.config)), memory=self.memory,
+            intent_classifier=self.intent_classifier, user_id=session_id, headless=True
+        )
+
+    def send(self, session, session_id, message):
+        return session.respond(message)
+
+    def close_session(self, session):
+        pass
+
+
+class HttpTarget:
+    """POST turns to a running server, reusing one keep-alive connection per virtual user"""
+
+    def __init__(self, url, timeout=30):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = parts.path or "/message"
+        self.timeout = timeout
+
+    def open_session(self, session_id):
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def send(self, session, session_id, message):
+        body = json.dumps({'session': session_id, 'message': message})
+        session.request("POST", self.path, body=body, headers={'Content-Type': 'application/json'})
+        response = session.getresponse()
+        payload = response.read()
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}")
+        return json.loads(payload).get('response', '')
+
+    def close_session(self, session):
+        session.close()
+
+
+class LoadResults:
+    """Thread-safe collection of per-intent latencies and errors"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.error_samples = []
+
+    def record(self, intent, latency, error=None):
+        with self.lock:
+            if error is None:
+                self.latencies.setdefault(intent, []).append(latency)
+            else:
+                self.errors[intent] = self.errors.get(intent, 0) + 1
+                if len(self.error_samples) < 20:
+                    self.error_samples.append(f"{intent}: {error}")
+
+    def summary(self, wall_time, settings):
+        intents = {}
+        all_latencies = []
+        for intent in sorted(set(self.latencies) | set(self.errors)):
+            values = sorted(self.latencies.get(intent, []))
+            all_latencies.extend(values)
+            intents[intent] = self.describe(values, self.errors.get(intent, 0))
+        all_latencies.sort()
+        total = self.describe(all_latencies, sum(self.errors.values()))
+        total['throughput_rps'] = round(total['requests'] / wall_time, 2) if wall_time else 0.0
+        return {
+            'settings': settings,
+            'wall_time_s': round(wall_time, 3),
+            'total': total,
+            'intents': intents,
+            'error_samples': self.error_samples,
+        }
+
+    @staticmethod
+    def describe(values, errors):
+        ms = lambda seconds: round(seconds * 1000, 3)
+        return {
+            'requests': len(values) + errors,
+            'errors': errors,
+            'p50_ms': ms(percentile(values, 50)),
+            'p95_ms': ms(percentile(values, 95)),
+            'p99_ms': ms(percentile(values, 99)),
+            'max_ms': ms(values[-1]) if values else 0.0,
+        }
+
+
+class LoadGenerator:
+    """Run N virtual users that replay scripts with ramp-up and think time"""
+
+    def __init__(self, target, scripts, users=10, duration=30.0, ramp_up=5.0,
+                 think_time=1.0, iterations=None, classifier=None):
+        self.target = target
+        self.scripts = scripts
+        self.users = users
+        self.duration = duration
+        self.ramp_up = ramp_up
+        self.think_time = think_time
+        self.iterations = iterations
+        self.classifier = classifier
+        self.results = LoadResults()
+        self.stop_event = threading.Event()
+
+    def intent_of(self, turn):
+        if turn['intent']:
+            return turn['intent']
+        if self.classifier is not None:
+            return self.classifier.classify(turn['message'])[0]
+        return 'unlabeled'
+
+    def virtual_user(self, user_index, start_delay):
+        if self.stop_event.wait(start_delay):
+            return
+        session_id = f"vu-{user_index}"
+        rng = random.Random(user_index)
+        try:
+            session = self.target.open_session(session_id)
+        except Exception as e:
+            self.results.record('session_setup', 0.0, e)
+            return
+
+        script_index = user_index
+        completed = 0
+        try:
+            while not self.stop_event.is_set():
+                if self.iterations is not None and completed >= self.iterations:
+                    break
+                script = self.scripts[script_index % len(self.scripts)]
+                for turn in script['turns']:
+                    if self.stop_event.is_set():
+                        break
+                    intent = self.intent_of(turn)
+                    start = time.perf_counter()
+                    try:
+                        self.target.send(session, session_id, turn['message'])
+                        self.results.record(intent, time.perf_counter() - start)
+                    except Exception as e:
+                        self.results.record(intent, time.perf_counter() - start, e)
+                    # Exponentially distributed think time around the configured mean
+                    if self.think_time > 0:
+                        self.stop_event.wait(rng.expovariate(1 / self.think_time))
+                script_index += 1
+                completed += 1
+        finally:
+            self.target.close_session(session)
+
+    def run(self):
+        threads = []
+        start = time.perf_counter()
+        for i in range(self.users):
+            delay = self.ramp_up * i / self.users if self.users else 0
+            thread = threading.Thread(target=self.virtual_user, args=(i, delay), daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        deadline = start + self.duration if self.duration else None
+        for thread in threads:
+            timeout = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            thread.join(timeout)
+        self.stop_event.set()
+        for thread in threads:
+            thread.join()
+        wall_time = time.perf_counter() - start
+
+        settings = {
+            'users': self.users, 'duration_s': self.duration, 'ramp_up_s': self.ramp_up,
+            'think_time_s': self.think_time, 'iterations': self.iterations,
+            'target': type(self.target).__name__,
+        }
+        return self.results.summary(wall_time, settings)
+
+
+def print_report(summary):
+    total = summary['total']
+    print(f"\nRequests: {total['requests']}  Errors: {total['errors']}  "
+          f"Wall time: {summary['wall_time_s']:.1f}s  Throughput: {total['throughput_rps']:.1f} req/s")
+    print(f"{'intent':<18}{'reqs':>7}{'errs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    rows = list(summary['intents'].items()) + [('TOTAL', total)]
+    for intent, stats in rows:
+        print(f"{intent:<18}{stats['requests']:>7}{stats['errors']:>6}{stats['p50_ms']:>10.2f}"
+              f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['max_ms']:>10.2f}")
+    for sample in summary['error_samples']:
+        print(f"  error: {sample}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay conversation scripts against the chatbot")
+    parser.add_argument("scripts", help="JSONL file of conversation scripts")
+    parser.add_argument("--url", help="server endpoint, e.g. http://127.0.0.1:8765/message (default: in-process)")
+    parser.add_argument("--users", type=int, default=10, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="test length in seconds (0 = until iterations finish)")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="seconds over which users are started")
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean pause between turns in seconds")
+    parser.add_argument("--iterations", type=int, help="scripts per virtual user before it stops")
+    parser.add_argument("--output", help="write the machine-readable summary to this JSON file")
+    args = parser.parse_args(argv)
+
+    scripts = load_scripts(args.scripts)
+    target = HttpTarget(args.url) if args.url else InProcessTarget()
+    classifier = getattr(target, 'intent_classifier', None)
+    if classifier is None:
+        from intent_classifier import IntentClassifier
+        classifier = IntentClassifier().fit_examples()
+
+    generator = LoadGenerator(
+        target, scripts, users=args.users, duration=args.duration, ramp_up=args.ramp_up,
+        think_time=args.think_time, iterations=args.iterations, classifier=classifier
+    )
+    summary = generator.run()
+    print_report(summary)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=4)
+        print(f"\nResults written to {args.output}")
+    return 1 if summary['total']['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""Memory footprint reporting and leak hunting for long-running sessions
+
+Two modes:
+
+    sampling     every `interval` seconds record RSS, live threads and any
+                 extra counters (Tk widgets, chat lines). Every `trace_every`
+                 samples, tracemalloc runs for `trace_window` seconds and the
+                 allocation sites that grew during that window are kept. The
+                 tracing overhead applies only during those windows, so this
+                 mode can stay on in production.
+    tracemalloc  tracing stays on the whole time and every sample is
+                 compared with the first snapshot. More precise, and slower.
+
+The report and the JSON dump include the RSS trend in bytes per hour, so a
+slow creep over days shows up long before the kiosk runs out of memory.
+
+Counters that read GUI state (Tk is not thread-safe) are given a
+schedule(delay_ms, callback) such as root.after: they then run on the GUI
+loop every `interval` seconds, and samples and reports take the last values
+collected there instead of calling into Tk from the diagnostics thread.
+"""
+import gc
+import json
+import os
+import re
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+
+import psutil
+
+# Allocation sites inside the diagnostics machinery itself are noise
+IGNORED_FILES = (__file__, tracemalloc.__file__, "<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>", "<unknown>")
+
+
+def format_bytes(size):
+    sign = "-" if size < 0 else ""
+    size = abs(size)
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":
+            return f"{sign}{size:.0f} {unit}" if unit == "B" else f"{sign}{size:.1f} {unit}"
+        size /= 1024
+
+
+def thread_summary():
+    """Live threads grouped by name, with the per-instance counter stripped"""
+    names = Counter(re.sub(r"[-_]?\d+", "", t.name) for t in threading.enumerate())
+    return dict(names.most_common())
+
+
+def growth_sites(snapshot, baseline, top_n):
+    filters = [tracemalloc.Filter(False, pattern) for pattern in IGNORED_FILES]
+    snapshot = snapshot.filter_traces(filters)
+    baseline = baseline.filter_traces(filters)
+    sites = []
+    for stat in snapshot.compare_to(baseline, 'traceback')[:top_n]:
+        if stat.size_diff <= 0:
+            break
+        frame = stat.traceback[-1]
+        sites.append({
+            'site': f"{frame.filename}:{frame.lineno}",
+            'stack': [f"{f.filename}:{f.lineno}" for f in stat.traceback],
+            'size_diff': stat.size_diff,
+            'count_diff': stat.count_diff,
+            'size': stat.size,
+        })
+    return sites
+
+
+class MemoryDiagnostics:
+    def __init__(self, mode="sampling", interval=60.0, trace_every=10, trace_window=30.0, frames=5,
+                 top_n=10, history=1440, counters=None, dump_path=None, schedule=None):
+        self.mode = mode
+        self.interval = interval
+        self.trace_every = trace_every
+        self.trace_window = trace_window
+        self.frames = frames
+        self.top_n = top_n
+        # Callables returning {name: number}, e.g. Tk widget and chat line counts
+        self.counters = counters or {}
+        # schedule(delay_ms, callback) runs callback on the thread that owns the counters' state
+        self.schedule = schedule
+        self.counter_values = {}
+        self.dump_path = dump_path
+        self.process = psutil.Process()
+        self.samples = deque(maxlen=history)
+        self.first_sample = None
+        self.sites = []
+        self.sites_measured_at = None
+        self.baseline = None
+        self.started_at = time.time()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.mode == "tracemalloc":
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+            self.baseline = tracemalloc.take_snapshot()
+        if self.schedule is not None:
+            # start() is called on the GUI loop, so the first reading already has the counters
+            self.collect()
+        self.sample()
+        self.thread = threading.Thread(target=self.run, name="memory-diagnostics", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(self.trace_window + 2)
+        if self.mode == "tracemalloc" and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def run(self):
+        count = 0
+        while not self.stop_event.wait(self.interval):
+            count += 1
+            try:
+                if self.mode == "tracemalloc":
+                    self.update_sites(tracemalloc.take_snapshot(), self.baseline)
+                elif self.trace_every and count % self.trace_every == 0:
+                    self.trace_burst()
+                self.sample()
+                if self.dump_path:
+                    self.dump(self.dump_path)
+            except Exception as e:
+                print(f"Error in memory diagnostics: {e}")
+
+    def trace_burst(self):
+        """Trace allocations for one window and keep the sites that grew"""
+        if tracemalloc.is_tracing():
+            return
+        tracemalloc.start(self.frames)
+        try:
+            before = tracemalloc.take_snapshot()
+            self.stop_event.wait(self.trace_window)
+            after = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        self.update_sites(after, before)
+
+    def update_sites(self, snapshot, baseline):
+        sites = growth_sites(snapshot, baseline, self.top_n)
+        with self.lock:
+            self.sites = sites
+            self.sites_measured_at = time.time()
+
+    def read_counters(self):
+        values = {}
+        for name, counter in self.counters.items():
+            try:
+                values[name] = counter()
+            except Exception as e:
+                values[name] = None
+                print(f"Error reading {name} for memory diagnostics: {e}")
+        return values
+
+    def collect(self):
+        """Read the counters on the schedule's loop and hand the values to the diagnostics thread"""
+        values = self.read_counters()
+        with self.lock:
+            self.counter_values = values
+        if not self.stop_event.is_set():
+            self.schedule(int(self.interval * 1000), self.collect)
+
+    def read(self):
+        """A reading of RSS, threads and counters, not added to the trend history"""
+        sample = {
+            'time': time.time(),
+            'rss': self.process.memory_info().rss,
+            'threads': threading.active_count(),
+        }
+        if self.schedule is None:
+            sample.update(self.read_counters())
+        else:
+            with self.lock:
+                sample.update({name: self.counter_values.get(name) for name in self.counters})
+        return sample
+
+    def sample(self):
+        """Take a reading and record it; only the background thread does this, at a fixed interval"""
+        sample = self.read()
+        with self.lock:
+            self.samples.append(sample)
+            if self.first_sample is None:
+                self.first_sample = sample
+        return sample
+
+    def rss_trend(self):
+        """Least-squares RSS slope over the kept samples, in bytes per hour"""
+        with self.lock:
+            points = [(s['time'], s['rss']) for s in self.samples]
+        if len(points) < 3:
+            return None
+        t0 = points[0][0]
+        xs = [(t - t0) / 3600 for t, _ in points]
+        ys = [rss for _, rss in points]
+        mean_x = sum(xs) / len(xs)
+        mean_y = sum(ys) / len(ys)
+        spread = sum((x - mean_x) ** 2 for x in xs)
+        if not spread:
+            return None
+        return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread
+
+    def snapshot(self):
+        """Everything the report shows, as plain data"""
+        # Reports can be asked for at any moment; recording them would skew the interval-based trend
+        current = self.read()
+        with self.lock:
+            first = self.first_sample or current
+            sites = list(self.sites)
+            sites_at = self.sites_measured_at
+        return {
+            'mode': self.mode,
+            'uptime': time.time() - self.started_at,
+            'current': current,
+            'first': first,
+            'rss_trend_per_hour': self.rss_trend(),
+            'thread_names': thread_summary(),
+            'gc_objects': len(gc.get_objects()),
+            'growth_sites': sites,
+            'growth_sites_measured_at': sites_at,
+        }
+
+    def report(self):
+        data = self.snapshot()
+        current, first = data['current'], data['first']
+        lines = [
+            f"Memory: {format_bytes(current['rss'])} RSS "
+            f"({format_bytes(current['rss'] - first['rss'])} since start, up {data['uptime'] / 3600:.1f} h)"
+        ]
+        if data['rss_trend_per_hour'] is not None:
+            lines.append(f"Trend: {format_bytes(data['rss_trend_per_hour'])} per hour")
+        threads = ", ".join(f"{name} x{n}" for name, n in data['thread_names'].items())
+        lines.append(f"Threads: {current['threads']} ({threads})")
+        for name in self.counters:
+            if current.get(name) is not None:
+                lines.append(f"{name.replace('_', ' ').capitalize()}: {current[name]} (was {first.get(name)})")
+        lines.append(f"GC-tracked objects: {data['gc_objects']:,}")
+        if data['growth_sites']:
+            lines.append("Top allocation growth:")
+            for site in data['growth_sites'][:5]:
+                lines.append(f"  +{format_bytes(site['size_diff'])} in {site['count_diff']:+} blocks at {site['site']}")
+        elif self.mode == "sampling":
+            lines.append("Allocation sites: no tracing window has completed yet")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        data = self.snapshot()
+        with self.lock:
+            data['samples'] = list(self.samples)
+        with open(path + ".tmp", 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(path + ".tmp", path)
+        return path
@@ -0,0 +1,117 @@
+import json
+import sqlite3
+import threading
+
+# Marker for "row looked up and not found" so misses are cached too
+_MISSING = object()
+
+
+class PersonalMemoryStore:
+    """SQLite-backed personal memory, one row per (user, category, field)"""
+
+    CREATE_TABLE_SQL = (
+        "CREATE TABLE IF NOT EXISTS personal_details ("
+        "user_id TEXT NOT NULL, "
+        "category TEXT NOT NULL, "
+        "field TEXT NOT NULL, "
+        "value TEXT, "
+        "updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+        "PRIMARY KEY (user_id, category, field)"
+        ") WITHOUT ROWID"
+    )
+    # The statements below are kept as fixed strings so sqlite3's per-connection
+    # statement cache prepares each of them only once
+    UPSERT_SQL = (
+        "INSERT INTO personal_details (user_id, category, field, value) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(user_id, category, field) DO UPDATE SET "
+        "value = excluded.value, updated_at = CURRENT_TIMESTAMP"
+    )
+    INSERT_DEFAULT_SQL = (
+        "INSERT OR IGNORE INTO personal_details (user_id, category, field, value) VALUES (?, ?, ?, ?)"
+    )
+    SELECT_FIELD_SQL = (
+        "SELECT value FROM personal_details WHERE user_id = ? AND category = ? AND field = ?"
+    )
+    SELECT_USER_SQL = (
+        "SELECT category, field, value FROM personal_details WHERE user_id = ?"
+    )
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.cache = {}
+        self.loaded_users = set()
+
+        # Handlers run on worker threads, so share one connection behind a lock
+        self.conn = sqlite3.connect(path, check_same_thread=False, cached_statements=32)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(self.CREATE_TABLE_SQL)
+        self.conn.commit()
+
+    def get(self, user_id, category, field, default=None):
+        """Read a single field, served from the in-process cache when possible"""
+        key = (user_id, category, field)
+        with self.lock:
+            if key in self.cache:
+                value = self.cache[key]
+            else:
+                if user_id in self.loaded_users:
+                    value = _MISSING
+                else:
+                    row = self.conn.execute(self.SELECT_FIELD_SQL, key).fetchone()
+                    value = json.loads(row[0]) if row else _MISSING
+                self.cache[key] = value
+        return default if value is _MISSING else value
+
+    def has_field(self, user_id, category, field):
+        """Check whether a field exists for a user"""
+        return self.get(user_id, category, field, _MISSING) is not _MISSING
+
+    def set(self, user_id, category, field, value):
+        """Upsert a single field without touching the rest of the profile"""
+        with self.lock:
+            with self.conn:
+                self.conn.execute(self.UPSERT_SQL, (user_id, category, field, json.dumps(value)))
+            self.cache[(user_id, category, field)] = value
+
+    def set_many(self, user_id, details, overwrite=True):
+        """Write a nested {category: {field: value}} dict in one transaction"""
+        rows = [
+            (user_id, category, field, json.dumps(value))
+            for category, fields in details.items()
+            for field, value in fields.items()
+        ]
+        sql = self.UPSERT_SQL if overwrite else self.INSERT_DEFAULT_SQL
+        with self.lock:
+            with self.conn:
+                self.conn.executemany(sql, rows)
+            # Drop cached entries for this user so the next read sees the stored rows
+            self.cache = {k: v for k, v in self.cache.items() if k[0] != user_id}
+            self.loaded_users.discard(user_id)
+
+    def load_user(self, user_id):
+        """Return a user's full profile as a nested dict and warm the cache"""
+        details = {}
+        with self.lock:
+            for category, field, value in self.conn.execute(self.SELECT_USER_SQL, (user_id,)):
+                value = json.loads(value)
+                details.setdefault(category, {})[field] = value
+                self.cache[(user_id, category, field)] = value
+            self.loaded_users.add(user_id)
+        return details
+
+    def migrate_from_config(self, user_id, config):
+        """Move a legacy 'personal_details' block out of the JSON config
+
+        Returns True when the config was changed and needs saving.
+        """
+        legacy = config.pop('personal_details', None)
+        if not legacy:
+            return legacy is not None
+        self.set_many(user_id, legacy)
+        return True
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
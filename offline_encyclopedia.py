@@ -0,0 +1,264 @@
+"""Offline "what is / who is" answers from a memory-mapped abstracts index
+
+Index layout (little endian):
+
+    header   magic b"NXENC002", entry count (u64), offset width (u64: 4 or 8),
+             offsets table position (u64), records position (u64)
+    offsets  entry count offsets into the records region, sorted by key
+    records  key length (u16), key bytes, title length (u16), title bytes,
+             abstract length (u32), abstract bytes
+
+Keys are normalised titles encoded as UTF-8 and sorted bytewise, so lookups
+are a binary search over the offsets table directly on the mapped file.
+Normalising drops punctuation, so distinct titles can share a key ("C" and
+"C++"); every one of them is kept, in a run of equal keys, along with its
+title folded only for case and accents. A lookup prefers the entry whose
+title matches the query that way and otherwise takes the first of the run.
+
+Build from a Wikipedia abstracts dump (XML, optionally .gz), a TSV file of
+title<TAB>abstract lines, or JSONL with "title" and "abstract" fields:
+
+    python offline_encyclopedia.py build enwiki-latest-abstract.xml.gz encyclopedia.idx
+    python offline_encyclopedia.py lookup encyclopedia.idx "Alan Turing"
+    python offline_encyclopedia.py bench encyclopedia.idx
+"""
+import gzip
+import json
+import mmap
+import os
+import random
+import re
+import struct
+import sys
+import tempfile
+import time
+import unicodedata
+
+MAGIC = b"NXENC002"
+HEADER = struct.Struct("<8sQQQQ")
+KEY_LEN = struct.Struct("<H")
+VALUE_LEN = struct.Struct("<I")
+MAX_KEY_BYTES = 0xFFFF
+
+
+def normalize_title(title):
+    """Case-, accent- and punctuation-insensitive key for a title or query"""
+    title = unicodedata.normalize('NFKD', title)
+    title = ''.join(c for c in title if not unicodedata.combining(c))
+    title = re.sub(r"[\W_]+", " ", title.lower())
+    title = re.sub(r"^(the|a|an) ", "", title.strip())
+    return title.strip()
+
+
+def exact_title(title):
+    """Case- and accent-insensitive form of a title that keeps its punctuation, for breaking key ties"""
+    title = unicodedata.normalize('NFKD', title)
+    title = ''.join(c for c in title if not unicodedata.combining(c))
+    title = " ".join(title.lower().split()).strip("?!\"' ")
+    return re.sub(r"^(the|a|an) ", "", title)
+
+
+def open_dump(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def read_dump(path):
+    """Yield (title, abstract) pairs from an XML, TSV or JSONL abstracts dump"""
+    if path.endswith(('.xml', '.xml.gz')):
+        import xml.etree.ElementTree as ET
+        with open_dump(path) as f:
+            title = None
+            for event, elem in ET.iterparse(f, events=('end',)):
+                if elem.tag == 'title':
+                    title = (elem.text or '').replace('Wikipedia: ', '', 1)
+                elif elem.tag == 'abstract':
+                    abstract = (elem.text or '').strip()
+                    if title and abstract:
+                        yield title, abstract
+                elif elem.tag == 'doc':
+                    title = None
+                    # Keep memory flat on multi-gigabyte dumps
+                    elem.clear()
+    elif path.endswith(('.jsonl', '.jsonl.gz')):
+        with open_dump(path) as f:
+            for line in f:
+                if line.strip():
+                    data = json.loads(line)
+                    yield data['title'], data['abstract']
+    else:
+        with open_dump(path) as f:
+            for line in f:
+                title, sep, abstract = line.rstrip('\n').partition('\t')
+                if sep and abstract:
+                    yield title, abstract
+
+
+def build_index(entries, output_path):
+    """Write a sorted index from (title, abstract) pairs; returns the entry count
+
+    Abstracts are spooled to a temporary file so only the keys are held in
+    memory while sorting.
+    """
+    keys = []
+    with tempfile.TemporaryFile() as spool:
+        for title, abstract in entries:
+            key = normalize_title(title).encode('utf-8')
+            exact = exact_title(title).encode('utf-8')
+            if not key or len(key) > MAX_KEY_BYTES or len(exact) > MAX_KEY_BYTES:
+                continue
+            value = abstract.encode('utf-8')
+            keys.append((key, exact, spool.tell(), len(value)))
+            spool.write(value)
+
+        # Stable, so titles sharing a key stay in the order they were seen
+        keys.sort(key=lambda item: item[0])
+
+        # Drop repeated titles, keeping the first abstract seen for each; distinct titles with one key all stay
+        unique = []
+        seen = set()
+        for item in keys:
+            if unique and unique[-1][0] != item[0]:
+                seen.clear()
+            if item[1] not in seen:
+                seen.add(item[1])
+                unique.append(item)
+        keys = unique
+
+        records_size = sum(2 * KEY_LEN.size + len(k) + len(e) + VALUE_LEN.size + n for k, e, _, n in keys)
+        width = 4 if records_size < 2 ** 32 else 8
+        offsets_pos = HEADER.size
+        records_pos = offsets_pos + width * len(keys)
+
+        tmp_path = output_path + ".tmp"
+        with open(tmp_path, 'wb') as out:
+            out.write(HEADER.pack(MAGIC, len(keys), width, offsets_pos, records_pos))
+            offset_format = struct.Struct("<I" if width == 4 else "<Q")
+            position = 0
+            for key, exact, _, length in keys:
+                out.write(offset_format.pack(position))
+                position += 2 * KEY_LEN.size + len(key) + len(exact) + VALUE_LEN.size + length
+            for key, exact, spool_pos, length in keys:
+                spool.seek(spool_pos)
+                out.write(KEY_LEN.pack(len(key)))
+                out.write(key)
+                out.write(KEY_LEN.pack(len(exact)))
+                out.write(exact)
+                out.write(VALUE_LEN.pack(length))
+                out.write(spool.read(length))
+        os.replace(tmp_path, output_path)
+    return len(keys)
+
+
+class OfflineEncyclopedia:
+    """Read-only, memory-mapped title -> abstract index"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, width, offsets_pos, self.records_pos = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            if magic[:5] == MAGIC[:5]:
+                raise ValueError(f"{path} was built by an older version; rebuild it")
+            raise ValueError(f"{path} is not an encyclopedia index")
+        self.view = memoryview(self.map)
+        # The offsets table is used in place; nothing is copied onto the heap
+        self.offsets = self.view[offsets_pos:offsets_pos + width * self.count].cast('I' if width == 4 else 'Q')
+
+    def __len__(self):
+        return self.count
+
+    def key_at(self, i):
+        start = self.records_pos + self.offsets[i]
+        (length,) = KEY_LEN.unpack_from(self.map, start)
+        return self.map[start + KEY_LEN.size:start + KEY_LEN.size + length], start + KEY_LEN.size + length
+
+    def title_at(self, title_pos):
+        """(folded title, position of the abstract length) for a record's title field"""
+        (length,) = KEY_LEN.unpack_from(self.map, title_pos)
+        start = title_pos + KEY_LEN.size
+        return self.map[start:start + length], start + length
+
+    def find(self, key, exact=None):
+        """Binary search for an encoded key; returns a memoryview of the abstract or None
+
+        When several titles share the key, the one whose folded title equals
+        `exact` wins, otherwise the first.
+        """
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key_at(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        chosen = None
+        i = lo
+        while i < self.count:
+            found_key, title_pos = self.key_at(i)
+            if found_key != key:
+                break
+            title, value_pos = self.title_at(title_pos)
+            if chosen is None or title == exact:
+                chosen = value_pos
+                if title == exact:
+                    break
+            i += 1
+        if chosen is None:
+            return None
+        (length,) = VALUE_LEN.unpack_from(self.map, chosen)
+        start = chosen + VALUE_LEN.size
+        return self.view[start:start + length]
+
+    def lookup(self, title):
+        """Return the abstract for a title, or None"""
+        key = normalize_title(title).encode('utf-8')
+        if not key:
+            return None
+        value = self.find(key, exact_title(title).encode('utf-8'))
+        return None if value is None else str(value, 'utf-8')
+
+    def close(self):
+        self.offsets.release()
+        self.view.release()
+        self.map.close()
+        self.file.close()
+
+
+def benchmark(path, n_lookups=100000):
+    import resource
+
+    index = OfflineEncyclopedia(path)
+    sample = [index.key_at(random.randrange(index.count))[0].decode('utf-8') for _ in range(1000)]
+    queries = [sample[i % len(sample)] for i in range(n_lookups)]
+
+    start = time.perf_counter()
+    hits = sum(index.lookup(q) is not None for q in queries)
+    elapsed = time.perf_counter() - start
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print(f"{index.count:,} entries, {os.path.getsize(path) / 2 ** 20:.1f} MiB on disk")
+    print(f"{n_lookups:,} lookups ({hits:,} hits) in {elapsed:.2f}s: "
+          f"{elapsed / n_lookups * 1e6:.1f} us per lookup")
+    print(f"Peak RSS: {rss_kb / 1024:.1f} MiB")
+
+
+def main(argv):
+    if len(argv) == 3 and argv[0] == 'build':
+        start = time.perf_counter()
+        count = build_index(read_dump(argv[1]), argv[2])
+        print(f"Indexed {count:,} entries into {argv[2]} in {time.perf_counter() - start:.1f}s")
+    elif len(argv) == 3 and argv[0] == 'lookup':
+        print(OfflineEncyclopedia(argv[1]).lookup(argv[2]) or "Not found")
+    elif len(argv) == 2 and argv[0] == 'bench':
+        benchmark(argv[1])
+    else:
+        print(__doc__)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,287 @@
+"""Offline speech recognition with a pocketsphinx decoder that stays loaded
+
+recognize_sphinx() builds a new decoder (and reloads the acoustic model) on
+every call. OfflineRecognizer loads it once and feeds microphone audio to it
+chunk by chunk while the user is still speaking, so the transcript is ready
+as soon as they stop. The bot's command phrases are compiled into a JSGF
+grammar, which decodes much faster and more accurately than the full
+dictation language model. Utterances that do not fit the grammar are
+re-decoded with the language model.
+
+    python offline_speech.py bench recordings/
+
+The benchmark folder holds 16 kHz mono WAV files whose name (or a .txt file
+of the same name) gives the expected transcript, e.g. "open_youtube.wav".
+"""
+import audioop
+import os
+import re
+import sys
+import threading
+import time
+import wave
+
+import speech_recognition as sr
+
+SAMPLE_RATE = 16000
+COMMAND_SEARCH = "commands"
+DICTATION_SEARCH = "_default"
+
+NUMBER_WORDS = {
+    'zero': 0, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7,
+    'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12, 'thirteen': 13,
+    'fourteen': 14, 'fifteen': 15, 'sixteen': 16, 'seventeen': 17, 'eighteen': 18,
+    'nineteen': 19, 'twenty': 20, 'thirty': 30, 'forty': 40, 'fifty': 50, 'sixty': 60,
+    'seventy': 70, 'eighty': 80, 'ninety': 90,
+}
+TENS = ('twenty', 'thirty', 'forty', 'fifty', 'sixty', 'seventy', 'eighty', 'ninety')
+UNITS = ('one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine')
+
+
+def words_to_digits(text):
+    """Turn spoken numbers back into digits ("set volume to fifty five" -> "... 55")"""
+    words = text.split()
+    out = []
+    i = 0
+    while i < len(words):
+        word = words[i]
+        if word == 'hundred' and out and out[-1].isdigit():
+            out[-1] = str(int(out[-1]) * 100)
+            if i + 1 < len(words) and words[i + 1] in NUMBER_WORDS:
+                i += 1
+                tail = NUMBER_WORDS[words[i]]
+                if words[i] in TENS and i + 1 < len(words) and words[i + 1] in UNITS:
+                    i += 1
+                    tail += NUMBER_WORDS[words[i]]
+                out[-1] = str(int(out[-1]) + tail)
+        elif word in NUMBER_WORDS:
+            value = NUMBER_WORDS[word]
+            if word in TENS and i + 1 < len(words) and words[i + 1] in UNITS:
+                i += 1
+                value += NUMBER_WORDS[words[i]]
+            out.append(str(value))
+        else:
+            out.append(word)
+        i += 1
+    return " ".join(out)
+
+
+def build_grammar(phrases, lookup_word):
+    """JSGF grammar over the phrases whose words are all in the pronunciation dictionary
+
+    Digits in a phrase become a spoken <number> slot, so "set volume to 50"
+    also matches "set volume to seventy five".
+    """
+    alternatives = set()
+    for phrase in phrases:
+        words = re.findall(r"[a-z0-9']+", phrase.lower())
+        tokens = []
+        for word in words:
+            if word.isdigit():
+                tokens.append("<number>")
+            elif lookup_word(word) is not None:
+                tokens.append(word)
+            else:
+                tokens = None
+                break
+        if tokens:
+            alternatives.add(" ".join(tokens))
+    if not alternatives:
+        return None
+    units = " | ".join(UNITS)
+    teens = " | ".join(w for w in NUMBER_WORDS if w not in TENS and w not in UNITS)
+    return (
+        "#JSGF V1.0;\n"
+        "grammar commands;\n"
+        f"public <command> = {' | '.join(sorted(alternatives))};\n"
+        f"<number> = [<unit> hundred] (<tens> [<unit>] | <unit> | {teens});\n"
+        f"<tens> = {' | '.join(TENS)};\n"
+        f"<unit> = {units};\n"
+    )
+
+
+class OfflineRecognizer:
+    """One pocketsphinx decoder, loaded at startup and reused for every utterance"""
+
+    def __init__(self, phrases=None, model_dir=None, use_grammar=True):
+        from pocketsphinx import Decoder, get_model_path
+
+        model_dir = model_dir or os.path.join(get_model_path(), 'en-us')
+        start = time.perf_counter()
+        self.decoder = Decoder(
+            hmm=os.path.join(model_dir, 'en-us'),
+            lm=os.path.join(model_dir, 'en-us.lm.bin'),
+            dict=os.path.join(model_dir, 'cmudict-en-us.dict'),
+            samprate=SAMPLE_RATE,
+            loglevel="FATAL",
+        )
+        self.load_time = time.perf_counter() - start
+        # The decoder is not thread safe; one utterance at a time
+        self.lock = threading.Lock()
+        self.has_grammar = False
+        if phrases and use_grammar:
+            self.set_phrases(phrases)
+
+    def set_phrases(self, phrases):
+        grammar = build_grammar(phrases, self.decoder.lookup_word)
+        if grammar is None:
+            return
+        with self.lock:
+            self.decoder.add_jsgf_string(COMMAND_SEARCH, grammar)
+            self.has_grammar = True
+
+    def decode(self, raw, search):
+        """Decode a complete utterance of 16-bit mono PCM with one search"""
+        self.decoder.activate_search(search)
+        self.decoder.start_utt()
+        self.decoder.process_raw(raw, False, True)
+        self.decoder.end_utt()
+        hyp = self.decoder.hyp()
+        return hyp.hypstr if hyp is not None else ""
+
+    def recognize_raw(self, raw):
+        """Transcribe a whole utterance: grammar first, dictation if nothing fits"""
+        with self.lock:
+            text = self.decode(raw, COMMAND_SEARCH) if self.has_grammar else ""
+            if not text:
+                text = self.decode(raw, DICTATION_SEARCH)
+        return words_to_digits(text)
+
+    def recognize(self, audio):
+        """Drop-in for Recognizer.recognize_google() on an sr.AudioData"""
+        text = self.recognize_raw(audio.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=2))
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+    def listen(self, source, timeout=5, phrase_time_limit=10):
+        """Stream microphone audio into the decoder and return the transcript
+
+        Frames are decoded as they arrive, so the result is ready as soon as
+        the endpointer hears the user stop. Raises sr.WaitTimeoutError and
+        sr.UnknownValueError like Recognizer.listen/recognize_google.
+        """
+        from pocketsphinx import Endpointer
+
+        endpointer = Endpointer(sample_rate=SAMPLE_RATE)
+        frame_bytes = endpointer.frame_bytes
+        width, rate = source.SAMPLE_WIDTH, source.SAMPLE_RATE
+        resample_state = None
+        pending = b""
+        utterance = []
+        speech_started = None
+        started = time.monotonic()
+        with self.lock:
+            self.decoder.activate_search(COMMAND_SEARCH if self.has_grammar else DICTATION_SEARCH)
+            try:
+                while True:
+                    buffer = source.stream.read(source.CHUNK)
+                    if not buffer:
+                        break
+                    if width != 2:
+                        buffer = audioop.lin2lin(buffer, width, 2)
+                    if rate != SAMPLE_RATE:
+                        buffer, resample_state = audioop.ratecv(buffer, 2, 1, rate, SAMPLE_RATE, resample_state)
+                    pending += buffer
+                    done = False
+                    while len(pending) >= frame_bytes and not done:
+                        frame, pending = pending[:frame_bytes], pending[frame_bytes:]
+                        was_in_speech = endpointer.in_speech
+                        speech = endpointer.process(frame)
+                        if speech is None:
+                            continue
+                        if not was_in_speech:
+                            self.decoder.start_utt()
+                            speech_started = time.monotonic()
+                        self.decoder.process_raw(speech, False, False)
+                        utterance.append(speech)
+                        done = not endpointer.in_speech
+                    if done:
+                        break
+                    now = time.monotonic()
+                    if speech_started is None:
+                        if timeout and now - started > timeout:
+                            raise sr.WaitTimeoutError("listening timed out while waiting for phrase to start")
+                    elif phrase_time_limit and now - speech_started > phrase_time_limit:
+                        break
+            finally:
+                if speech_started is not None:
+                    self.decoder.end_utt()
+            hyp = self.decoder.hyp() if speech_started is not None else None
+            text = hyp.hypstr if hyp is not None else ""
+            if not text and self.has_grammar and utterance:
+                # Not a known command; run the buffered audio through dictation
+                text = self.decode(b"".join(utterance), DICTATION_SEARCH)
+        if not text:
+            raise sr.UnknownValueError()
+        return words_to_digits(text)
+
+
+def read_wav(path):
+    with wave.open(path, 'rb') as f:
+        raw = f.readframes(f.getnframes())
+        width, rate, channels = f.getsampwidth(), f.getframerate(), f.getnchannels()
+    if channels != 1:
+        raw = audioop.tomono(raw, width, 0.5, 0.5)
+    if width != 2:
+        raw = audioop.lin2lin(raw, width, 2)
+    if rate != SAMPLE_RATE:
+        raw, _ = audioop.ratecv(raw, 2, 1, rate, SAMPLE_RATE, None)
+    return raw
+
+
+def expected_text(path):
+    transcript = os.path.splitext(path)[0] + ".txt"
+    if os.path.exists(transcript):
+        with open(transcript, 'r', encoding='utf-8') as f:
+            return f.read().strip().lower()
+    name = os.path.splitext(os.path.basename(path))[0]
+    return re.sub(r"[_\-]+", " ", re.sub(r"\d+$", "", name)).strip().lower()
+
+
+def word_error_rate(reference, hypothesis):
+    ref, hyp = reference.split(), hypothesis.split()
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i]
+        for j, h in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h)))
+        previous = current
+    return previous[-1] / max(1, len(ref))
+
+
+def benchmark(folder, phrases):
+    files = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith('.wav'))
+    if not files:
+        print(f"No .wav files in {folder}")
+        return
+    recordings = [(read_wav(path), expected_text(path)) for path in files]
+    audio_seconds = sum(len(raw) / 2 / SAMPLE_RATE for raw, _ in recordings)
+
+    for label, use_grammar in (("dictation LM", False), ("command grammar", True)):
+        recognizer = OfflineRecognizer(phrases, use_grammar=use_grammar)
+        latencies = []
+        exact = 0
+        errors = 0.0
+        for raw, expected in recordings:
+            start = time.perf_counter()
+            text = recognizer.recognize_raw(raw)
+            latencies.append(time.perf_counter() - start)
+            exact += text == words_to_digits(expected)
+            errors += word_error_rate(words_to_digits(expected), text)
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        print(f"{label:<16} model load {recognizer.load_time * 1000:.0f} ms, "
+              f"p50 {p50 * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms, "
+              f"real-time factor {sum(latencies) / audio_seconds:.2f}, "
+              f"exact {exact}/{len(recordings)}, WER {errors / len(recordings):.1%}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == 'bench':
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from AI import command_phrases
+        benchmark(sys.argv[2], command_phrases())
+    else:
+        print(__doc__)
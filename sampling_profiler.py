@@ -0,0 +1,326 @@
+"""Whole-process sampling profiler that writes collapsed stacks and a flame graph
+
+A background thread wakes `rate` times a second, reads every other thread's
+current frame with sys._current_frames() and counts the stack it finds. The
+threads being profiled are never interrupted or instrumented, so the cost is
+one stack walk per thread per sample and the profiler can run for a minute
+in production without anyone noticing. Every stack is rooted at its thread's
+name (numbers stripped, so every "Thread (process_message)" worker adds up),
+which puts the Tk main loop, message workers and speech thread side by side.
+
+stop() writes two files:
+
+    profile_<time>.collapsed   one "frame;frame;frame count" line per stack,
+                               the format flamegraph.pl and speedscope read
+    profile_<time>.svg         a self-contained flame graph; open it in a browser
+
+    python sampling_profiler.py --svg profile.collapsed > profile.svg
+    python sampling_profiler.py --benchmark
+"""
+import datetime
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from xml.sax.saxutils import escape
+
+FRAME_HEIGHT = 16
+FONT_SIZE = 11
+# Average glyph width at FONT_SIZE, used to trim labels to their box
+CHAR_WIDTH = 6.5
+# Leaf frames of threads blocked waiting for work; they would top every summary
+IDLE_FRAMES = tuple(f" ({name}:" for name in ("threading.py", "queue.py", "selectors.py", "socketserver.py"))
+
+
+def thread_label(name):
+    """Thread name with instance counters removed, safe as a collapsed-stack frame"""
+    return re.sub(r"[-_]?\d+", "", name).replace(";", ":") or "thread"
+
+
+class SamplingProfiler:
+    def __init__(self, rate=100, max_duration=120.0, max_depth=64, lines=False, folder=".", on_finished=None):
+        self.interval = 1.0 / rate
+        self.rate = rate
+        # Profiling stops (and writes its files) on its own after this many seconds
+        self.max_duration = max_duration
+        self.max_depth = max_depth
+        # Label frames with the executing line instead of the function's first line
+        self.lines = lines
+        self.folder = folder
+        # Called with the result dict, on the profiler thread, when max_duration ends a profile
+        self.on_finished = on_finished
+        self.stacks = Counter()
+        self.labels = {}
+        self.thread_names = {}
+        self.samples = 0
+        self.sampling_time = 0.0
+        self.started_at = None
+        self.stopped_at = None
+        self.result = None
+        self.lock = threading.Lock()
+        self.finish_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.result is None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, name="sampling-profiler", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling and write the output files; returns the result dict (once per profile)"""
+        self.stop_event.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        return self.finish()
+
+    def run(self):
+        deadline = self.started_at + self.max_duration if self.max_duration else None
+        next_sample = time.perf_counter()
+        while not self.stop_event.is_set():
+            began = time.perf_counter()
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Error sampling stacks: {e}")
+            finished = time.perf_counter()
+            self.sampling_time += finished - began
+            if deadline is not None and finished >= deadline:
+                break
+            # Keep to the schedule, but never try to catch up on samples missed while the GIL was held
+            next_sample = max(next_sample + self.interval, finished)
+            self.stop_event.wait(next_sample - finished)
+        if not self.stop_event.is_set() and self.on_finished:
+            result = self.finish()
+            try:
+                self.on_finished(result)
+            except Exception as e:
+                print(f"Error reporting profile: {e}")
+
+    def frame_label(self, frame):
+        code = frame.f_code
+        if self.lines:
+            return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})".replace(";", ":")
+        label = self.labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+            self.labels[code] = label
+        return label
+
+    def sample(self):
+        own = threading.get_ident()
+        frames = sys._current_frames()
+        if any(ident not in self.thread_names for ident in frames):
+            self.thread_names = {t.ident: thread_label(t.name) for t in threading.enumerate()}
+        stacks = []
+        for ident, frame in frames.items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(self.frame_label(frame))
+                frame = frame.f_back
+            if frame is not None:
+                stack.append("[truncated]")
+            stack.append(self.thread_names.get(ident, "thread"))
+            stacks.append(";".join(reversed(stack)))
+        del frames
+        with self.lock:
+            self.stacks.update(stacks)
+            self.samples += 1
+
+    def finish(self):
+        with self.finish_lock:
+            if self.result is not None:
+                return self.result
+            with self.lock:
+                self.stopped_at = time.perf_counter()
+                stacks = Counter(self.stacks)
+            duration = self.stopped_at - self.started_at
+            result = {
+                'duration': duration,
+                'samples': self.samples,
+                'achieved_rate': self.samples / duration if duration else 0.0,
+                'overhead': self.sampling_time / duration if duration else 0.0,
+                'hottest': hottest_frames(stacks),
+                'collapsed': None,
+                'svg': None,
+            }
+            try:
+                os.makedirs(self.folder, exist_ok=True)
+                base = os.path.join(self.folder, f"profile_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}")
+                result['collapsed'] = write_collapsed(base + ".collapsed", stacks)
+                title = f"{result['samples']:,} samples over {duration:.1f} s at {self.rate} Hz"
+                result['svg'] = write_flame_graph(base + ".svg", stacks, title)
+            except Exception as e:
+                print(f"Error writing profile: {e}")
+            self.result = result
+            return result
+
+
+def hottest_frames(stacks, top_n=5):
+    """Leaf frames with the most samples, as (thread, frame, count); threads parked in a wait are left out"""
+    leaves = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        if not any(idle in frames[-1] for idle in IDLE_FRAMES):
+            leaves[(frames[0], frames[-1])] += count
+    return [(thread, frame, count) for (thread, frame), count in leaves.most_common(top_n)]
+
+
+def format_result(result):
+    lines = [f"Profiled {result['duration']:.1f} s: {result['samples']:,} samples "
+             f"({result['achieved_rate']:.0f}/s), sampling overhead {result['overhead'] * 100:.2f}%"]
+    total = result['samples'] or 1
+    for thread, frame, count in result['hottest']:
+        lines.append(f"  {count / total * 100:5.1f}%  {thread}: {frame}")
+    if result['svg']:
+        lines.append(f"Flame graph: {os.path.abspath(result['svg'])}")
+        lines.append(f"Collapsed stacks: {os.path.abspath(result['collapsed'])}")
+    return "\n".join(lines)
+
+
+def write_collapsed(path, stacks):
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        for stack, count in sorted(stacks.items()):
+            f.write(f"{stack} {count}\n")
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def read_collapsed(path):
+    stacks = Counter()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack and count.isdigit():
+                stacks[stack] += int(count)
+    return stacks
+
+
+def frame_color(name):
+    # Stable warm colours, so the same function looks the same in every graph
+    h = zlib.crc32(name.encode('utf-8'))
+    return f"rgb({205 + h % 50},{(h >> 8) % 180 + 50},{(h >> 16) % 55})"
+
+
+def flame_graph_svg(stacks, title="", width=1200, min_width=0.3):
+    """Flame graph of collapsed stacks as an SVG document; boxes narrower than min_width px are dropped"""
+    tree = [0, {}]
+    for stack, count in stacks.items():
+        node = tree
+        node[0] += count
+        for frame in stack.split(";"):
+            node = node[1].setdefault(frame, [0, {}])
+            node[0] += count
+    total = tree[0]
+    if not total:
+        depth = 0
+    else:
+        depth = max(stack.count(";") + 1 for stack in stacks)
+    height = (depth + 3) * FRAME_HEIGHT
+    scale = (width - 20) / total if total else 0.0
+
+    boxes = []
+    pending = [(tree[1], 10.0, 0)]
+    while pending:
+        children, x, level = pending.pop()
+        for name in sorted(children):
+            count, grandchildren = children[name]
+            box_width = count * scale
+            if box_width >= min_width:
+                y = height - (level + 2) * FRAME_HEIGHT
+                label = name if len(name) * CHAR_WIDTH < box_width - 6 else name[:max(0, int((box_width - 6) / CHAR_WIDTH) - 2)] + ".."
+                text = f'<text x="{x + 3:.1f}" y="{y + FRAME_HEIGHT - 4}">{escape(label)}</text>' if box_width > 3 * CHAR_WIDTH else ""
+                boxes.append(
+                    f'<g><title>{escape(name)} ({count:,} samples, {count / total * 100:.2f}%)</title>'
+                    f'<rect x="{x:.1f}" y="{y}" width="{box_width:.1f}" height="{FRAME_HEIGHT - 1}" '
+                    f'fill="{frame_color(name)}" rx="2"/>{text}</g>'
+                )
+                pending.append((grandchildren, x, level + 1))
+            x += box_width
+
+    return "\n".join([
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" font-family="Verdana, sans-serif" font-size="{FONT_SIZE}">',
+        f'<rect width="100%" height="100%" fill="#f8f8f8"/>',
+        f'<text x="{width / 2}" y="{FRAME_HEIGHT}" text-anchor="middle" font-size="{FONT_SIZE + 3}">'
+        f'{escape(title or "Flame graph")}</text>',
+        *boxes,
+        '</svg>',
+    ]) + "\n"
+
+
+def write_flame_graph(path, stacks, title=""):
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        f.write(flame_graph_svg(stacks, title))
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def benchmark(seconds=1.0, repeats=5):
+    import shutil
+    import statistics
+    import tempfile
+
+    def idle(stop):
+        while not stop.is_set():
+            stop.wait(0.05)
+
+    def throughput(profile_rate, folder):
+        profiler = SamplingProfiler(rate=profile_rate, folder=folder).start() if profile_rate else None
+        count = 0
+        deadline = time.perf_counter() + seconds
+        # Pure-Python work, so any time the profiler takes shows up as lost iterations
+        while time.perf_counter() < deadline:
+            sum(i * i for i in range(200))
+            count += 1
+        return count / seconds, profiler.stop() if profiler else None
+
+    folder = tempfile.mkdtemp(prefix="chatbot_profile_")
+    stop = threading.Event()
+    helpers = [threading.Thread(target=idle, args=(stop,), name=f"idle-{i}") for i in range(8)]
+    for thread in helpers:
+        thread.start()
+    rates = (0, 50, 100, 250, 1000)
+    runs = {rate: [] for rate in rates}
+    try:
+        # Interleave the settings so drift in machine load hits all of them alike
+        for _ in range(repeats):
+            for rate in rates:
+                runs[rate].append(throughput(rate, folder))
+        baseline = statistics.median(loops for loops, _ in runs[0])
+        print(f"no profiler: {baseline:,.0f} loops/s (median of {repeats}; main thread plus 8 idle threads)")
+        for rate in rates[1:]:
+            loops = statistics.median(loops for loops, _ in runs[rate])
+            results = [result for _, result in runs[rate]]
+            achieved = statistics.median(r['achieved_rate'] for r in results)
+            overhead = statistics.median(r['overhead'] for r in results)
+            cost = statistics.median(r['overhead'] * r['duration'] / max(1, r['samples']) for r in results)
+            print(f"{rate:>5} Hz: {loops:,.0f} loops/s ({(1 - loops / baseline) * 100:+.1f}% slower), "
+                  f"{achieved:.0f} samples/s at {cost * 1e6:.0f} us each, sampling overhead {overhead * 100:.2f}%, "
+                  f"svg {os.path.getsize(results[-1]['svg']) / 1024:.0f} KiB")
+    finally:
+        stop.set()
+        for thread in helpers:
+            thread.join()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark()
+    elif "--svg" in sys.argv:
+        source = sys.argv[sys.argv.index("--svg") + 1]
+        sys.stdout.write(flame_graph_svg(read_collapsed(source), os.path.basename(source)))
+    else:
+        print(__doc__)
@@ -0,0 +1,307 @@
+"""Speculative web-search prefetch while a question is still being typed
+
+With Web Search on, "what is X" / "who is X" / "search for X" messages go to
+AnswerLookup, which can take the whole latency budget. The input box reports
+every keystroke to typed(); once typing pauses for `debounce` seconds and the
+text (after spelling normalisation, as the router would see it) asks for a
+search, the lookup starts in the background. The query itself is taken as
+typed, as the router does, so a name the normaliser would "correct" is
+still looked up as written. The answer is cached under the normalised
+topic, so "what is python" and "What is Python?" share an entry.
+
+Each keystroke supersedes the pending prefetch, so only a pause starts one.
+A lookup already running cannot be interrupted (its source fetches are
+blocking HTTP calls), so a fetch whose query the user has typed past is left
+to finish and its answer stays cached in case they come back to it. At most
+`max_inflight` prefetches run at once; when all slots are busy the newest
+query waits for one, and anything typed meanwhile replaces it.
+
+When the message is sent, take() hands over a cached answer at once, or waits
+for a matching prefetch that is still running (only for the rest of it),
+or returns MISS so the caller runs the lookup as usual. The time saved on
+each hit is the fetch time the user did not have to wait for.
+
+    python search_prefetch.py --selftest
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from answer_lookup import normalize_topic
+from spell_normalizer import typed_from
+
+# Checked in this order, as the web search route does
+SEARCH_PHRASES = ("what is", "who is", "search for")
+# Returned by take() when no prefetch covers the query
+MISS = object()
+
+
+def search_start(text):
+    """Where the query starts in a message for the web search route, or -1"""
+    lowered = text.lower()
+    for phrase in SEARCH_PHRASES:
+        index = lowered.find(phrase)
+        if index >= 0:
+            return index + len(phrase)
+    return -1
+
+
+def search_query(text):
+    """The part of a message the web search route looks up, or None"""
+    start = search_start(text)
+    return text[start:].strip() if start >= 0 else None
+
+
+class SearchPrefetcher:
+    def __init__(self, fetch, normalize=None, debounce=0.5, max_inflight=2, ttl=120.0, cache_size=64,
+                 min_length=3):
+        # fetch(query) is the blocking lookup; normalize(text) finds the search phrase as the router would
+        self.fetch = fetch
+        self.normalize = normalize
+        self.debounce = debounce
+        self.max_inflight = max_inflight
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.min_length = min_length
+        # key: {'answer', 'finished', 'duration', 'used'}; used means a sent message took it
+        self.cache = OrderedDict()
+        # key: {'started', 'future', 'used'}
+        self.inflight = {}
+        # (text, perf_counter time it becomes due) for the latest keystroke
+        self.pending = None
+        self.last_text = None
+        self.started = 0
+        self.used = 0
+        self.searches = 0
+        self.hits = 0
+        self.saved = 0.0
+        self.closed = False
+        self.cond = threading.Condition()
+        self.executor = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="search-prefetch")
+        self.thread = threading.Thread(target=self.run, name="search-prefetch", daemon=True)
+        self.thread.start()
+
+    def typed(self, text):
+        """Called on every keystroke with the whole input; cheap enough for the Tk thread"""
+        with self.cond:
+            if text == self.last_text:
+                # Arrow keys, Shift and the like do not restart the pause
+                return
+            self.last_text = text
+            self.pending = (text, time.perf_counter() + self.debounce) if text.strip() else None
+            self.cond.notify_all()
+
+    def key_for(self, text):
+        normalized = self.normalize(text) if self.normalize is not None else text
+        start = search_start(normalized)
+        if start < 0:
+            return None, None
+        query = typed_from(normalized, text, start).strip()
+        key = normalize_topic(query)
+        return (key, query) if len(key) >= self.min_length else (None, None)
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.closed:
+                    if self.pending is None:
+                        self.cond.wait()
+                        continue
+                    wait = self.pending[1] - time.perf_counter()
+                    if wait > 0:
+                        self.cond.wait(wait)
+                        continue
+                    if len(self.inflight) >= self.max_inflight:
+                        self.cond.wait()
+                        continue
+                    break
+                if self.closed:
+                    return
+                text, _ = self.pending
+                self.pending = None
+            # Spelling normalisation runs here, off the Tk thread
+            key, query = self.key_for(text)
+            if key is None:
+                continue
+            with self.cond:
+                if key in self.inflight or self.fresh(key):
+                    continue
+                record = {'started': time.perf_counter(), 'future': None, 'used': False}
+                self.inflight[key] = record
+                self.started += 1
+                record['future'] = self.executor.submit(self.prefetch, key, query, record)
+
+    def prefetch(self, key, query, record):
+        try:
+            answer = self.fetch(query)
+        except Exception as e:
+            print(f"Error prefetching search: {e}")
+            answer = None
+        now = time.perf_counter()
+        with self.cond:
+            self.inflight.pop(key, None)
+            # A lookup that found nothing is not kept; it may just have been a slow network
+            if answer is not None:
+                self.cache[key] = {'answer': answer, 'finished': now, 'duration': now - record['started'],
+                                   'used': record['used']}
+                self.cache.move_to_end(key)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            self.cond.notify_all()
+        return answer
+
+    def fresh(self, key):
+        entry = self.cache.get(key)
+        return entry is not None and time.perf_counter() - entry['finished'] < self.ttl
+
+    def take(self, query, timeout=None):
+        """The prefetched answer for a query being sent, waiting for one in flight; MISS otherwise"""
+        key = normalize_topic(query)
+        with self.cond:
+            self.searches += 1
+            # The message is being sent; its own lookup replaces any prefetch still waiting for a pause
+            self.pending = None
+            self.last_text = None
+            if self.fresh(key):
+                entry = self.cache[key]
+                self.cache.move_to_end(key)
+                if not entry['used']:
+                    entry['used'] = True
+                    self.used += 1
+                self.hits += 1
+                self.saved += entry['duration']
+                return entry['answer']
+            record = self.inflight.get(key)
+            if record is not None and not record['used']:
+                record['used'] = True
+                self.used += 1
+        if record is None:
+            return MISS
+        waited_from = time.perf_counter()
+        try:
+            answer = record['future'].result(timeout)
+        except Exception:
+            return MISS
+        with self.cond:
+            self.hits += 1
+            # The user only waited from waited_from on; the fetch had been running since it started
+            self.saved += max(0.0, waited_from - record['started'])
+        return answer
+
+    def stats(self):
+        with self.cond:
+            return {'searches': self.searches, 'hits': self.hits,
+                    'hit_rate': self.hits / self.searches if self.searches else 0.0,
+                    'started': self.started, 'used': self.used, 'inflight': len(self.inflight),
+                    'saved': self.saved,
+                    'saved_per_hit': self.saved / self.hits if self.hits else 0.0}
+
+    def report(self):
+        stats = self.stats()
+        return "\n".join([
+            f"Search prefetch: {stats['hits']} of {stats['searches']} web searches answered from a prefetch "
+            f"({stats['hit_rate'] * 100:.0f}%)",
+            f"Perceived latency saved: {stats['saved_per_hit'] * 1000:.0f} ms per hit, {stats['saved']:.1f} s in total",
+            f"{stats['started']} prefetches started ({self.max_inflight} at most at once), {stats['used']} used, "
+            f"{stats['inflight']} running now",
+        ])
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.pending = None
+            self.cond.notify_all()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def selftest():
+    lock = threading.Lock()
+    calls = []
+    running = [0, 0]
+    delay = [0.3]
+
+    def slow_lookup(query):
+        # Stands in for AnswerLookup.lookup
+        with lock:
+            calls.append(query)
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+        time.sleep(delay[0])
+        with lock:
+            running[0] -= 1
+        return f"answer about {query}"
+
+    def type_out(prefetcher, text, gap=0.02):
+        for i in range(1, len(text) + 1):
+            prefetcher.typed(text[:i])
+            time.sleep(gap)
+
+    prefetcher = SearchPrefetcher(slow_lookup, debounce=0.15, max_inflight=2)
+    checks = []
+    type_out(prefetcher, "what is python")
+    time.sleep(0.05)
+    checks.append(("nothing fetched while typing", not calls))
+    time.sleep(0.5)
+    checks.append(("fetched once after the pause", calls == ["python"]))
+    started = time.perf_counter()
+    answer = prefetcher.take("Python?")
+    checks.append(("cached answer served at once", answer == "answer about python"
+                   and time.perf_counter() - started < 0.01))
+
+    type_out(prefetcher, "who is ada lovelace")
+    time.sleep(0.2)
+    started = time.perf_counter()
+    answer = prefetcher.take("ada lovelace")
+    waited = time.perf_counter() - started
+    checks.append(("in-flight prefetch awaited, not repeated",
+                   answer == "answer about ada lovelace" and calls.count("ada lovelace") == 1 and waited < 0.3))
+
+    checks.append(("non-lookup text is never fetched", prefetcher.take("the weather") is MISS))
+    prefetcher.typed("open notepad")
+    time.sleep(0.3)
+    checks.append(("only lookup patterns start a fetch", len(calls) == 2))
+
+    # Pause after each of several queries; only max_inflight may run together
+    delay[0] = 0.8
+    for topic in ("rust", "go lang", "haskell", "erlang"):
+        type_out(prefetcher, f"what is {topic}", gap=0.0)
+        time.sleep(0.17)
+    time.sleep(1.8)
+    delay[0] = 0.3
+    checks.append(("concurrent prefetches capped", running[1] <= 2))
+    checks.append(("a query typed past while slots were busy is dropped", "haskell" not in calls))
+    checks.append(("latest query fetched once a slot frees", "erlang" in calls))
+
+    prefetcher.typed("what is sca")
+    prefetcher.typed("what is scala")
+    checks.append(("send before the pause is a miss", prefetcher.take("scala") is MISS))
+    time.sleep(0.3)
+    checks.append(("sending cancels the pending prefetch", "scala" not in calls))
+
+    stats = prefetcher.stats()
+    checks.append(("hit rate and saved latency reported", stats['hits'] == 2 and stats['searches'] == 4
+                   and stats['used'] == 2 and stats['saved'] > 0.3))
+    print(prefetcher.report())
+    prefetcher.close()
+
+    # The normaliser finds the phrase; the query is looked up as typed
+    typo_fixer = SearchPrefetcher(slow_lookup, normalize=lambda text: text.replace("waht", "what").replace("gold", "good"),
+                                  debounce=0.05)
+    typo_fixer.typed("waht is gold")
+    time.sleep(0.5)
+    checks.append(("query taken as typed, phrase found after normalising", "gold" in calls and "good" not in calls))
+    typo_fixer.close()
+    failed = 0
+    for name, ok in checks:
+        failed += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    return failed
+
+
+if __name__ == "__main__":
+    if "--selftest" in sys.argv:
+        sys.exit(1 if selftest() else 0)
+    else:
+        print(__doc__)
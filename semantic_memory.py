@@ -0,0 +1,530 @@
+"""Semantic recall over past conversation turns with a quantized vector index
+
+Every exchange (the user's message and the reply) becomes one row. Text is
+embedded without a model: word, stem, word-pair and character-trigram
+features are hashed into buckets, and each bucket stands for a fixed sparse
+random vector (NNZ signed entries out of DIM), so an embedding is the
+weighted sum of a few hundred table rows. Similar wording lands close
+together under cosine similarity, and "exam" still matches "exams".
+
+Rows are L2-normalised, quantized to int8 with one float scale per row and
+appended to flat files that are memory-mapped for search, so a million turns
+take ~300 MB on disk and almost nothing on the heap:
+
+    vectors.i8       count x DIM int8
+    rows.bin         time, text offset/length, user hash and scale per row
+    texts.jsonl      the message and reply of each row
+    postings.bin     (stem key, row) pairs in the order rows were added
+    postings.sorted  the same pairs sorted by key, rebuilt as the tail grows
+    index.json       embedding parameters, checked on open
+
+The rows are partitioned into inverted lists keyed by the hashed stems
+(first STEM_LENGTH letters) of their content words, and a row sits in the
+list of every stem it has. A query scores only rows from the lists of its
+own stems: those sharing the most stems with it, newest first, up to
+MAX_CANDIDATES. Centroid (k-means) partitions suit dense
+model embeddings, but these vectors are lexical, and a query that shares a
+few words with a turn rarely lands in that turn's partition. Time windows
+holding few rows are scanned exactly instead.
+
+    python semantic_memory.py --benchmark --rows 1000000
+"""
+import datetime
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+
+import numpy as np
+
+INDEX_VERSION = 1
+DIM = 256
+NNZ = 8
+BUCKETS = 1 << 18
+STEM_LENGTH = 4
+# A time window with at most this many rows is scored in full
+EXACT_LIMIT = 32768
+# Rows scored per query, and rows taken from any one inverted list
+MAX_CANDIDATES = 20000
+MAX_POSTINGS = 200000
+# Postings added since postings.sorted was written; past this they are merged in
+SORT_TAIL = 262144
+CHUNK = 65536
+
+ROW = np.dtype([('time', '<f8'), ('text_offset', '<u8'), ('text_length', '<u4'), ('user', '<u4'), ('scale', '<f4')])
+POSTING = np.dtype([('key', '<u4'), ('row', '<u4')])
+WORD_PATTERN = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an the i im i'm me my mine we us our you your yours he she it its they them their is are was were be been "
+    "am do does did to of in on at for and or but so if then than that this these those with as by from up "
+    "just very can could would should will shall have has had not no yes ok okay please".split()
+)
+
+
+def user_key(user_id):
+    return zlib.crc32(str(user_id).encode('utf-8'))
+
+
+def content_words(text):
+    return [w for w in WORD_PATTERN.findall(text.lower()) if w not in STOPWORDS]
+
+
+def stem_keys(text):
+    """Inverted-list keys of a text: hashed stems of its content words"""
+    return {zlib.crc32(word[:STEM_LENGTH].encode('utf-8')) for word in content_words(text)}
+
+
+class HashedEmbedder:
+    """Sparse random projection of hashed word and character n-grams"""
+
+    def __init__(self, dim=DIM, nnz=NNZ, buckets=BUCKETS, seed=0):
+        self.dim = dim
+        self.buckets = buckets
+        rng = np.random.default_rng(seed)
+        self.positions = rng.integers(0, dim, size=(buckets, nnz), dtype=np.int16 if dim < 32768 else np.int32)
+        self.signs = (rng.integers(0, 2, size=(buckets, nnz), dtype=np.int8) * 2 - 1)
+
+    @staticmethod
+    def features(text, weight=1.0):
+        """(feature, weight) pairs: content words, their stems, adjacent pairs and trigrams"""
+        words = content_words(text)
+        features = []
+        for i, word in enumerate(words):
+            features.append(("w:" + word, weight))
+            # The stem matches "kayak" with "kayaks" the same way the inverted lists do
+            features.append(("s:" + word[:STEM_LENGTH], weight))
+            if i:
+                features.append((f"b:{words[i - 1]} {word}", 0.7 * weight))
+            padded = f" {word} "
+            grams = len(padded) - 2
+            # The trigrams of a word together weigh as much as the word itself
+            features.extend((f"c:{padded[j:j + 3]}", weight / grams) for j in range(grams))
+        return features
+
+    def embed_features(self, features):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if not features:
+            return vector
+        buckets = np.fromiter((zlib.crc32(f.encode('utf-8')) for f, _ in features), dtype=np.uint32,
+                              count=len(features)) % self.buckets
+        weights = np.fromiter((w for _, w in features), dtype=np.float32, count=len(features))
+        np.add.at(vector, self.positions[buckets].ravel(), (self.signs[buckets] * weights[:, None]).ravel())
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed(self, text):
+        return self.embed_features(self.features(text))
+
+    def embed_turn(self, message, reply):
+        # The reply counts for less; "Got it!" should not make every turn alike
+        return self.embed_features(self.features(message) + self.features(reply or "", 0.5))
+
+
+def quantize(vectors):
+    """int8 rows and the per-row scale that maps them back"""
+    vectors = np.atleast_2d(vectors).astype(np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+class Hit:
+    __slots__ = ('row', 'score', 'time', 'message', 'reply')
+
+    def __init__(self, row, score, time, message, reply):
+        self.row = row
+        self.score = score
+        self.time = time
+        self.message = message
+        self.reply = reply
+
+    def __repr__(self):
+        return f"Hit({self.row}, {self.score:.3f}, {self.message!r})"
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def mapped(path, dtype, count, shape=None):
+    """Read-only map of the first `count` records of a file (an empty array when there are none)"""
+    shape = shape or (count,)
+    if not count:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=shape)
+
+
+class IndexView:
+    """The first `count` rows and `pairs` postings, mapped; the sorted part comes from postings.sorted"""
+
+    def __init__(self, memory, count, pairs):
+        self.count = count
+        self.pairs = pairs
+        self.vectors = mapped(memory.path('vectors.i8'), np.int8, count, (count, memory.dim))
+        self.rows = mapped(memory.path('rows.bin'), ROW, count)
+        self.postings = mapped(memory.path('postings.bin'), POSTING, pairs)
+        self.sorted = mapped(memory.path('postings.sorted'), POSTING,
+                             min(pairs, file_size(memory.path('postings.sorted')) // POSTING.itemsize))
+        self.sorted_keys = self.sorted['key']
+        self.tail = self.postings[len(self.sorted):]
+
+    def postings_for(self, key):
+        """Rows in the inverted list of one key, oldest first"""
+        # A Python int would make numpy cast the whole key column to int64 first
+        key = np.uint32(key)
+        lo = np.searchsorted(self.sorted_keys, key, side='left')
+        hi = np.searchsorted(self.sorted_keys, key, side='right')
+        rows = np.asarray(self.sorted['row'][lo:hi])
+        if len(self.tail):
+            rows = np.concatenate([rows, self.tail['row'][self.tail['key'] == key]])
+        return rows
+
+    def candidates(self, keys, lo, hi, limit=MAX_CANDIDATES):
+        """Rows in [lo, hi) sharing the most stems with the query, newest first among equals"""
+        lists = []
+        for key in keys:
+            rows = self.postings_for(key)
+            if lo > 0 or hi < self.count:
+                rows = rows[(rows >= lo) & (rows < hi)]
+            # Lists are oldest first; a very common stem only contributes its latest rows
+            lists.append(rows[-MAX_POSTINGS:])
+        if not lists:
+            return np.zeros(0, dtype=np.int64)
+        rows, overlap = np.unique(np.concatenate(lists), return_counts=True)
+        if len(rows) > limit:
+            # Sort key: stems shared, then row number (newer rows are larger)
+            rank = overlap.astype(np.int64) * (self.count + 1) + rows
+            rows = np.sort(rows[np.argpartition(-rank, limit)[:limit]])
+        return rows.astype(np.int64)
+
+
+class SemanticMemory:
+    def __init__(self, folder, dim=DIM):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        meta = {'version': INDEX_VERSION, 'dim': dim, 'nnz': NNZ, 'buckets': BUCKETS, 'seed': 0,
+                'stem_length': STEM_LENGTH}
+        if os.path.exists(self.path('index.json')):
+            with open(self.path('index.json'), 'r') as f:
+                stored = json.load(f)
+            if stored != meta:
+                raise ValueError(f"{folder} was built with different embedding settings")
+        else:
+            with open(self.path('index.json.tmp'), 'w') as f:
+                json.dump(meta, f)
+            os.replace(self.path('index.json.tmp'), self.path('index.json'))
+        self.dim = dim
+        self.embedder = HashedEmbedder(dim, NNZ, BUCKETS, 0)
+
+        self.count, self.pairs = self.recover()
+        self.files = {name: open(self.path(name), 'ab')
+                      for name in ('vectors.i8', 'rows.bin', 'texts.jsonl', 'postings.bin')}
+        self.text_offset = file_size(self.path('texts.jsonl'))
+        self.lock = threading.Lock()
+        # Held while postings.sorted is rebuilt, so only one search does it
+        self.sort_lock = threading.Lock()
+        self.view = None
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    def __len__(self):
+        return self.count
+
+    def recover(self):
+        """Rows and postings all files agree on; a write cut short by a crash is cut off"""
+        count = min(file_size(self.path('vectors.i8')) // self.dim, file_size(self.path('rows.bin')) // ROW.itemsize)
+        pairs = file_size(self.path('postings.bin')) // POSTING.itemsize
+        text_end = 0
+        if count:
+            last = mapped(self.path('rows.bin'), ROW, count)[count - 1]
+            text_end = int(last['text_offset']) + int(last['text_length'])
+            del last
+        if pairs:
+            # Postings are written in row order, before the row itself
+            pairs = int(np.searchsorted(mapped(self.path('postings.bin'), POSTING, pairs)['row'], count, side='left'))
+        for name, length in (('vectors.i8', count * self.dim), ('rows.bin', count * ROW.itemsize),
+                             ('texts.jsonl', text_end), ('postings.bin', pairs * POSTING.itemsize)):
+            with open(self.path(name), 'ab') as f:
+                if f.tell() != length:
+                    f.truncate(length)
+        if file_size(self.path('postings.sorted')) > pairs * POSTING.itemsize:
+            os.remove(self.path('postings.sorted'))
+        return count, pairs
+
+    def add(self, user_id, message, reply, timestamp=None):
+        """Embed and store one exchange; returns its row, or None if it has no words to index"""
+        vector = self.embedder.embed_turn(message, reply)
+        if not vector.any():
+            return None
+        text = json.dumps({'user': str(user_id), 'message': message, 'reply': reply}, ensure_ascii=False)
+        return self.add_vectors(vector[None, :], [user_id], [text], [time.time() if timestamp is None else timestamp],
+                                [stem_keys(message) | stem_keys(reply or "")])
+
+    def add_vectors(self, vectors, user_ids, texts, times, keys):
+        """Append embedded rows, their stored text and their stem keys; returns the first new row"""
+        quantized, scales = quantize(vectors)
+        encoded = [(t + "\n").encode('utf-8') for t in texts]
+        with self.lock:
+            first = self.count
+            rows = np.zeros(len(encoded), dtype=ROW)
+            rows['time'] = times
+            rows['text_length'] = [len(e) for e in encoded]
+            rows['text_offset'] = self.text_offset + np.concatenate(([0], np.cumsum(rows['text_length'])[:-1]))
+            rows['user'] = [user_key(u) for u in user_ids]
+            rows['scale'] = scales
+            postings = np.array([(key, first + i) for i, row_keys in enumerate(keys) for key in sorted(row_keys)],
+                                dtype=POSTING)
+            self.files['texts.jsonl'].write(b"".join(encoded))
+            self.files['vectors.i8'].write(quantized.tobytes())
+            self.files['postings.bin'].write(postings.tobytes())
+            # rows.bin goes last: a row exists once its record is written
+            self.files['rows.bin'].write(rows.tobytes())
+            for f in self.files.values():
+                f.flush()
+            self.text_offset += int(rows['text_length'].sum())
+            self.count += len(encoded)
+            self.pairs += len(postings)
+        return first
+
+    def current_view(self):
+        with self.lock:
+            view = self.view
+            if view is None or view.count != self.count:
+                view = self.view = IndexView(self, self.count, self.pairs)
+        if len(view.tail) > SORT_TAIL and self.sort_lock.acquire(blocking=False):
+            # Searches keep scanning the tail until the merged file is in place
+            threading.Thread(target=self.merge_tail, args=(view,), name="semantic-memory-sort", daemon=True).start()
+        return view
+
+    def merge_tail(self, view):
+        """Write postings.sorted covering every posting in view; the tail is sorted and merged in"""
+        try:
+            tail = np.asarray(view.tail)
+            tail = tail[np.argsort(tail['key'], kind='stable')]
+            at = np.searchsorted(view.sorted_keys, tail['key'], side='right')
+            merged = np.insert(np.asarray(view.sorted), at, tail)
+            with open(self.path('postings.sorted.tmp'), 'wb') as f:
+                f.write(merged.tobytes())
+            with self.lock:
+                os.replace(self.path('postings.sorted.tmp'), self.path('postings.sorted'))
+                self.view = None
+        except Exception as e:
+            print(f"Error sorting semantic memory postings: {e}")
+        finally:
+            self.sort_lock.release()
+
+    def search(self, query, k=5, user_id=None, since=None, until=None):
+        """Best-matching stored turns, most similar first"""
+        q = self.embedder.embed(query)
+        if not q.any():
+            return []
+        view = self.current_view()
+        lo, hi = 0, view.count
+        if since is not None or until is not None:
+            times = view.rows['time']
+            if since is not None:
+                lo = int(np.searchsorted(times, since, side='left'))
+            if until is not None:
+                hi = int(np.searchsorted(times, until, side='left'))
+        if hi <= lo:
+            return []
+        if hi - lo <= EXACT_LIMIT:
+            rows, scores = self.score_range(view, q, lo, hi, user_id)
+        else:
+            rows, scores = self.score_rows(view, q, view.candidates(stem_keys(query), lo, hi), user_id)
+        if not len(rows):
+            return []
+        top = np.argsort(-scores)[:k] if len(scores) <= k else np.argpartition(-scores, k)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [self.hit(view, int(rows[i]), float(scores[i])) for i in top]
+
+    def score_range(self, view, q, lo, hi, user_id):
+        all_rows, all_scores = [], []
+        for start in range(lo, hi, CHUNK):
+            end = min(hi, start + CHUNK)
+            scores = (view.vectors[start:end].astype(np.float32) @ q) * view.rows['scale'][start:end]
+            rows = np.arange(start, end)
+            if user_id is not None:
+                mine = view.rows['user'][start:end] == user_key(user_id)
+                rows, scores = rows[mine], scores[mine]
+            all_rows.append(rows)
+            all_scores.append(scores)
+        return np.concatenate(all_rows), np.concatenate(all_scores)
+
+    def score_rows(self, view, q, rows, user_id):
+        if user_id is not None:
+            rows = rows[view.rows['user'][rows] == user_key(user_id)]
+        scores = (view.vectors[rows].astype(np.float32) @ q) * view.rows['scale'][rows]
+        return rows, scores
+
+    def hit(self, view, row, score):
+        record = view.rows[row]
+        with open(self.path('texts.jsonl'), 'rb') as f:
+            f.seek(int(record['text_offset']))
+            data = json.loads(f.read(int(record['text_length'])))
+        return Hit(row, score, float(record['time']), data.get('message', ""), data.get('reply', ""))
+
+    def close(self):
+        # Let a merge in progress finish writing
+        with self.sort_lock:
+            pass
+        with self.lock:
+            for f in self.files.values():
+                f.close()
+            self.view = None
+
+
+# Phrases that only say "search the memory" and carry nothing to search for
+RECALL_FILLER = re.compile(
+    r"\b(what|when|did|do|we|i|you|talk|talked|talking|discuss|discussed|say|said|tell|told|chat|chatted|"
+    r"about|regarding|concerning|remember|remind|me|us|of|the|on|earlier|before|ever)\b"
+)
+
+
+def recall_window(text, now=None):
+    """(since, until, label, rest) for a time phrase in text; since/until are timestamps or None"""
+    now = now or datetime.datetime.now()
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    week_start = midnight - datetime.timedelta(days=midnight.weekday())
+    month_start = midnight.replace(day=1)
+    previous_month = (month_start - datetime.timedelta(days=1)).replace(day=1)
+    windows = (
+        (r"\btoday\b", midnight, None, "today"),
+        (r"\byesterday\b", midnight - datetime.timedelta(days=1), midnight, "yesterday"),
+        (r"\bthis week\b", week_start, None, "this week"),
+        (r"\blast week\b", week_start - datetime.timedelta(days=7), week_start, "last week"),
+        (r"\bthis month\b", month_start, None, "this month"),
+        (r"\blast month\b", previous_month, month_start, "last month"),
+    )
+    lowered = text.lower()
+    for pattern, since, until, label in windows:
+        if re.search(pattern, lowered):
+            rest = re.sub(pattern, " ", lowered)
+            return since.timestamp(), until.timestamp() if until else None, label, rest
+    match = re.search(r"\b(?:in the )?(?:last|past) (\d+) days\b", lowered)
+    if match:
+        days = int(match.group(1))
+        return (now - datetime.timedelta(days=days)).timestamp(), None, f"the last {days} days", lowered.replace(match.group(0), " ")
+    return None, None, None, lowered
+
+
+def recall_topic(text):
+    """The words of a recall question left once the filler is removed"""
+    return " ".join(RECALL_FILLER.sub(" ", text).split())
+
+
+class SyntheticTurns:
+    """Made-up turns: four words of one topic plus three common words, for the benchmark"""
+
+    def __init__(self, embedder, rng, vocabulary=30000, topics=2000):
+        syllables = [c + v for c in "bdfgklmnprstvz" for v in "aeiou"]
+        self.words = sorted({"".join(rng.choice(syllables, rng.integers(2, 4))) for _ in range(vocabulary)})
+        self.word_keys = np.array([zlib.crc32(w[:STEM_LENGTH].encode('utf-8')) for w in self.words], dtype=np.uint32)
+        # Summing word vectors skips the word-pair features embed() adds; close enough for timing and recall
+        self.word_vectors = np.stack([embedder.embed(w) for w in self.words])
+        self.topic_words = rng.integers(0, len(self.words), size=(topics, 30))
+        self.common = rng.integers(0, len(self.words), size=300)
+        self.rng = rng
+
+    def make(self, n):
+        """(vectors, word index matrix) for n turns"""
+        rng = self.rng
+        topic = rng.integers(0, len(self.topic_words), n)
+        picks = np.concatenate([self.topic_words[topic[:, None], rng.integers(0, 30, size=(n, 4))],
+                                self.common[rng.integers(0, len(self.common), size=(n, 3))]], axis=1)
+        vectors = np.zeros((n, self.word_vectors.shape[1]), dtype=np.float32)
+        for column in range(picks.shape[1]):
+            vectors += self.word_vectors[picks[:, column]]
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors, picks
+
+
+def benchmark(n_rows=1000000, queries=200):
+    import shutil
+    import tempfile
+
+    rng = np.random.default_rng(0)
+    folder = tempfile.mkdtemp(prefix="chatbot_semantic_")
+    try:
+        memory = SemanticMemory(folder)
+        synthetic = SyntheticTurns(memory.embedder, rng)
+        start = time.perf_counter()
+        base = time.time() - 86400 * 365
+        all_picks = []
+        for first in range(0, n_rows, 100000):
+            size = min(100000, n_rows - first)
+            vectors, picks = synthetic.make(size)
+            all_picks.append(picks)
+            texts = [json.dumps({'message': " ".join(synthetic.words[i] for i in row)}) for row in picks]
+            memory.add_vectors(vectors, ["default"] * size, texts,
+                               base + (first + np.arange(size)) * (86400 * 364 / n_rows),
+                               [set(keys) for keys in synthetic.word_keys[picks].tolist()])
+        load = time.perf_counter() - start
+        picks = np.concatenate(all_picks)
+
+        turns = [("I have my physics exam on friday, wish me luck", "Good luck with the physics exam!"),
+                 ("my dentist appointment got moved to tuesday", "Noted, dentist on Tuesday."),
+                 ("remind me to water the tomato plants", "I'll remind you about the tomatoes."),
+                 ("we are planning a trip to the mountains in december", "A mountain trip sounds great!")]
+        start = time.perf_counter()
+        for message, reply in turns:
+            memory.add("default", message, reply)
+        add = (time.perf_counter() - start) / len(turns)
+        print(f"{len(memory):,} rows, {memory.pairs:,} postings, "
+              f"{sum(file_size(memory.path(n)) for n in os.listdir(folder)) / 1024 ** 2:.0f} MiB on disk; "
+              f"bulk load {load:.1f} s, add one turn {add * 1000:.2f} ms")
+
+        start = time.perf_counter()
+        memory.current_view()
+        # The first view starts a background merge of the unsorted postings; wait for it here
+        with memory.sort_lock:
+            pass
+        view = memory.current_view()
+        print(f"postings sorted in {time.perf_counter() - start:.2f} s "
+              f"(in the background, once per {SORT_TAIL:,} new postings)")
+
+        indexed_time = exact_time = 0.0
+        agreement = 0.0
+        for row in rng.choice(n_rows, queries, replace=False):
+            # Two of the turn's topic words, the way someone half-remembers a conversation
+            query = " ".join(synthetic.words[i] for i in picks[row, :2])
+            q = memory.embedder.embed(query)
+            start = time.perf_counter()
+            rows, scores = memory.score_rows(view, q, view.candidates(stem_keys(query), 0, view.count), None)
+            indexed = rows[np.argsort(-scores)[:10]].tolist()
+            indexed_time += time.perf_counter() - start
+            start = time.perf_counter()
+            rows, scores = memory.score_range(view, q, 0, view.count, None)
+            exact = rows[np.argsort(-scores)[:10]].tolist()
+            exact_time += time.perf_counter() - start
+            agreement += len(set(indexed) & set(exact)) / 10
+        print(f"inverted-list search: {indexed_time / queries * 1000:.2f} ms per query, "
+              f"recall@10 {agreement / queries:.3f} against brute force at {exact_time / queries * 1000:.0f} ms per query")
+
+        start = time.perf_counter()
+        for message, reply in turns:
+            hits = memory.search(recall_topic(message.split(",")[0]), k=3)
+            assert hits and hits[0].message == message, (message, hits)
+        since, until, label, rest = recall_window("what did we talk about regarding my exam today")
+        hits = memory.search(recall_topic(rest), since=since, until=until)
+        assert hits and "exam" in hits[0].message, hits
+        print(f"planted turns found: {(time.perf_counter() - start) / (len(turns) + 1) * 1000:.2f} ms per query, "
+              f"e.g. exam {label}: {hits[0].message!r}")
+        memory.close()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        n = int(sys.argv[sys.argv.index("--rows") + 1]) if "--rows" in sys.argv else 1000000
+        benchmark(n)
+    else:
+        print(__doc__)
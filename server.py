@@ -0,0 +1,629 @@
+"""Pre-fork HTTP server: several worker processes answering POST /message
+
+    python server.py --port 8765 --workers 4
+    python server.py --benchmark --workers 4      # throughput with 1..4 workers on loopback
+    python server.py --selftest                   # workers pick up edits to intents.json
+    kill -HUP <supervisor pid>                    # restart the workers one at a time
+
+Protocol (what load_test.py --url expects):
+
+    POST /message  {"session": "alice", "message": "hi"}  ->  {"response": "...", "worker": 2}
+    GET  /health   ->  {"worker": 2, "pid": ..., "sessions": ..., "requests": ...}
+
+Every worker binds the public port with SO_REUSEPORT, so the kernel spreads
+connections over the processes and each one runs on its own GIL. A session
+belongs to the worker picked by hashing its id, which keeps awaiting_update,
+game state and the conversation context in one process. A request the
+kernel hands to any other worker is forwarded to the owner over the owner's
+private Unix socket. The supervisor builds the read-only lookup tables once
+into a shared index (shared_index.py) that every worker maps instead of
+loading its own copy; --private-tables turns that off for comparison.
+
+The supervisor respawns workers that die. On SIGHUP it restarts them in
+turn: a replacement is started and takes over the worker's slot (its share
+of the port and its Unix socket), then the old worker stops accepting,
+finishes what it has in flight and exits. In-process session state is not
+handed over: a restart resets awaiting_update, running games and the
+conversation context, while user details in the memory store carry over.
+SIGTERM and Ctrl-C drain and stop every worker the same way.
+
+Needs os.fork (Linux or macOS).
+"""
+import argparse
+import http.client
+import http.server
+import json
+import os
+import shutil
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import zlib
+from collections import OrderedDict
+
+DEFAULT_PORT = 8765
+FORWARDED_HEADER = "X-Chatbot-Forwarded"
+# How long a forwarded request waits for a restarting owner to come back
+FORWARD_WAIT = 10.0
+
+
+def owner_of(session_id, workers):
+    return zlib.crc32(session_id.encode('utf-8')) % workers
+
+
+def socket_path(run_dir, slot):
+    return os.path.join(run_dir, f"worker-{slot}.sock")
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP client connection to a worker's private Unix socket"""
+
+    def __init__(self, unix_path, timeout=30):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = unix_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class PublicServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if hasattr(socket, 'SO_REUSEPORT'):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+class PrivateServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class MessageHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_payload(self, status, payload):
+        worker = self.server.worker
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        if worker.draining:
+            # Send keep-alive clients to a worker that is staying up
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_json(self, status, data):
+        self.send_payload(status, json.dumps(data).encode('utf-8'))
+
+    def do_GET(self):
+        if self.path == '/health':
+            self.send_json(200, self.server.worker.health())
+        else:
+            self.send_json(404, {'error': "not found"})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path != '/message':
+            self.send_json(404, {'error': "not found"})
+            return
+        worker = self.server.worker
+        with worker.in_flight():
+            try:
+                data = json.loads(body)
+                session_id = str(data.get('session', 'default'))
+                message = data['message']
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                self.send_json(400, {'error': f"Invalid request: {e}"})
+                return
+            try:
+                owner = owner_of(session_id, worker.workers)
+                if owner != worker.slot and FORWARDED_HEADER not in self.headers:
+                    self.send_payload(*worker.forward(owner, body))
+                else:
+                    self.send_json(200, {'response': worker.respond(session_id, message), 'worker': worker.slot})
+            except Exception as e:
+                self.send_json(500, {'error': str(e)})
+
+
+class PublicHandler(MessageHandler):
+    # Headers and body go out in separate writes; without this Nagle holds the body for a delayed ACK
+    disable_nagle_algorithm = True
+
+
+class InFlight:
+    def __init__(self, worker):
+        self.worker = worker
+
+    def __enter__(self):
+        with self.worker.idle:
+            self.worker.active += 1
+
+    def __exit__(self, *exc):
+        with self.worker.idle:
+            self.worker.active -= 1
+            self.worker.requests += 1
+            self.worker.idle.notify_all()
+
+
+class Worker:
+    """One forked process: its own sessions, memory store connection and listeners"""
+
+    def __init__(self, slot, workers, run_dir, address, shared_index=None, memory_db=None, max_sessions=1000,
+                 shared_socket=None, grace=10.0):
+        self.slot = slot
+        self.workers = workers
+        self.run_dir = run_dir
+        self.address = address
+        self.shared_index = shared_index
+        self.intent_classifier = None
+        self.lookups = None
+        self.memory_db = memory_db
+        self.max_sessions = max_sessions
+        self.shared_socket = shared_socket
+        self.grace = grace
+        # Session id -> (ChatbotCore, lock); one message per session at a time
+        self.sessions = OrderedDict()
+        self.sessions_lock = threading.Lock()
+        self.peers = {}
+        self.peers_lock = threading.Lock()
+        self.idle = threading.Condition()
+        self.active = 0
+        self.requests = 0
+        self.draining = False
+        self.stop_event = threading.Event()
+
+    def in_flight(self):
+        return InFlight(self)
+
+    def health(self):
+        return {'worker': self.slot, 'pid': os.getpid(), 'sessions': len(self.sessions),
+                'requests': self.requests, 'draining': self.draining}
+
+    def session(self, session_id):
+        from AI import ChatbotCore, DEFAULT_CONFIG
+
+        with self.sessions_lock:
+            entry = self.sessions.pop(session_id, None)
+            if entry is None:
+                core = ChatbotCore(config=json.loads(json.dumps(DEFAULT_CONFIG)), memory=self.memory,
+                                   intent_classifier=self.intent_classifier, user_id=session_id, headless=True,
+                                   lookups=self.lookups)
+                entry = (core, threading.Lock())
+            self.sessions[session_id] = entry
+            if len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+            return entry
+
+    def respond(self, session_id, message):
+        core, lock = self.session(session_id)
+        with lock:
+            return core.respond(message)
+
+    def forward(self, owner, body):
+        """Pass a request to the worker that owns its session; returns (status, payload)"""
+        path = socket_path(self.run_dir, owner)
+        deadline = time.monotonic() + FORWARD_WAIT
+        while True:
+            with self.peers_lock:
+                idle = self.peers.setdefault(owner, [])
+                conn = idle.pop() if idle else None
+            reused = conn is not None
+            if conn is None:
+                conn = UnixHTTPConnection(path)
+            try:
+                conn.request("POST", "/message", body=body,
+                             headers={'Content-Type': 'application/json', FORWARDED_HEADER: str(self.slot)})
+                response = conn.getresponse()
+                payload = response.read()
+            except (FileNotFoundError, ConnectionRefusedError):
+                # The owner is restarting; wait for its replacement
+                conn.close()
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"worker {owner} is unavailable")
+                time.sleep(0.05)
+                continue
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                # A pooled connection may belong to a worker that has since restarted;
+                # a fresh one that fails means the owner died mid-request, so give up
+                if reused:
+                    continue
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                with self.peers_lock:
+                    self.peers[owner].append(conn)
+            return response.status, payload
+
+    def listen(self):
+        if self.shared_socket is not None:
+            public = PublicServer(self.address, PublicHandler, bind_and_activate=False)
+            public.socket.close()
+            public.socket = self.shared_socket
+            public.server_address = self.shared_socket.getsockname()
+        else:
+            public = PublicServer(self.address, PublicHandler)
+        path = socket_path(self.run_dir, self.slot)
+        if os.path.exists(path):
+            os.unlink(path)
+        private = PrivateServer(path, MessageHandler)
+        public.worker = private.worker = self
+        return public, private
+
+    def wait_idle(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self.idle:
+            while self.active and time.monotonic() < deadline:
+                self.idle.wait(deadline - time.monotonic())
+
+    def run(self):
+        from memory_store import PersonalMemoryStore
+        from AI import MEMORY_DB, create_lookups, get_intent_catalogue, load_intent_classifier, use_shared_index
+
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop_event.set())
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        # SQLite connections must not cross a fork, so each worker opens its own
+        self.memory = PersonalMemoryStore(self.memory_db or MEMORY_DB)
+        # Attach the tables the supervisor built rather than loading a private copy
+        if self.shared_index:
+            use_shared_index(self.shared_index)
+        self.intent_classifier = load_intent_classifier()
+        # Sessions share one encyclopedia mapping and answer lookup
+        self.lookups = create_lookups()
+        # The intents.json watcher is a thread, and threads do not survive the fork; start this worker's own
+        get_intent_catalogue()
+        public, private = self.listen()
+        for server in (public, private):
+            threading.Thread(target=server.serve_forever, args=(0.1,), daemon=True).start()
+        while not self.stop_event.wait(1.0):
+            pass
+
+        # Drain: stop taking connections, keep serving forwarded requests
+        # until local ones are done, then let the rest finish
+        self.draining = True
+        public.shutdown()
+        public.server_close()
+        self.wait_idle(self.grace)
+        private.shutdown()
+        private.server_close()
+        self.wait_idle(self.grace)
+        self.memory.close()
+        if self.lookups[0] is not None:
+            self.lookups[0].close()
+
+
+class Supervisor:
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, workers=2, memory_db=None, max_sessions=1000, grace=10.0,
+                 shared_tables=True):
+        from AI import build_shared_index
+
+        self.address = (host, port)
+        self.workers = workers
+        self.memory_db = memory_db
+        self.max_sessions = max_sessions
+        self.grace = grace
+        self.run_dir = tempfile.mkdtemp(prefix="chatbot_server_")
+        # Read-only tables are built once here and mapped by every worker
+        self.shared_index = build_shared_index(os.path.join(self.run_dir, "tables.idx")) if shared_tables else None
+        self.shared_socket = None
+        if not hasattr(socket, 'SO_REUSEPORT'):
+            # Classic pre-fork: one listening socket inherited by every worker
+            self.shared_socket = socket.create_server(self.address, backlog=128)
+        self.slots = {}
+        self.started = {}
+        self.stopping = False
+        self.restart_requested = False
+
+    def spawn(self, slot):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                Worker(slot, self.workers, self.run_dir, self.address, self.shared_index, self.memory_db,
+                       self.max_sessions, self.shared_socket, self.grace).run()
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        self.slots[slot] = pid
+        self.started[slot] = time.monotonic()
+        return pid
+
+    def wait_ready(self, slot, timeout=30.0):
+        """Block until the worker in slot answers /health on its private socket"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            conn = UnixHTTPConnection(socket_path(self.run_dir, slot), timeout=2)
+            try:
+                conn.request("GET", "/health")
+                if json.loads(conn.getresponse().read()).get('pid') == self.slots.get(slot):
+                    return True
+            except (OSError, ValueError, http.client.HTTPException):
+                pass
+            finally:
+                conn.close()
+            time.sleep(0.05)
+        return False
+
+    def stop_child(self, pid):
+        """SIGTERM a worker and wait for it to drain; SIGKILL it after the grace period"""
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        deadline = time.monotonic() + self.grace * 2 + 2
+        while time.monotonic() < deadline:
+            try:
+                done, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if done:
+                return
+            time.sleep(0.05)
+        print(f"Worker pid {pid} did not drain in time; killing it")
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+    def reap(self):
+        """Respawn workers that exited without being asked to"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            for slot, owner in list(self.slots.items()):
+                if owner != pid:
+                    continue
+                del self.slots[slot]
+                if self.stopping:
+                    break
+                print(f"Worker {slot} (pid {pid}) exited with status {status}; respawning")
+                # A worker that dies straight away would otherwise be respawned in a tight loop
+                if time.monotonic() - self.started[slot] < 1.0:
+                    time.sleep(1.0)
+                self.spawn(slot)
+
+    def rolling_restart(self):
+        print("Restarting workers")
+        for slot in range(self.workers):
+            # The replacement takes over the slot's socket before the old worker
+            # stops, so the port always has a listener; its sessions start afresh
+            old = self.slots.pop(slot, None)
+            self.spawn(slot)
+            if not self.wait_ready(slot):
+                print(f"Worker {slot} did not come up")
+            if old is not None:
+                self.stop_child(old)
+        print("Restart complete")
+
+    def request_stop(self, signum, frame):
+        self.stopping = True
+
+    def request_restart(self, signum, frame):
+        self.restart_requested = True
+
+    def run(self, ready=None):
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        signal.signal(signal.SIGHUP, self.request_restart)
+        try:
+            for slot in range(self.workers):
+                self.spawn(slot)
+            for slot in range(self.workers):
+                self.wait_ready(slot)
+            host, port = self.address
+            print(f"Serving http://{host}:{port}/message with {self.workers} workers (supervisor pid {os.getpid()})")
+            sys.stdout.flush()
+            while not self.stopping:
+                time.sleep(0.2)
+                if self.restart_requested:
+                    self.restart_requested = False
+                    self.rolling_restart()
+                self.reap()
+        finally:
+            self.stopping = True
+            for slot, pid in list(self.slots.items()):
+                self.stop_child(pid)
+            self.slots.clear()
+            if self.shared_socket is not None:
+                self.shared_socket.close()
+            shutil.rmtree(self.run_dir, ignore_errors=True)
+
+
+BENCH_MESSAGES = ["hi", "what time is it", "tell me a joke", "how are you", "calculate 12 * 7",
+                  "what's the date today", "who created you", "bye"]
+
+
+def client_run(port, duration, client, connections=4):
+    """Send requests over several keep-alive connections for `duration` seconds; returns the count"""
+    counts = [0] * connections
+
+    def loop(index):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        deadline = time.monotonic() + duration
+        n = 0
+        while time.monotonic() < deadline:
+            body = json.dumps({'session': f"bench-{client}-{index}-{n % 25}",
+                               'message': BENCH_MESSAGES[n % len(BENCH_MESSAGES)]})
+            try:
+                conn.request("POST", "/message", body=body, headers={'Content-Type': 'application/json'})
+                response = conn.getresponse()
+                response.read()
+                if response.status == 200:
+                    counts[index] += 1
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            n += 1
+        conn.close()
+
+    threads = [threading.Thread(target=loop, args=(i,)) for i in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts)
+
+
+def wait_for_port(port, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/health")
+            conn.getresponse().read()
+            conn.close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def benchmark(max_workers, port, duration=5.0, clients=None):
+    import subprocess
+    from concurrent.futures import ProcessPoolExecutor
+
+    clients = clients or max(2, max_workers)
+    print(f"{os.cpu_count()} CPUs, {clients} client processes x 4 connections, {duration:.0f}s per run")
+    baseline = None
+    db_dir = tempfile.mkdtemp(prefix="chatbot_bench_")
+    try:
+        for workers in range(1, max_workers + 1):
+            server = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "--port", str(port), "--workers", str(workers),
+                 "--memory-db", os.path.join(db_dir, "memory.db")],
+                stdout=subprocess.DEVNULL)
+            try:
+                if not wait_for_port(port):
+                    print(f"server with {workers} workers did not start")
+                    continue
+                # Warm every worker's sessions before measuring
+                client_run(port, 1.0, "warmup")
+                with ProcessPoolExecutor(clients) as pool:
+                    start = time.perf_counter()
+                    total = sum(pool.map(client_run, [port] * clients, [duration] * clients, range(clients)))
+                    elapsed = time.perf_counter() - start
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.wait()
+            rate = total / elapsed
+            baseline = baseline or rate
+            print(f"{workers} worker(s): {rate:,.0f} req/s ({rate / baseline:.2f}x)")
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+
+
+def post_message(port, session, message):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        conn.request("POST", "/message", body=json.dumps({'session': session, 'message': message}),
+                     headers={'Content-Type': 'application/json'})
+        return json.loads(conn.getresponse().read())
+    finally:
+        conn.close()
+
+
+def selftest(port, workers=2):
+    """Edit a copy of intents.json under a running server and check every worker serves the new reply"""
+    import subprocess
+
+    from AI import INTENTS_FILE
+
+    folder = tempfile.mkdtemp(prefix="chatbot_selftest_")
+    intents = os.path.join(folder, "intents.json")
+    shutil.copyfile(INTENTS_FILE, intents)
+    # One session owned by each worker
+    sessions = {}
+    n = 0
+    while len(sessions) < workers:
+        sessions.setdefault(owner_of(f"selftest-{n}", workers), f"selftest-{n}")
+        n += 1
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--port", str(port), "--workers", str(workers),
+         "--memory-db", os.path.join(folder, "memory.db"), "--intents", intents],
+        stdout=subprocess.DEVNULL)
+    checks = []
+    try:
+        checks.append(("server started", wait_for_port(port)))
+        before = {slot: post_message(port, session, "good night") for slot, session in sessions.items()}
+        checks.append(("original reply served", all("Sweet dreams" in r['response'] for r in before.values())))
+        with open(intents, encoding='utf-8') as f:
+            text = f.read()
+        with open(intents + ".tmp", 'w', encoding='utf-8') as f:
+            f.write(text.replace("Good night! Sweet dreams", "Sleep well, see you tomorrow"))
+        os.replace(intents + ".tmp", intents)
+        deadline = time.monotonic() + 10.0
+        after = before
+        while time.monotonic() < deadline:
+            time.sleep(0.5)
+            after = {slot: post_message(port, session, "good night") for slot, session in sessions.items()}
+            if all("Sleep well" in r['response'] for r in after.values()):
+                break
+        for slot, reply in sorted(after.items()):
+            checks.append((f"worker {slot} serves the edited reply", reply['worker'] == slot
+                           and "Sleep well" in reply['response'], reply['response']))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+        shutil.rmtree(folder, ignore_errors=True)
+    failed = 0
+    for name, ok, *detail in checks:
+        failed += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name}" + (f" (got {detail[0]!r})" if detail and not ok else ""))
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the chatbot over HTTP from several worker processes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--memory-db", help="personal memory database shared by the workers")
+    parser.add_argument("--max-sessions", type=int, default=1000, help="sessions kept open per worker")
+    parser.add_argument("--grace", type=float, default=10.0, help="seconds a stopping worker may take to drain")
+    parser.add_argument("--private-tables", action="store_true",
+                        help="load lookup tables in every worker instead of mapping one shared index")
+    parser.add_argument("--intents", help="serve canned replies from this intents file instead of intents.json")
+    parser.add_argument("--benchmark", action="store_true", help="measure throughput with 1..--workers workers")
+    parser.add_argument("--selftest", action="store_true", help="check that workers reload an edited intents file")
+    parser.add_argument("--duration", type=float, default=5.0, help="benchmark seconds per worker count")
+    args = parser.parse_args(argv)
+
+    if not hasattr(os, 'fork'):
+        print("server.py needs os.fork; use load_test.py or AI.py --batch on this platform")
+        return 1
+    if args.selftest:
+        return 1 if selftest(args.port) else 0
+    if args.intents:
+        import AI
+
+        # Set before any worker forks, so every process watches this file
+        AI.INTENTS_FILE = os.path.abspath(args.intents)
+        AI.INTENTS_CACHE_FILE = None
+    if args.benchmark:
+        benchmark(max(1, args.workers), args.port, args.duration)
+        return 0
+    Supervisor(args.host, args.port, max(1, args.workers), args.memory_db, args.max_sessions, args.grace,
+               shared_tables=not args.private_tables).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
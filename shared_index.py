@@ -0,0 +1,254 @@
+"""Read-only lookup tables built once and mapped into every worker process
+
+A shared index is one flat file: a JSON header naming each array (dtype,
+shape, offset) followed by the raw array data. Processes open it with mmap
+and wrap numpy arrays around the mapping, so the pages are held once in the
+OS page cache however many workers read them, and attaching costs a header
+parse instead of an unpickle. Lists of strings are stored as one UTF-8 blob
+plus an offsets array and decoded only when an item is read.
+
+Names are "section/field"; section() hands back one section's arrays and
+string tables with the prefix stripped, ready for a from_tables() method.
+
+    python shared_index.py --benchmark --workers 4
+"""
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+MAGIC = b"AISHIDX1"
+ALIGNMENT = 64
+
+
+class StringTable(Sequence):
+    """Immutable list of strings over a UTF-8 blob; items are decoded on access"""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    @staticmethod
+    def pack(strings):
+        encoded = [s.encode('utf-8') for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8) if encoded else np.zeros(0, dtype=np.uint8)
+        return blob, offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("string table index out of range")
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+
+class StringMap(Mapping):
+    """Read-only {str: str} over two string tables, keys sorted; lookups bisect"""
+
+    def __init__(self, keys, values):
+        self.key_table = keys
+        self.value_table = values
+
+    @staticmethod
+    def pack(mapping):
+        keys = sorted(mapping)
+        return keys, [mapping[k] for k in keys]
+
+    def find(self, key):
+        i = bisect.bisect_left(self.key_table, key)
+        return i if i < len(self.key_table) and self.key_table[i] == key else -1
+
+    def __getitem__(self, key):
+        i = self.find(key)
+        if i < 0:
+            raise KeyError(key)
+        return self.value_table[i]
+
+    def __contains__(self, key):
+        return self.find(key) >= 0
+
+    def __iter__(self):
+        return iter(self.key_table)
+
+    def __len__(self):
+        return len(self.key_table)
+
+
+def write_index(path, arrays=None, strings=None):
+    """Write named arrays and string lists to path (atomically)"""
+    entries = {}
+    for name, array in (arrays or {}).items():
+        entries[name] = np.ascontiguousarray(array)
+    for name, values in (strings or {}).items():
+        blob, offsets = StringTable.pack(values)
+        entries[name + ".blob"] = blob
+        entries[name + ".offsets"] = offsets
+
+    layout = {}
+    offset = 0
+    for name, array in entries.items():
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += array.nbytes
+    header = json.dumps({'arrays': layout, 'strings': sorted(strings or {})}).encode('utf-8')
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    with open(path + ".tmp", 'wb') as f:
+        f.write(MAGIC + struct.pack('<Q', len(header)) + header)
+        for name, array in entries.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+class SharedIndex:
+    """A written index, mapped read-only; arrays are views into the mapping"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a shared index")
+        (header_size,) = struct.unpack_from('<Q', self.map, len(MAGIC))
+        header_start = len(MAGIC) + 8
+        header = json.loads(self.map[header_start:header_start + header_size])
+        data_start = -(-(header_start + header_size) // ALIGNMENT) * ALIGNMENT
+        self.arrays = {}
+        for name, info in header['arrays'].items():
+            dtype = np.dtype(info['dtype'])
+            count = int(np.prod(info['shape'], dtype=np.int64))
+            array = np.frombuffer(self.map, dtype=dtype, count=count, offset=data_start + info['offset'])
+            self.arrays[name] = array.reshape(info['shape'])
+        self.strings = {name: StringTable(self.arrays[name + ".blob"], self.arrays[name + ".offsets"])
+                        for name in header['strings']}
+
+    def __contains__(self, section):
+        prefix = section + "/"
+        return any(name.startswith(prefix) for name in list(self.arrays) + list(self.strings))
+
+    def section(self, section):
+        """(arrays, string tables) whose names start with "section/", prefix removed"""
+        prefix = section + "/"
+        arrays = {name[len(prefix):]: a for name, a in self.arrays.items()
+                  if name.startswith(prefix) and not name.endswith((".blob", ".offsets"))}
+        strings = {name[len(prefix):]: t for name, t in self.strings.items() if name.startswith(prefix)}
+        return arrays, strings
+
+    def nbytes(self):
+        return len(self.map)
+
+    def close(self):
+        # numpy views keep the buffer exported; the mapping goes when the last view does
+        self.arrays = {}
+        self.strings = {}
+        try:
+            self.map.close()
+        except BufferError:
+            pass
+        self.file.close()
+
+
+def add_section(arrays, strings, section, tables):
+    """Merge one object's (arrays, strings) tables into the dicts passed to write_index"""
+    section_arrays, section_strings = tables
+    arrays.update({f"{section}/{name}": a for name, a in section_arrays.items()})
+    strings.update({f"{section}/{name}": s for name, s in section_strings.items()})
+
+
+def measure_worker(index_path, messages, result_queue, release):
+    """Benchmark worker: load the tables (shared or private), use them, report memory"""
+    import psutil
+    process = psutil.Process()
+    os.chdir(os.path.dirname(index_path))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import AI
+
+    before = process.memory_full_info()
+    start = time.perf_counter()
+    if index_path.endswith(".idx"):
+        AI.use_shared_index(index_path)
+    classifier = AI.load_intent_classifier()
+    normalizer = AI.get_spell_normalizer()
+    knowledge = AI.load_knowledge_base()
+    loaded = time.perf_counter() - start
+    for message in messages:
+        classifier.classify(normalizer.normalize_text(message))
+    for topic in list(knowledge)[:200]:
+        knowledge[topic]
+    after = process.memory_full_info()
+    result_queue.put({
+        'load_ms': loaded * 1000,
+        'rss': after.rss, 'uss': after.uss, 'pss': getattr(after, 'pss', after.uss),
+        'tables_uss': after.uss - before.uss,
+    })
+    # Stay alive until every worker has reported so shared pages are counted together
+    release.get()
+
+
+def benchmark(workers=4, topics=20000):
+    import multiprocessing
+    import random
+    import shutil
+    import tempfile
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import AI
+    from spell_normalizer import add_typos
+
+    rng = random.Random(0)
+    folder = tempfile.mkdtemp(prefix="chatbot_shared_")
+    try:
+        os.chdir(folder)
+        # A knowledge base big enough to matter
+        with open(AI.KNOWLEDGE_BASE_FILE, 'w') as f:
+            json.dump({f"topic {i} {rng.random():.6f}": "answer text " * 20 for i in range(topics)}, f)
+        start = time.perf_counter()
+        index_path = AI.build_shared_index(os.path.join(folder, "tables.idx"))
+        build = time.perf_counter() - start
+        print(f"shared index: {os.path.getsize(index_path) / 1024 ** 2:.1f} MiB, built in {build * 1000:.0f} ms")
+        messages = [add_typos(p, rng) for p in AI.command_phrases()]
+
+        context = multiprocessing.get_context('spawn')
+        for label, path in (("private copies", os.path.join(folder, "private")), ("shared index", index_path)):
+            results = context.Queue()
+            release = context.Queue()
+            processes = [context.Process(target=measure_worker, args=(path, messages, results, release))
+                         for _ in range(workers)]
+            for p in processes:
+                p.start()
+            reports = [results.get() for _ in processes]
+            for _ in processes:
+                release.put(None)
+            for p in processes:
+                p.join()
+            mean = lambda key: sum(r[key] for r in reports) / len(reports)
+            mib = lambda key: mean(key) / 1024 ** 2
+            print(f"{label:<15} {workers} workers: load {mean('load_ms'):.1f} ms, "
+                  f"RSS {mib('rss'):.1f} MiB, USS {mib('uss'):.1f} MiB, PSS {mib('pss'):.1f} MiB, "
+                  f"tables USS {mib('tables_uss'):.1f} MiB per worker")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        n = int(sys.argv[sys.argv.index("--workers") + 1]) if "--workers" in sys.argv else 4
+        benchmark(n)
+    else:
+        print(__doc__)
@@ -0,0 +1,291 @@
+"""Game sound effects on a fixed pool of pygame mixer channels
+
+Each effect is decoded once into a mixer.Sound: from sounds/<name>.wav (or
+.ogg) when the file exists, otherwise synthesized from a few tones in the
+mixer's own sample format, so the app needs no audio assets. Sounds are
+built at startup (preload) or on first use.
+
+Effects play on a pool of channels reserved from the mixer, so nothing else
+that calls Sound.play() can take them. Channel.play() only hands the sound
+to the SDL mixing thread and returns, so the caller (the response thread)
+never waits on audio. When every pool channel is busy, the new effect
+replaces the lowest-priority one still playing (the oldest among equals),
+provided that one does not outrank it; otherwise the new effect is dropped.
+A win jingle is never cut short by a stray move click. Speech does not go
+through the mixer at all, and effects are played quieter while it talks.
+
+The time spent inside play() is recorded; the time from there to the
+speaker is the mixer buffer (buffer / frequency) plus the driver.
+
+    SDL_AUDIODRIVER=dummy python sound_bank.py --selftest
+    SDL_AUDIODRIVER=dummy python sound_bank.py --benchmark
+"""
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+import numpy as np
+from pygame import mixer
+
+SOUND_DIR = "sounds"
+FREQUENCY = 44100
+# 512 frames is ~12 ms at 44.1 kHz; SDL's default of 4096 would add ~90 ms before a sound is heard
+BUFFER = 512
+POOL_SIZE = 4
+# Volume factor for effects while speech is playing
+DUCK = 0.35
+
+# name: (priority, [(start Hz, end Hz, seconds), ...], waveform)
+EFFECTS = {
+    'move': (1, [(660, 880, 0.05)], 'sine'),
+    'wrong': (2, [(220, 200, 0.09), (0, 0, 0.04), (220, 180, 0.12)], 'square'),
+    'lose': (3, [(392, 392, 0.15), (330, 330, 0.15), (262, 220, 0.35)], 'sine'),
+    'win': (3, [(523, 523, 0.08), (659, 659, 0.08), (784, 784, 0.08), (1047, 1047, 0.25)], 'sine'),
+}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(pct / 100 * len(sorted_values)))]
+
+
+def synthesize(notes, waveform, frequency):
+    """Mono float samples in [-1, 1] for a list of (start Hz, end Hz, seconds) glides"""
+    parts = []
+    for start, end, seconds in notes:
+        n = int(seconds * frequency)
+        if not start:
+            parts.append(np.zeros(n))
+            continue
+        # Integrating a linear glide keeps the phase continuous
+        hz = np.linspace(start, end, n)
+        wave = np.sin(2 * math.pi * np.cumsum(hz) / frequency)
+        if waveform == 'square':
+            wave = np.sign(wave) * 0.5
+        # 5 ms attack and an exponential tail, so notes start and stop without clicks
+        envelope = np.minimum(1.0, np.arange(n) / (0.005 * frequency)) * np.exp(-3.0 * np.arange(n) / n)
+        parts.append(wave * envelope)
+    return np.concatenate(parts) * 0.6
+
+
+def to_mixer_format(samples, fmt, channels):
+    """Raw bytes for mixer.Sound(buffer=...) in the format mixer.get_init() reports"""
+    if fmt == -16:
+        data = (samples * 32767).astype(np.int16)
+    elif fmt == 16:
+        data = (samples * 32767 + 32768).astype(np.uint16)
+    elif fmt == -8:
+        data = (samples * 127).astype(np.int8)
+    elif fmt == 8:
+        data = (samples * 127 + 128).astype(np.uint8)
+    elif fmt == 32:
+        data = samples.astype(np.float32)
+    else:
+        data = (samples * 2147483647).astype(np.int32)
+    return np.repeat(data[:, None], channels, axis=1).tobytes()
+
+
+class SoundBank:
+    def __init__(self, folder=SOUND_DIR, pool_size=POOL_SIZE, buffer=BUFFER, effects=None, history=500):
+        self.folder = folder
+        self.effects = effects or EFFECTS
+        self.owns_mixer = False
+        if not mixer.get_init():
+            # Must come before init(); an already running mixer keeps its buffer
+            mixer.pre_init(FREQUENCY, -16, 2, buffer)
+            mixer.init()
+            self.owns_mixer = True
+        self.frequency, self.format, self.channels = mixer.get_init()
+        self.buffer = buffer
+        # The pool is the first pool_size channels, which reserving keeps away from Sound.play()
+        mixer.set_num_channels(max(mixer.get_num_channels(), pool_size + 4))
+        mixer.set_reserved(pool_size)
+        self.pool = [mixer.Channel(i) for i in range(pool_size)]
+        # (priority, perf_counter start, end) of what each pool channel was last given
+        self.playing = [(0, 0.0, 0.0)] * pool_size
+        self.sounds = {}
+        self.decode_times = {}
+        self.dispatch = deque(maxlen=history)
+        self.plays = 0
+        self.preempted = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def load(self, name):
+        """The decoded Sound for an effect, built on first use"""
+        sound = self.sounds.get(name)
+        if sound is not None:
+            return sound
+        started = time.perf_counter()
+        sound = None
+        for ext in ('.wav', '.ogg'):
+            path = os.path.join(self.folder, name + ext) if self.folder else None
+            if path and os.path.exists(path):
+                try:
+                    sound = mixer.Sound(path)
+                    break
+                except Exception as e:
+                    print(f"Error loading sound {path}: {e}")
+        if sound is None:
+            _, notes, waveform = self.effects[name]
+            samples = synthesize(notes, waveform, self.frequency)
+            sound = mixer.Sound(buffer=to_mixer_format(samples, self.format, self.channels))
+        self.sounds[name] = sound
+        self.decode_times[name] = time.perf_counter() - started
+        return sound
+
+    def preload(self):
+        with self.lock:
+            for name in self.effects:
+                self.load(name)
+        return self
+
+    def pick_channel(self, priority):
+        """Index of a free channel, else of the one to preempt, else None"""
+        victim = None
+        for i, channel in enumerate(self.pool):
+            if not channel.get_busy():
+                return i
+            current_priority, started, _ = self.playing[i]
+            if current_priority > priority:
+                continue
+            if victim is None or (current_priority, started) < self.playing[victim][:2]:
+                victim = i
+        return victim
+
+    def play(self, name, volume=1.0, duck=False):
+        """Start an effect without waiting for it; returns False when it was dropped"""
+        started = time.perf_counter()
+        if name not in self.effects:
+            return False
+        priority = self.effects[name][0]
+        with self.lock:
+            sound = self.load(name)
+            index = self.pick_channel(priority)
+            if index is None:
+                self.dropped += 1
+                return False
+            channel = self.pool[index]
+            if channel.get_busy():
+                self.preempted += 1
+            channel.set_volume(max(0.0, min(1.0, volume * (DUCK if duck else 1.0))))
+            channel.play(sound)
+            now = time.perf_counter()
+            self.playing[index] = (priority, now, now + sound.get_length())
+            self.plays += 1
+            self.dispatch.append(now - started)
+        return True
+
+    def stop_all(self):
+        with self.lock:
+            for channel in self.pool:
+                channel.stop()
+
+    def close(self):
+        self.stop_all()
+        if self.owns_mixer:
+            mixer.quit()
+
+    def stats(self):
+        with self.lock:
+            dispatch = sorted(self.dispatch)
+        return {'plays': self.plays, 'preempted': self.preempted, 'dropped': self.dropped,
+                'dispatch_p50': percentile(dispatch, 50), 'dispatch_p99': percentile(dispatch, 99),
+                'dispatch_max': dispatch[-1] if dispatch else 0.0,
+                'buffer_latency': self.buffer / self.frequency if self.owns_mixer else None}
+
+    def report(self):
+        stats = self.stats()
+        lines = [f"Sound effects: {stats['plays']} played, {stats['preempted']} preempted, "
+                 f"{stats['dropped']} dropped",
+                 f"play() p50 {stats['dispatch_p50'] * 1e6:.0f} µs, p99 {stats['dispatch_p99'] * 1e6:.0f} µs, "
+                 f"worst {stats['dispatch_max'] * 1e6:.0f} µs"]
+        if stats['buffer_latency'] is not None:
+            lines.append(f"Mixer buffer {self.buffer} frames: ~{stats['buffer_latency'] * 1000:.0f} ms to the speaker")
+        if self.decode_times:
+            decoded = ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in self.decode_times.items())
+            lines.append(f"Decoded once: {decoded}")
+        return "\n".join(lines)
+
+
+def wait_idle(bank, timeout):
+    deadline = time.perf_counter() + timeout
+    while any(channel.get_busy() for channel in bank.pool) and time.perf_counter() < deadline:
+        time.sleep(0.01)
+
+
+def selftest():
+    bank = SoundBank(folder=None, pool_size=2).preload()
+    checks = []
+    decoded = dict(bank.sounds)
+    checks.append(("every effect decoded", set(decoded) == set(EFFECTS)))
+    bank.play('move')
+    checks.append(("sounds decoded only once", bank.sounds['move'] is decoded['move']))
+    started = time.perf_counter()
+    bank.play('win')
+    checks.append(("play() returns without waiting for the clip",
+                   time.perf_counter() - started < bank.sounds['win'].get_length() / 10))
+    checks.append(("pool channels busy while playing", all(channel.get_busy() for channel in bank.pool)))
+    # Pool: move, win. A lose replaces the move, not the win
+    checks.append(("higher priority preempts the lowest", bank.play('lose') and bank.preempted == 1))
+    checks.append(("lower priority is dropped when the pool is full", not bank.play('move') and bank.dropped == 1))
+    bank.play('win')
+    checks.append(("equal priority replaces the oldest", bank.preempted == 2))
+    checks.append(("unknown effects are ignored", not bank.play('fanfare')))
+    wait_idle(bank, 2.0)
+    checks.append(("clips finish playing", not any(channel.get_busy() for channel in bank.pool)))
+    checks.append(("a free channel is used after playback", bank.play('move') and bank.preempted == 2))
+    other = mixer.Sound(buffer=bytes(4 * bank.frequency // 10))
+    channel = other.play()
+    checks.append(("reserved channels stay out of Sound.play()",
+                   channel is not None and all(channel != c for c in bank.pool)))
+    checks.append(("play latency recorded", bank.stats()['plays'] == 5 and bank.stats()['dispatch_p99'] > 0))
+
+    print(bank.report())
+    bank.close()
+    failed = 0
+    for name, ok in checks:
+        failed += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    return failed
+
+
+def benchmark(plays=2000):
+    started = time.perf_counter()
+    bank = SoundBank(folder=None)
+    bank.preload()
+    print(f"Mixer {bank.frequency} Hz, format {bank.format}, {bank.channels} channels, "
+          f"driver {os.environ.get('SDL_AUDIODRIVER', 'default')}; set up in "
+          f"{(time.perf_counter() - started) * 1000:.1f} ms")
+    names = list(EFFECTS)
+    for i in range(plays):
+        bank.play(names[i % len(names)], volume=0.5, duck=i % 7 == 0)
+        if i % 50 == 49:
+            time.sleep(0.01)
+    # How soon a started channel reports busy, the closest the dummy driver gets to time-to-audio
+    starts = []
+    for _ in range(50):
+        bank.stop_all()
+        started = time.perf_counter()
+        bank.play('win')
+        while not any(channel.get_busy() for channel in bank.pool):
+            pass
+        starts.append(time.perf_counter() - started)
+    starts.sort()
+    print(bank.report())
+    print(f"play() to channel busy: p50 {percentile(starts, 50) * 1e6:.0f} µs, p99 {percentile(starts, 99) * 1e6:.0f} µs")
+    bank.close()
+
+
+if __name__ == "__main__":
+    if "--selftest" in sys.argv:
+        sys.exit(1 if selftest() else 0)
+    elif "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        print(__doc__)
@@ -0,0 +1,361 @@
+"""Typo correction ahead of intent routing, using a SymSpell-style deletion index
+
+Every vocabulary word is stored under each string obtained by deleting up
+to two of its characters. A typed token is corrected by generating its own
+deletes and looking them up, which finds all vocabulary words within edit
+distance 2 without scanning the vocabulary. The number of deletes depends
+only on the token's length, so correction time does not grow with the
+vocabulary.
+
+The vocabulary only holds the words of the bot's commands, so a correctly
+spelled word that merely looks like one ("better" and "battery") would be
+pulled towards it. Words found in a general English word list are left as
+typed; the list is the CMU pronouncing dictionary that pocketsphinx ships.
+
+    python spell_normalizer.py --selftest
+    python spell_normalizer.py --benchmark
+"""
+import hashlib
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+
+WORD_PATTERN = re.compile(r"[A-Za-z']+")
+# Links are passed through as typed
+URL_PATTERN = re.compile(r"(?:https?://|www\.)\S+", re.I)
+
+# Words after these are the user's own values (names, colours, ...) and are kept as typed
+VALUE_CUES = re.compile(
+    r"\b(?:name is|call me|call you|name to|colou?r is|sport is|birthday is|born on|university is|study at)\s*$"
+)
+
+_english_words = None
+
+
+def english_words():
+    """Lower-case words of the CMU pronouncing dictionary, or an empty set without pocketsphinx"""
+    global _english_words
+    if _english_words is None:
+        words = set()
+        try:
+            from pocketsphinx import get_model_path
+
+            with open(os.path.join(get_model_path(), 'en-us', 'cmudict-en-us.dict'), encoding='utf-8',
+                      errors='replace') as f:
+                for line in f:
+                    # Alternative pronunciations are listed as "word(2)"
+                    words.add(line.split(' ', 1)[0].split('(', 1)[0])
+        except Exception as e:
+            print(f"Error loading English word list, correcting every unknown word: {e}")
+        _english_words = frozenset(words)
+    return _english_words
+
+
+def deletes(word, max_distance):
+    """All strings reachable from word by deleting up to max_distance characters"""
+    results = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        results |= frontier
+    return results
+
+
+def variant_key(text):
+    """Stable 63-bit key for a delete variant, identical in every process"""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little') >> 1
+
+
+class DeleteTable:
+    """The deletion index as sorted flat arrays, e.g. mapped from a shared index
+
+    Offers the two lookups SpellNormalizer makes on its dicts: index.get()
+    for the words under a delete variant, and frequency[word].
+    """
+
+    def __init__(self, words, counts, keys, starts, word_ids):
+        self.words = words
+        self.counts = counts
+        self.keys = keys
+        self.starts = starts
+        self.word_ids = word_ids
+        self.frequency = WordCounts(self)
+
+    @staticmethod
+    def tables(frequency, index):
+        words = sorted(frequency)
+        ids = {w: i for i, w in enumerate(words)}
+        keyed = sorted((variant_key(variant), [ids[w] for w in found]) for variant, found in index.items())
+        starts = np.zeros(len(keyed) + 1, dtype=np.int64)
+        np.cumsum([len(found) for _, found in keyed], out=starts[1:])
+        arrays = {
+            'counts': np.array([frequency[w] for w in words], dtype=np.int64),
+            'keys': np.array([key for key, _ in keyed], dtype=np.int64),
+            'starts': starts,
+            'word_ids': np.array([i for _, found in keyed for i in found], dtype=np.int32),
+        }
+        return arrays, {'words': words}
+
+    def ids(self, variant):
+        key = variant_key(variant)
+        i = int(np.searchsorted(self.keys, key))
+        if i == len(self.keys) or self.keys[i] != key:
+            return ()
+        return self.word_ids[self.starts[i]:self.starts[i + 1]]
+
+    def get(self, variant, default=()):
+        ids = self.ids(variant)
+        return [self.words[int(i)] for i in ids] if len(ids) else default
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class WordCounts:
+    def __init__(self, table):
+        self.table = table
+
+    def find(self, word):
+        for i in self.table.ids(word):
+            if self.table.words[int(i)] == word:
+                return int(i)
+        return -1
+
+    def __contains__(self, word):
+        return self.find(word) >= 0
+
+    def __getitem__(self, word):
+        i = self.find(word)
+        return int(self.table.counts[i]) if i >= 0 else 0
+
+    def __len__(self):
+        return len(self.table.words)
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance (adjacent swaps count as one); limit + 1 if larger"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = current[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class SpellNormalizer:
+    """Corrects misspelled words in a message towards the bot's vocabulary
+
+    Short words are easy to confuse, so the allowed distance depends on
+    length: none below min_length, 1 up to five letters, 2 beyond that.
+    """
+
+    def __init__(self, phrases, max_distance=2, min_length=3, cache_size=4096, value_cues=VALUE_CUES, table=None,
+                 known_words=None):
+        self.value_cues = value_cues
+        # Correctly spelled words that are not in the vocabulary; these are never corrected
+        self.known_words = english_words() if known_words is None else known_words
+        self.max_distance = max_distance
+        self.min_length = min_length
+        if table is not None:
+            self.frequency = table.frequency
+            self.index = table
+        else:
+            self.frequency = Counter(w.lower() for phrase in phrases for w in WORD_PATTERN.findall(phrase))
+            self.index = {}
+            for word in self.frequency:
+                for variant in deletes(word, max_distance):
+                    self.index.setdefault(variant, []).append(word)
+        self.correct_word = lru_cache(maxsize=cache_size)(self.lookup)
+        self.normalize = lru_cache(maxsize=cache_size)(self.normalize_text)
+
+    def to_tables(self):
+        """(arrays, strings) for shared_index.write_index"""
+        arrays, strings = DeleteTable.tables(self.frequency, self.index)
+        arrays['max_distance'] = np.array([self.max_distance])
+        return arrays, strings
+
+    @classmethod
+    def from_tables(cls, arrays, strings, **kwargs):
+        table = DeleteTable(strings['words'], arrays['counts'], arrays['keys'], arrays['starts'], arrays['word_ids'])
+        return cls(None, max_distance=int(arrays['max_distance'][0]), table=table, **kwargs)
+
+    def allowed_distance(self, word):
+        if len(word) < self.min_length:
+            return 0
+        return 1 if len(word) <= 5 else self.max_distance
+
+    def lookup(self, word):
+        """Closest vocabulary word (ties go to the more frequent one), or word itself"""
+        if word in self.frequency or word in self.known_words:
+            return word
+        limit = self.allowed_distance(word)
+        if not limit:
+            return word
+        best = None
+        best_key = None
+        for variant in deletes(word, limit):
+            for candidate in self.index.get(variant, ()):
+                distance = edit_distance(word, candidate, limit)
+                if distance > limit:
+                    continue
+                key = (distance, -self.frequency[candidate])
+                if best_key is None or key < best_key:
+                    best, best_key = candidate, key
+        return best or word
+
+    def normalize_text(self, text):
+        """Message with misspelled words replaced; everything else is left untouched"""
+        pieces = []
+        position = 0
+        links = [m.span() for m in URL_PATTERN.finditer(text)]
+        for match in WORD_PATTERN.finditer(text):
+            if any(start <= match.start() < end for start, end in links):
+                continue
+            word = match.group()
+            corrected = self.correct_word(word.lower())
+            pieces.append(text[position:match.start()])
+            pieces.append(word if corrected == word.lower() else corrected)
+            position = match.end()
+            if self.value_cues and self.value_cues.search("".join(pieces).lower()):
+                break
+        pieces.append(text[position:])
+        return "".join(pieces)
+
+
+def typed_from(normalized, original, position):
+    """The original message from the point matching position in its normalized text
+
+    normalize_text() replaces words one for one and leaves everything between
+    them alone, so the n-th word of one is the n-th word of the other. Routing
+    reads the corrected words; names, queries and titles are taken as typed.
+    """
+    if normalized == original:
+        return original[position:]
+    fixed = [m for m in WORD_PATTERN.finditer(normalized) if m.start() < position]
+    typed = list(WORD_PATTERN.finditer(original))
+    if not fixed:
+        return original[position:]
+    if len(typed) < len(fixed):
+        return normalized[position:]
+    word, typed_word = fixed[-1], typed[len(fixed) - 1]
+    if position >= word.end():
+        return original[typed_word.end() + position - word.end():]
+    # The position falls inside a word; keep the same offset into the typed word
+    return original[min(typed_word.end(), typed_word.start() + position - word.start()):]
+
+
+def typed_after(normalized, original, keyword):
+    """What follows keyword (found in the normalized text) in the message as typed"""
+    index = normalized.lower().find(keyword)
+    if index < 0:
+        return ""
+    return typed_from(normalized, original, index + len(keyword))
+
+
+def add_typos(text, rng, rate=0.5):
+    """Misspell some words of text the way people do: drop, double, swap or replace a letter"""
+    words = text.split()
+    for i, word in enumerate(words):
+        if len(word) < 4 or not word.isalpha() or rng.random() > rate:
+            continue
+        p = rng.randrange(1, len(word) - 1)
+        kind = rng.choice(('drop', 'double', 'swap', 'replace'))
+        if kind == 'drop':
+            word = word[:p] + word[p + 1:]
+        elif kind == 'double':
+            word = word[:p] + word[p] + word[p:]
+        elif kind == 'swap':
+            word = word[:p] + word[p + 1] + word[p] + word[p + 2:]
+        else:
+            word = word[:p] + rng.choice('abcdefghijklmnopqrstuvwxyz') + word[p + 1:]
+        words[i] = word
+    return " ".join(words)
+
+
+def selftest():
+    from intent_classifier import INTENT_EXAMPLES
+
+    normalizer = SpellNormalizer([p for examples in INTENT_EXAMPLES.values() for p in examples])
+    checks = [("English word list loaded", len(normalizer.known_words) > 100000)]
+    # Correctly spelled sentences that are not commands must reach the router unchanged
+    for text in ("which one is better", "my sister is here", "the movie was great", "my exam went okay",
+                 "who is bob marley", "i am sad today", "what is a bat", "tell me about gold"):
+        corrected = normalizer.normalize_text(text)
+        checks.append((f"\"{text}\" left alone", corrected == text, corrected))
+    for typo, expected in (("waht time is it", "what time is it"), ("opne youtube", "open youtube"),
+                           ("tell me a jok", "tell me a joke"), ("what is teh date", "what is the date")):
+        corrected = normalizer.normalize_text(typo)
+        checks.append((f"\"{typo}\" corrected", corrected == expected, corrected))
+    failed = 0
+    for name, ok, *detail in checks:
+        failed += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name}" + (f" (got \"{detail[0]}\")" if detail and not ok else ""))
+    return failed
+
+
+def benchmark(copies=20):
+    from intent_classifier import INTENT_EXAMPLES, IntentClassifier
+
+    rng = random.Random(0)
+    phrases = [p for examples in INTENT_EXAMPLES.values() for p in examples]
+    classifier = IntentClassifier()
+    classifier.fit_examples(INTENT_EXAMPLES)
+
+    start = time.perf_counter()
+    normalizer = SpellNormalizer(phrases)
+    build = time.perf_counter() - start
+
+    corpus = [(add_typos(text, rng), label)
+              for label, examples in INTENT_EXAMPLES.items() for text in examples for _ in range(copies)]
+    noisy = [text for text, _ in corpus]
+    labels = [label for _, label in corpus]
+
+    start = time.perf_counter()
+    corrected = [normalizer.normalize_text(text) for text in noisy]
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    for text in noisy:
+        normalizer.normalize(text)
+    for text in noisy:
+        normalizer.normalize(text)
+    warm = (time.perf_counter() - start) / 2
+    words = sum(len(text.split()) for text in noisy)
+
+    def accuracy(texts, threshold=0.9):
+        predicted, confidences = classifier.classify_batch(texts)
+        correct = [p == l for p, l in zip(predicted, labels)]
+        confident = [c and confidence >= threshold for c, confidence in zip(correct, confidences)]
+        return f"{sum(correct) / len(labels):.1%} top-1, {sum(confident) / len(labels):.1%} above {threshold}"
+
+    print(f"vocabulary {len(normalizer.frequency)} words, {len(normalizer.index):,} index keys, built in {build * 1000:.0f} ms")
+    print(f"{len(noisy):,} noisy messages: {words / cold:,.0f} words/s uncached, "
+          f"{len(noisy) / warm:,.0f} messages/s with the LRU cache")
+    print(f"intent hits, noisy:     {accuracy(noisy)}")
+    print(f"intent hits, corrected: {accuracy(corrected)}")
+
+
+if __name__ == "__main__":
+    if "--selftest" in sys.argv:
+        sys.exit(1 if selftest() else 0)
+    elif "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        print(__doc__)
@@ -0,0 +1,267 @@
+"""Main-loop responsiveness watchdog: heartbeat lag percentiles and stall stacks
+
+A heartbeat callback is scheduled on the GUI loop (root.after) every
+`interval` seconds. Each beat records how late it ran, which is exactly how
+long the loop was busy with something else, and those lags feed the
+percentiles shown in the info bar. A monitor thread watches the heartbeat
+from outside: once the next beat is overdue by more than `threshold`, the
+loop is stalled, and the monitor records the stack of every thread while the
+stall is still happening, so the frame holding up the loop is in the record.
+A long stall is captured again each time its lag doubles (up to
+`captures_per_stall` times), and every capture is appended to a plain-text
+log with timestamps.
+
+The watchdog only needs a schedule(delay_ms, callback) function, so it can be
+tried without a display:
+
+    python stall_watchdog.py --selftest
+"""
+import datetime
+import heapq
+import itertools
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(pct / 100 * len(sorted_values)))]
+
+
+def thread_stacks():
+    """{thread name: formatted stack lines} for every thread but the caller"""
+    names = {t.ident: t.name for t in threading.enumerate()}
+    own = threading.get_ident()
+    stacks = {}
+    for ident, frame in sys._current_frames().items():
+        if ident == own:
+            continue
+        name = names.get(ident, f"thread {ident}")
+        stacks[name] = [line.rstrip("\n") for line in traceback.format_stack(frame)]
+    return stacks
+
+
+def format_time(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+class StallWatchdog:
+    def __init__(self, schedule, interval=0.1, threshold=0.25, history=3000, max_stalls=50,
+                 captures_per_stall=4, log_path=None):
+        # schedule(delay_ms, callback) must run callback on the loop being watched
+        self.schedule = schedule
+        self.interval = interval
+        self.threshold = threshold
+        self.captures_per_stall = captures_per_stall
+        self.log_path = log_path
+        # Lag of every recent beat, in seconds; at 10 beats a second 3000 is five minutes
+        self.lags = deque(maxlen=history)
+        self.stalls = deque(maxlen=max_stalls)
+        self.stall_count = 0
+        self.worst = 0.0
+        self.beats = 0
+        # perf_counter time the next beat is due; None until the first beat has run
+        self.expected = None
+        self.current_stall = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        # The monitor stays disarmed until the first beat, so startup work before the loop runs is not a stall
+        self.schedule(0, self.beat)
+        self.thread = threading.Thread(target=self.monitor, name="stall-watchdog", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(1.0)
+
+    def beat(self):
+        """Runs on the watched loop"""
+        now = time.perf_counter()
+        if self.stop_event.is_set():
+            return
+        with self.lock:
+            if self.expected is not None:
+                lag = max(0.0, now - self.expected)
+                self.lags.append(lag)
+                self.worst = max(self.worst, lag)
+            self.beats += 1
+            self.expected = now + self.interval
+            stall, self.current_stall = self.current_stall, None
+        if stall is not None:
+            self.end_stall(stall, now)
+        self.schedule(int(self.interval * 1000), self.beat)
+
+    def monitor(self):
+        poll = max(0.01, min(self.interval, self.threshold) / 4)
+        while not self.stop_event.wait(poll):
+            now = time.perf_counter()
+            with self.lock:
+                expected = self.expected
+                stall = self.current_stall
+            if expected is None:
+                continue
+            lag = now - expected
+            if lag < self.threshold:
+                continue
+            if stall is None:
+                stall = {'started': time.time() - lag, 'started_perf': expected, 'duration': None, 'captures': []}
+                with self.lock:
+                    # The beat may have arrived while this thread was looking
+                    if self.expected != expected:
+                        continue
+                    self.current_stall = stall
+                    self.stall_count += 1
+                    self.stalls.append(stall)
+            captures = stall['captures']
+            # Capture at the threshold and again each time the lag doubles
+            if len(captures) < self.captures_per_stall and lag >= self.threshold * 2 ** len(captures):
+                self.capture(stall, lag)
+
+    def capture(self, stall, lag):
+        try:
+            record = {'time': time.time(), 'lag': lag, 'threads': thread_stacks()}
+        except Exception as e:
+            print(f"Error capturing stall stacks: {e}")
+            return
+        stall['captures'].append(record)
+        self.log(f"=== Main loop stalled: {lag * 1000:.0f} ms late at {format_time(record['time'])} ===",
+                 *(f"--- {name} ---\n" + "\n".join(lines) for name, lines in record['threads'].items()))
+
+    def end_stall(self, stall, now):
+        stall['duration'] = now - stall['started_perf']
+        self.log(f"=== Stall ended at {format_time(time.time())} after {stall['duration'] * 1000:.0f} ms ===")
+
+    def log(self, *blocks):
+        if not self.log_path:
+            return
+        try:
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write("\n".join(blocks) + "\n\n")
+        except OSError as e:
+            print(f"Error writing stall log: {e}")
+
+    def percentiles(self):
+        """Beat lag in seconds at p50, p95 and p99, plus the worst seen"""
+        with self.lock:
+            lags = sorted(self.lags)
+            worst = self.worst
+        return {'p50': percentile(lags, 50), 'p95': percentile(lags, 95), 'p99': percentile(lags, 99),
+                'max': worst, 'beats': len(lags)}
+
+    def summary(self):
+        """One line for the info bar"""
+        stats = self.percentiles()
+        if not stats['beats']:
+            return "UI lag: -"
+        text = f"UI lag p95 {stats['p95'] * 1000:.0f} ms"
+        if self.stall_count:
+            text += f", {self.stall_count} stall{'s' if self.stall_count != 1 else ''}"
+        return text
+
+    def culprit(self, stall):
+        """Innermost frame of the main thread in a stall's first capture"""
+        if not stall['captures']:
+            return None
+        lines = stall['captures'][0]['threads'].get("MainThread")
+        if not lines:
+            return None
+        # Each entry is '  File "...", line N, in func\n    source'
+        return " | ".join(part.strip() for part in lines[-1].strip().split("\n"))
+
+    def report(self):
+        stats = self.percentiles()
+        lines = [
+            f"UI responsiveness over the last {stats['beats']} heartbeats ({self.interval * 1000:.0f} ms apart): "
+            f"lag p50 {stats['p50'] * 1000:.0f} ms, p95 {stats['p95'] * 1000:.0f} ms, "
+            f"p99 {stats['p99'] * 1000:.0f} ms, worst {stats['max'] * 1000:.0f} ms",
+            f"Stalls over {self.threshold * 1000:.0f} ms: {self.stall_count}",
+        ]
+        with self.lock:
+            stalls = list(self.stalls)[-5:]
+        for stall in reversed(stalls):
+            duration = "ongoing" if stall['duration'] is None else f"{stall['duration'] * 1000:.0f} ms"
+            lines.append(f"  {format_time(stall['started'])}  {duration}")
+            culprit = self.culprit(stall)
+            if culprit:
+                lines.append(f"      {culprit}")
+        if self.stall_count and self.log_path:
+            lines.append(f"Stacks of every thread are in {self.log_path}")
+        return "\n".join(lines)
+
+
+class ManualLoop:
+    """A tiny after()-style event loop on the calling thread, for the self-test"""
+
+    def __init__(self):
+        self.queue = []
+        self.counter = itertools.count()
+
+    def after(self, delay_ms, callback):
+        heapq.heappush(self.queue, (time.perf_counter() + delay_ms / 1000, next(self.counter), callback))
+
+    def run_until(self, deadline):
+        while self.queue and time.perf_counter() < deadline:
+            due, _, callback = self.queue[0]
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(min(wait, deadline - time.perf_counter()))
+                continue
+            heapq.heappop(self.queue)
+            callback()
+
+
+def selftest():
+    import os
+    import tempfile
+
+    def slow_handler():
+        # Stands in for a handler that blocks the loop
+        time.sleep(0.6)
+
+    loop = ManualLoop()
+    log_path = os.path.join(tempfile.mkdtemp(prefix="chatbot_stall_"), "stalls.log")
+    watchdog = StallWatchdog(loop.after, interval=0.05, threshold=0.2, log_path=log_path)
+    # Startup work before the loop runs must not count as a stall
+    watchdog.start()
+    time.sleep(0.4)
+    loop.run_until(time.perf_counter() + 1.0)
+    loop.after(0, slow_handler)
+    loop.run_until(time.perf_counter() + 1.5)
+    watchdog.stop()
+
+    checks = []
+    checks.append(("idle startup is not a stall", watchdog.stall_count == 1))
+    stall = watchdog.stalls[0] if watchdog.stalls else None
+    checks.append(("stall captured while in progress", stall is not None and stall['captures']))
+    checks.append(("main thread caught in the slow handler",
+                   stall is not None and "slow_handler" in (watchdog.culprit(stall) or "")))
+    checks.append(("long stall captured more than once", stall is not None and len(stall['captures']) >= 2))
+    checks.append(("stall duration measured", stall is not None and 0.5 < (stall['duration'] or 0) < 0.8))
+    stats = watchdog.percentiles()
+    checks.append(("percentiles from heartbeats", stats['beats'] > 20 and stats['p50'] < 0.05 and stats['max'] > 0.5))
+    with open(log_path) as f:
+        log = f.read()
+    checks.append(("log has stacks and timestamps", "slow_handler" in log and "Stall ended" in log))
+
+    print(watchdog.report())
+    failed = 0
+    for name, ok in checks:
+        failed += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    return failed
+
+
+if __name__ == "__main__":
+    if "--selftest" in sys.argv:
+        sys.exit(1 if selftest() else 0)
+    else:
+        print(__doc__)
@@ -0,0 +1,141 @@
+import queue
+import re
+import threading
+import time
+from collections import deque
+
+# A sentence ends at ., ! or ? followed by whitespace, or at a line break
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def split_sentences(text):
+    """Split text into sentences, keeping the trailing whitespace with each one"""
+    pieces = []
+    start = 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        pieces.append(text[start:match.end()])
+        start = match.end()
+    if start < len(text):
+        pieces.append(text[start:])
+    return pieces
+
+
+class SentenceSplitter:
+    """Collect streamed chunks and hand back complete sentences as soon as they end"""
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        sentences = []
+        start = 0
+        for match in SENTENCE_BOUNDARY.finditer(self.buffer):
+            sentence = self.buffer[start:match.start()].strip()
+            if sentence:
+                sentences.append(sentence)
+            start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        sentence, self.buffer = self.buffer.strip(), ""
+        return [sentence] if sentence else []
+
+
+class StreamMetrics:
+    """Rolling latency samples (seconds) for the streaming display and speech paths"""
+
+    def __init__(self, window=500):
+        self.lock = threading.Lock()
+        self.window = window
+        self.samples = {}
+
+    def record(self, name, seconds):
+        with self.lock:
+            self.samples.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, name, pct):
+        with self.lock:
+            values = sorted(self.samples.get(name, ()))
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(pct / 100 * len(values)))]
+
+    def summary(self):
+        parts = []
+        for name, label in (('time_to_first_visible_char', 'first text'), ('time_to_first_audio', 'first audio')):
+            p50 = self.percentile(name, 50)
+            if p50 is not None:
+                parts.append(f"{label} p50 {p50 * 1000:.0f} ms, p95 {self.percentile(name, 95) * 1000:.0f} ms")
+        return "; ".join(parts)
+
+
+class SpeechWorker:
+    """One long-lived TTS thread that speaks sentences as they are queued
+
+    The pyttsx3 engine is created once on this thread and reused, so the
+    first sentence of a reply can start while later ones are still being
+    produced.
+    """
+
+    def __init__(self, engine_factory, before_utterance=None, metrics=None, tracer=None):
+        self.engine_factory = engine_factory
+        self.before_utterance = before_utterance
+        self.metrics = metrics
+        self.tracer = tracer
+        self.queue = queue.Queue()
+        self.current = None
+        # True while an utterance is playing, so other audio can stay out of its way
+        self.speaking = False
+        self.thread = threading.Thread(target=self.run, name="speech", daemon=True)
+        self.thread.start()
+
+    def say(self, sentence, started_at=None, first=False, trace_id=None):
+        """Queue a sentence; started_at/first let the worker time the reply's first audio"""
+        self.queue.put((sentence, started_at, first, trace_id, time.perf_counter()))
+
+    def interrupt(self):
+        """Drop sentences that have not started playing yet"""
+        try:
+            while True:
+                self.queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def stop(self):
+        self.interrupt()
+        self.queue.put(None)
+
+    def on_started(self, name):
+        current, self.current = self.current, None
+        if current and self.metrics:
+            self.metrics.record('time_to_first_audio', time.perf_counter() - current)
+
+    def run(self):
+        engine = None
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            sentence, started_at, first, trace_id, queued_at = item
+            if self.tracer and trace_id:
+                self.tracer.record('speech_wait', trace_id, queued_at, time.perf_counter())
+            spoken_at = time.perf_counter()
+            try:
+                if engine is None:
+                    engine = self.engine_factory()
+                    engine.connect('started-utterance', self.on_started)
+                if self.before_utterance:
+                    self.before_utterance(engine)
+                self.current = started_at if first else None
+                engine.say(sentence)
+                self.speaking = True
+                engine.runAndWait()
+            except Exception as e:
+                print(f"Speech synthesis error: {e}")
+                engine = None
+            finally:
+                self.speaking = False
+            if self.tracer and trace_id:
+                self.tracer.record('speak', trace_id, spoken_at, time.perf_counter(), {'chars': len(sentence)})
@@ -0,0 +1,253 @@
+"""Process pool for CPU-bound handler work (fuzzy matching, HTML parsing, expression evaluation)
+
+Handler threads share the GIL with the Tk main loop, so heavy work there
+serialises and makes the window stutter. TaskPool keeps a few warm worker
+processes that have already imported their dependencies and loaded the
+indexes they need. Each task sends only a task name and small arguments,
+and every call has a timeout after which the stuck worker is replaced.
+
+    python task_pool.py --benchmark
+"""
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from difflib import get_close_matches
+
+# Per-process state filled in by warm_worker()
+_preloaded = {}
+
+
+def warm_worker(settings):
+    """Load everything the tasks need once, when the worker starts"""
+    # Import parsing libraries up front so the first search task is not slow
+    try:
+        import requests  # noqa: F401
+        import bs4  # noqa: F401
+    except ImportError:
+        pass
+    _preloaded['key_sets'] = dict(settings.get('key_sets', {}))
+
+
+def task_ping():
+    return os.getpid()
+
+
+def task_fuzzy_match(message, keys, n=1, cutoff=0.6):
+    """difflib matching against a list, or the name of a key set loaded at warm-up"""
+    if isinstance(keys, str):
+        keys = _preloaded['key_sets'][keys]
+    return get_close_matches(message, keys, n=n, cutoff=cutoff)
+
+
+def task_evaluate(expr):
+    """Evaluate an already-sanitised arithmetic expression"""
+    return eval(expr, {'__builtins__': {}}, {})
+
+
+def task_search_snippet(page):
+    """Parse the snippet out of an already downloaded search page, returning only the text"""
+    from answer_lookup import parse_search_snippet
+    return parse_search_snippet(page)
+
+
+TASKS = {
+    'ping': task_ping,
+    'fuzzy_match': task_fuzzy_match,
+    'evaluate': task_evaluate,
+    'search_snippet': task_search_snippet,
+}
+
+
+def run_inline(name, *args):
+    """Run a task in the calling thread (used when no pool is running)"""
+    return TASKS[name](*args)
+
+
+def worker_main(conn, settings):
+    warm_worker(settings)
+    conn.send(('ready', os.getpid()))
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        name, args = message
+        try:
+            conn.send(('ok', TASKS[name](*args)))
+        except Exception as e:
+            # Send the message rather than the exception, which may not pickle
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+
+
+class TaskTimeout(Exception):
+    pass
+
+
+class Worker:
+    def __init__(self, context, settings):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child_conn, settings), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def wait_ready(self, timeout):
+        if not self.ready and self.conn.poll(timeout):
+            self.conn.recv()
+            self.ready = True
+        return self.ready
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class TaskPool:
+    """Fixed set of warm worker processes; each call borrows one worker exclusively"""
+
+    def __init__(self, workers=None, settings=None, default_timeout=5.0):
+        self.size = workers or os.cpu_count() or 1
+        self.settings = settings or {}
+        self.default_timeout = default_timeout
+        # spawn avoids forking a process that already runs Tk and audio threads
+        self.context = multiprocessing.get_context('spawn')
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.workers = []
+        self.closed = False
+        for _ in range(self.size):
+            self.add_worker()
+
+    def add_worker(self):
+        worker = Worker(self.context, self.settings)
+        with self.lock:
+            self.workers.append(worker)
+        self.idle.put(worker)
+
+    def replace_worker(self, worker):
+        worker.kill()
+        with self.lock:
+            if worker in self.workers:
+                self.workers.remove(worker)
+        if not self.closed:
+            self.add_worker()
+
+    def has_key_set(self, name):
+        """Whether workers were warmed with this key set, so tasks can send its name instead of the list"""
+        return name in self.settings.get('key_sets', {})
+
+    def wait_until_warm(self, timeout=30.0):
+        """Block until every worker has finished loading its indexes"""
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            workers = list(self.workers)
+        return all(w.wait_ready(max(0.0, deadline - time.monotonic())) for w in workers)
+
+    def run(self, name, *args, timeout=None):
+        """Run a task in a worker process and return its result
+
+        Raises TaskTimeout if no worker comes free or the task does not finish
+        in time; in the second case the worker is killed and replaced so a
+        runaway task cannot hold it.
+        """
+        if self.closed:
+            raise RuntimeError("Task pool is closed")
+        timeout = self.default_timeout if timeout is None else timeout
+        try:
+            worker = self.idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TaskTimeout(f"No worker became free within {timeout}s") from None
+        try:
+            if not worker.wait_ready(timeout):
+                raise TaskTimeout(f"Worker did not start within {timeout}s")
+            worker.conn.send((name, args))
+            if not worker.conn.poll(timeout):
+                raise TaskTimeout(f"Task '{name}' timed out after {timeout}s")
+            status, value = worker.conn.recv()
+        except (TaskTimeout, EOFError, OSError):
+            self.replace_worker(worker)
+            raise
+        self.idle.put(worker)
+        if status == 'error':
+            raise RuntimeError(value)
+        return value
+
+    def close(self):
+        self.closed = True
+        with self.lock:
+            workers, self.workers = self.workers, []
+        for worker in workers:
+            worker.stop()
+
+
+def benchmark(n_messages=100):
+    import random
+    rng = random.Random(0)
+    words = ["please", "tell", "me", "something", "about", "the", "weather", "games",
+             "music", "volume", "brightness", "open", "what", "is", "my", "favorite"]
+    random_text = lambda n: " ".join(rng.choice(words) for _ in range(n))
+    key_set = [random_text(rng.randint(4, 10)) for _ in range(400)]
+    # Long rambling messages that do not match anything exactly
+    messages = [random_text(12) for _ in range(n_messages)]
+    cores = os.cpu_count() or 1
+
+    def run_concurrently(call, concurrency):
+        pending = queue.Queue()
+        for message in messages:
+            pending.put(message)
+
+        def client():
+            while True:
+                try:
+                    message = pending.get_nowait()
+                except queue.Empty:
+                    return
+                call(message)
+
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - start
+
+    _preloaded['key_sets'] = {'bench': key_set}
+    baseline = run_concurrently(lambda m: run_inline('fuzzy_match', m, 'bench'), cores)
+    print(f"{n_messages} fuzzy-match messages, {len(key_set)} keys, {cores} cores")
+    print(f"threads only ({cores} threads): {baseline:.2f}s  {n_messages / baseline:.1f} msg/s")
+
+    workers = 1
+    while workers <= cores:
+        pool = TaskPool(workers, settings={'key_sets': {'bench': key_set}}, default_timeout=120)
+        pool.wait_until_warm()
+        elapsed = run_concurrently(lambda m: pool.run('fuzzy_match', m, 'bench'), workers)
+        pool.close()
+        print(f"process pool, {workers} worker(s): {elapsed:.2f}s  {n_messages / elapsed:.1f} msg/s  "
+              f"speedup x{baseline / elapsed:.2f}")
+        workers *= 2
+        if workers > cores and workers // 2 != cores:
+            workers = cores
+
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        print(__doc__)
@@ -0,0 +1,251 @@
+"""Lightweight per-message tracing across the listen, route, display and speak threads
+
+Each message gets a trace id when it enters (spoken or typed). The id is
+handed explicitly to the threads that work on the message, and every timed
+stage is recorded as a span. Spans are written as Chrome trace events to a
+rotating file that chrome://tracing or https://ui.perfetto.dev can open:
+
+    python tracing.py summarize ai_chatbot_trace.json
+"""
+import itertools
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+
+_local = threading.local()
+_ids = itertools.count(1)
+
+
+class Span:
+    __slots__ = ('tracer', 'name', 'trace_id', 'args', 'start')
+
+    def __init__(self, tracer, name, trace_id, args):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def note(self, key, value):
+        """Attach an argument learned while the span is open"""
+        self.args[key] = value
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer.record(self.name, self.trace_id, self.start, time.perf_counter(), self.args)
+        return False
+
+
+class _NullSpan:
+    # Shared by every disabled span, so it must stay empty
+    args = MappingProxyType({})
+
+    def __enter__(self):
+        return self
+
+    def note(self, key, value):
+        pass
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Activation:
+    """Make a trace id current on this thread for the duration of a with block"""
+
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = getattr(_local, 'trace_id', None)
+        _local.trace_id = self.trace_id
+        return self.trace_id
+
+    def __exit__(self, exc_type, exc, tb):
+        _local.trace_id = self.previous
+        return False
+
+
+class Tracer:
+    """Records spans and writes them to a size-rotated Chrome trace file
+
+    With no path (or enabled=False) every call is a cheap no-op, so code can
+    trace unconditionally.
+    """
+
+    def __init__(self, path=None, max_bytes=2 * 1024 * 1024, backups=3, enabled=True, keep_traces=64):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.enabled = enabled and path is not None
+        self.pid = os.getpid()
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+        # Per-trace stage totals for the breakdown, newest last
+        self.traces = OrderedDict()
+        self.keep_traces = keep_traces
+        self.events = queue.Queue()
+        self.writer = None
+        if self.enabled:
+            self.writer = threading.Thread(target=self.write_loop, name="trace-writer", daemon=True)
+            self.writer.start()
+
+    def new_trace(self):
+        if not self.enabled:
+            return None
+        trace_id = f"{self.pid:x}-{next(_ids):x}"
+        with self.lock:
+            self.traces[trace_id] = {'start': None, 'end': None, 'stages': {}}
+            if len(self.traces) > self.keep_traces:
+                self.traces.popitem(last=False)
+        return trace_id
+
+    def current(self):
+        return getattr(_local, 'trace_id', None)
+
+    def activate(self, trace_id):
+        return Activation(trace_id)
+
+    def span(self, name, trace_id=None, **args):
+        """Time a with block; uses the thread's current trace unless one is given"""
+        if not self.enabled:
+            return _NULL_SPAN
+        trace_id = trace_id or self.current()
+        if trace_id is None:
+            return _NULL_SPAN
+        return Span(self, name, trace_id, args)
+
+    def record(self, name, trace_id, start, end, args=None):
+        with self.lock:
+            # Late spans for traces that already aged out are still written, just not summarised
+            trace = self.traces.get(trace_id)
+            if trace is not None:
+                trace['start'] = start if trace['start'] is None else min(trace['start'], start)
+                trace['end'] = end if trace['end'] is None else max(trace['end'], end)
+                trace['stages'][name] = trace['stages'].get(name, 0.0) + (end - start)
+        self.events.put({
+            'name': name,
+            'cat': 'message',
+            'ph': 'X',
+            'ts': round((start - self.origin) * 1e6, 1),
+            'dur': round((end - start) * 1e6, 1),
+            'pid': self.pid,
+            'tid': threading.current_thread().name,
+            'args': dict(args or {}, trace_id=trace_id),
+        })
+
+    def breakdown(self, trace_id):
+        """(total seconds, [(stage, seconds), ...]) for a trace, or None
+
+        Stage times are inclusive, so nested stages (route inside display
+        inside process) overlap rather than add up to the total.
+        """
+        with self.lock:
+            trace = self.traces.get(trace_id)
+            if trace is None or trace['start'] is None:
+                return None
+            stages = sorted(trace['stages'].items(), key=lambda item: -item[1])
+            return trace['end'] - trace['start'], stages
+
+    def last_trace(self, exclude=None):
+        with self.lock:
+            for trace_id in reversed(self.traces):
+                if trace_id != exclude:
+                    return trace_id
+        return None
+
+    def format_breakdown(self, trace_id):
+        result = self.breakdown(trace_id)
+        if result is None:
+            return "No trace recorded yet."
+        total, stages = result
+        parts = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in stages)
+        return f"Last message took {total * 1000:.0f} ms end to end: {parts}"
+
+    def write_loop(self):
+        out = None
+        while True:
+            event = self.events.get()
+            if event is None:
+                break
+            try:
+                if out is None:
+                    out = self.open_file()
+                out.write(json.dumps(event, separators=(',', ':')) + ",\n")
+                if out.tell() >= self.max_bytes:
+                    out.close()
+                    self.rotate()
+                    out = None
+                # Flush in batches rather than per event
+                elif self.events.empty():
+                    out.flush()
+            except OSError as e:
+                print(f"Error writing trace: {e}")
+                out = None
+        if out is not None:
+            out.close()
+
+    def open_file(self):
+        fresh = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        out = open(self.path, 'a', encoding='utf-8')
+        if fresh:
+            # The trace viewers accept a JSON array without the closing bracket
+            out.write("[\n")
+        return out
+
+    def rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def close(self):
+        if self.writer is not None:
+            self.events.put(None)
+            self.writer.join(2)
+            self.writer = None
+
+
+NULL_TRACER = Tracer(None)
+
+
+def load_events(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read().strip().rstrip(',')
+    if not text.endswith(']'):
+        text += "]"
+    return json.loads(text)
+
+
+def summarize(path):
+    """Print per-stage percentiles from a trace file"""
+    durations = {}
+    for event in load_events(path):
+        durations.setdefault(event['name'], []).append(event['dur'] / 1000)
+    print(f"{'stage':<12} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for name, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+        values.sort()
+        pick = lambda pct: values[min(len(values) - 1, int(pct / 100 * len(values)))]
+        print(f"{name:<12} {len(values):>6} {pick(50):>9.1f} {pick(95):>9.1f} {values[-1]:>9.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == 'summarize':
+        summarize(sys.argv[2])
+    else:
+        print(__doc__)
@@ -0,0 +1,242 @@
+"""Prefix completion for the input box over command phrases, site names and past messages
+
+Phrases live in a radix (path-compressed) trie. Every node caches the best
+few completions below it, so a keystroke costs one walk down the typed
+prefix plus reading a short list, independent of how many phrases exist.
+
+Popularity decays over time using forward decay: each use adds
+exp((now - origin) / half_life * ln 2) to a phrase's score instead of
+shrinking every other score. Scores therefore only grow, which keeps the
+cached per-node rankings valid as phrases are used.
+
+    python typeahead.py --benchmark
+"""
+import json
+import math
+import os
+import sys
+import time
+from collections import OrderedDict
+
+LN2 = math.log(2)
+
+
+class Node:
+    __slots__ = ('edges', 'entry', 'top')
+
+    def __init__(self):
+        # First character -> (edge label, child node)
+        self.edges = {}
+        self.entry = None
+        # Best completions in this subtree, highest score first
+        self.top = []
+
+
+class Entry:
+    __slots__ = ('key', 'text', 'score', 'learned')
+
+    def __init__(self, key, text):
+        self.key = key
+        self.text = text
+        self.score = 0.0
+        # Part of the score that came from the user's own messages
+        self.learned = 0.0
+
+
+class TypeaheadIndex:
+    def __init__(self, top_k=8, half_life_days=14.0, promote_after=2, max_candidates=5000, clock=time.time):
+        self.root = Node()
+        self.entries = {}
+        self.top_k = top_k
+        self.half_life = half_life_days * 86400
+        self.clock = clock
+        self.origin = clock()
+        # Past messages become suggestions once they have been sent this many times
+        self.promote_after = promote_after
+        self.candidates = OrderedDict()
+        self.max_candidates = max_candidates
+
+    def __len__(self):
+        return len(self.entries)
+
+    def weight(self, when=None):
+        when = self.clock() if when is None else when
+        return math.exp((when - self.origin) / self.half_life * LN2)
+
+    @staticmethod
+    def normalize(text):
+        return " ".join(text.lower().split())
+
+    def add(self, text, weight=1.0, when=None, learned=False):
+        """Add a phrase (or bump an existing one) by `weight` uses at time `when`"""
+        key = self.normalize(text)
+        if not key:
+            return
+        increment = weight * self.weight(when)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = Entry(key, text.strip())
+        entry.score += increment
+        if learned:
+            entry.learned += increment
+        if entry.score > 1e200:
+            self.rescale()
+        self.insert(entry)
+
+    def record_message(self, text, when=None):
+        """Count a sent message; frequent ones join the index"""
+        key = self.normalize(text)
+        if not key or len(key) > 80:
+            return
+        if key in self.entries:
+            self.add(text, when=when, learned=True)
+            return
+        count = self.candidates.pop(key, 0) + 1
+        if count >= self.promote_after:
+            self.add(text, weight=count, when=when, learned=True)
+        else:
+            self.candidates[key] = count
+            if len(self.candidates) > self.max_candidates:
+                self.candidates.popitem(last=False)
+
+    def insert(self, entry):
+        """Place entry in the trie and refresh the cached rankings along its path"""
+        key = entry.key
+        node = self.root
+        path = [node]
+        i = 0
+        while i < len(key):
+            edge = node.edges.get(key[i])
+            if edge is None:
+                child = Node()
+                node.edges[key[i]] = (key[i:], child)
+                node = child
+                path.append(node)
+                break
+            label, child = edge
+            common = 0
+            limit = min(len(label), len(key) - i)
+            while common < limit and label[common] == key[i + common]:
+                common += 1
+            if common < len(label):
+                # Split the edge where the new key diverges
+                middle = Node()
+                middle.edges[label[common]] = (label[common:], child)
+                middle.top = list(child.top)
+                node.edges[key[i]] = (label[:common], middle)
+                child = middle
+            node = child
+            path.append(node)
+            i += common
+        node.entry = entry
+        for node in path:
+            self.promote(node, entry)
+
+    def promote(self, node, entry):
+        top = node.top
+        if entry in top:
+            top.remove(entry)
+        elif len(top) >= self.top_k and top[-1].score >= entry.score:
+            return
+        # Lists are at most top_k long, so a linear insert is cheapest
+        position = 0
+        while position < len(top) and top[position].score >= entry.score:
+            position += 1
+        top.insert(position, entry)
+        del top[self.top_k:]
+
+    def find(self, prefix):
+        node = self.root
+        i = 0
+        while i < len(prefix):
+            edge = node.edges.get(prefix[i])
+            if edge is None:
+                return None
+            label, child = edge
+            remaining = prefix[i:]
+            if remaining.startswith(label):
+                i += len(label)
+                node = child
+            elif label.startswith(remaining):
+                return child
+            else:
+                return None
+        return node
+
+    def suggest(self, text, limit=5):
+        """Best completions for what has been typed so far"""
+        prefix = self.normalize(text)
+        if text.endswith(' ') and prefix:
+            prefix += ' '
+        if not prefix:
+            return []
+        node = self.find(prefix)
+        if node is None:
+            return []
+        return [e.text for e in node.top if e.key != prefix][:limit]
+
+    def rescale(self):
+        """Move the decay origin to now so scores stay in floating point range"""
+        now = self.clock()
+        factor = math.exp(-(now - self.origin) / self.half_life * LN2)
+        self.origin = now
+        for entry in self.entries.values():
+            entry.score *= factor
+            entry.learned *= factor
+
+    def save(self, path):
+        """Persist what was learned from past messages; seeded phrases are rebuilt at startup"""
+        now_weight = self.weight()
+        data = {
+            'saved_at': self.clock(),
+            'entries': {e.text: e.learned / now_weight for e in self.entries.values() if e.learned},
+            'candidates': dict(self.candidates),
+        }
+        with open(path + ".tmp", 'w') as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+
+    def load(self, path):
+        if not os.path.exists(path):
+            return
+        with open(path, 'r') as f:
+            data = json.load(f)
+        when = data.get('saved_at')
+        for text, score in data.get('entries', {}).items():
+            self.add(text, weight=score, when=when, learned=True)
+        for key, count in data.get('candidates', {}).items():
+            self.candidates[key] = count
+
+
+def benchmark(n_phrases=50000, n_keystrokes=20000):
+    import random
+    rng = random.Random(0)
+    words = ["set", "volume", "brightness", "to", "open", "play", "what", "is", "the", "my", "favorite",
+             "game", "song", "music", "weather", "time", "date", "tell", "me", "a", "joke", "search", "for"]
+    index = TypeaheadIndex()
+    start = time.perf_counter()
+    for _ in range(n_phrases):
+        index.add(" ".join(rng.choice(words) for _ in range(rng.randint(2, 6))), weight=rng.random())
+    build = time.perf_counter() - start
+
+    phrases = list(index.entries)
+    typed = []
+    for _ in range(n_keystrokes):
+        phrase = rng.choice(phrases)
+        typed.append(phrase[:rng.randint(1, len(phrase))])
+    timings = []
+    for prefix in typed:
+        start = time.perf_counter()
+        index.suggest(prefix)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f"{len(index):,} phrases indexed in {build:.2f}s")
+    print(f"{n_keystrokes:,} keystrokes: p50 {timings[len(timings) // 2] * 1e6:.1f} us, "
+          f"p99 {timings[int(len(timings) * 0.99)] * 1e6:.1f} us, max {timings[-1] * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        print(__doc__)